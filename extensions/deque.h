@@ -0,0 +1,73 @@
+#ifndef __DEQUE_H__
+#define __DEQUE_H__
+
+#include <stddef.h>
+
+#include "qc_types.h"
+
+/*
+ * Monotonic deque of indexes into the data vector, kept in a ring buffer
+ * whose capacity is a power of two (mask = capacity - 1). The value at the
+ * front is the extreme (min or max) of the indexes still in the deque.
+ */
+typedef struct {
+    size_t *idx;
+    size_t mask;
+    size_t head;
+    size_t len;
+} mono_deque;
+
+static inline size_t dq_front(const mono_deque *dq)
+{
+    return dq->idx[dq->head];
+}
+
+static inline size_t dq_back(const mono_deque *dq)
+{
+    return dq->idx[(dq->head + dq->len - 1) & dq->mask];
+}
+
+/* Drops every index below lo from the front of the deque */
+static inline void dq_expire(mono_deque *dq, size_t lo)
+{
+    while(dq->len && dq_front(dq) < lo) {
+        dq->head = (dq->head + 1) & dq->mask;
+        dq->len--;
+    }
+}
+
+/*
+ * dq_push_max, dq_push_min
+ *
+ * Append i, dropping the values from the back that can no longer be the max
+ * (min). dat[i] is read as dat[i * stride]. Defined for each element type of
+ * qc_types.h, e.g. dq_push_max_float32 over a const float *.
+ */
+#define DQ_DEFINE(T, SUFFIX) \
+static inline void dq_push_max##SUFFIX(mono_deque *dq, const T *dat, ptrdiff_t stride, size_t i) \
+{ \
+    while(dq->len && dat[(ptrdiff_t) dq_back(dq) * stride] <= dat[(ptrdiff_t) i * stride]) \
+        dq->len--; \
+    dq->idx[(dq->head + dq->len) & dq->mask] = i; \
+    dq->len++; \
+} \
+static inline void dq_push_min##SUFFIX(mono_deque *dq, const T *dat, ptrdiff_t stride, size_t i) \
+{ \
+    while(dq->len && dat[(ptrdiff_t) dq_back(dq) * stride] >= dat[(ptrdiff_t) i * stride]) \
+        dq->len--; \
+    dq->idx[(dq->head + dq->len) & dq->mask] = i; \
+    dq->len++; \
+}
+
+QC_FOR_EACH_TYPE(DQ_DEFINE)
+
+/* Smallest power of two that holds n indexes */
+static inline size_t dq_capacity(size_t n)
+{
+    size_t cap=1;
+    while(cap < n)
+        cap <<= 1;
+    return cap;
+}
+
+#endif /* __DEQUE_H__ */
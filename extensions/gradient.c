@@ -29,6 +29,29 @@ static inline int tolerance(double a, double b, double tolerance)
 }
 
 
+/*
+ * gradient_start of a first data point of any type, converted to double
+ */
+static void start_state(
+        signed char *out,
+        double first,
+        double startdat,
+        double toldat,
+        gradient_state *state)
+{
+    state->skipped = 0;
+    state->bad = false;
+    if (startdat == 0) { 
+        state->startdat = first;
+    } else {
+        state->startdat = startdat;
+        if ( !tolerance(first, startdat, toldat) ) {
+            state->bad = true;
+            out[0] = 0;
+        }
+    }
+}
+
 /*
  * gradient
  * 
@@ -86,67 +109,76 @@ int gradient(
         double toldat, 
         const signed char skipped_value) 
 { 
-    double ddatdx; 
-    size_t i=0; 
-    int j=0; 
-    int skipped=0; 
-    bool bad=false; 
-
-    /*
-     * If startdat is not set, set it to dat[0]. Otherwise, use it to evaluate 
-     * the tolerance of dat[0].
-     */
-    if (startdat == 0) { 
-        startdat = dat[0];
-    } else if ( !tolerance(dat[0], startdat, toldat) ) {
-        bad = true;
-        out[0] = 0;
-    }
-    for(i = 1; i < len; i++) {
-
-        /* 
-         * Check if dx < mindx and skip if it's not.
-         */
-        if ( tolerance(x[i], x[i - (1 + skipped)], mindx) ) {
-            skipped++;
-            out[i] = skipped_value;
-            continue;
-        }
+    return gradient_strided(out, 1, dat, 1, x, 1, len, grad_min, grad_max,
+                            mindx, startdat, toldat, skipped_value);
+}
 
-        /*
-         * If the last value was bad
-         */
-
-        if(bad) { /* Only start again if dat[i] is within toldat of startdat */
-            if (tolerance(dat[i], startdat, toldat)) { /* It's good again */
-                bad = false;
-            } else {
-                out[i] = 0; /* still bad mark it and move on */
-            }
-            continue; 
-        }
 
-        ddatdx = (dat[i] - dat[i-(1+skipped)]) / (x[i] - x[i-(1+skipped)]);
-
-        /* Calculate the rate of change */
-        if(ddatdx < grad_min || ddatdx > grad_max) {
-            /* If the differential is outside of the min/max */
-            for(j=1;j<=skipped;j++) {
-                /* Set all the skipped to 0 as well */
-                out[i-j] = 0;
-            }
-            skipped = 0; /* Reset the skipped */
-            out[i] = 0;  /* Set the output to false */
-            bad = true;  /* Mark a bad */
-        } else {
-            /* Continue on our way and update startdat */
-            startdat = dat[i];
-            /* Reset the skipped count, we're done skiping for the moment */
-            skipped = 0;
-        }
-    }
-    return 0;
+/*
+ * gradient_start
+ *
+ * Evaluates the first data point and initializes state for gradient_resume.
+ * If startdat is not set (0), dat[0] becomes the known good value. Otherwise
+ * dat[0] is bad unless it is within toldat of startdat.
+ */
+void gradient_start(
+        signed char *out,
+        const double *dat,
+        double startdat,
+        double toldat,
+        gradient_state *state)
+{
+    start_state(out, dat[0], startdat, toldat, state);
 }
 
 
+/*
+ * gradient_resume
+ *
+ * Runs the gradient scan over dat[start:len], continuing from state. Points
+ * before start must be the ones the state was built from, the scan looks back
+ * at most state->skipped + 1 points and may still set out for the last
+ * state->skipped of them. Only out[len - 1 - state->skipped] and earlier are
+ * final when it returns.
+ */
+int gradient_resume(
+        signed char *out,
+        const double *dat,
+        const double *x,
+        size_t start,
+        size_t len,
+        double grad_min,
+        double grad_max,
+        double mindx,
+        double toldat,
+        const signed char skipped_value,
+        gradient_state *state)
+{
+    return gradient_resume_strided(out, 1, dat, 1, x, 1, start, len, grad_min,
+                                   grad_max, mindx, toldat, skipped_value,
+                                   state);
+}
 
+#define QC_T double
+#define QC_SUFFIX
+#include "gradient_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T float
+#define QC_SUFFIX _float32
+#include "gradient_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T int32_t
+#define QC_SUFFIX _int32
+#include "gradient_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T int16_t
+#define QC_SUFFIX _int16
+#include "gradient_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
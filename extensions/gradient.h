@@ -2,6 +2,18 @@
 #define __GRADIENT_H__
 
 #include <stddef.h>
+#include <stdbool.h>
+
+#include "qc_types.h"
+
+/*
+ * State carried between gradient_resume calls
+ */
+typedef struct {
+    double startdat;  /* Last known good value */
+    size_t skipped;   /* Points skipped since the last evaluated point */
+    bool bad;         /* The last evaluated point was bad */
+} gradient_state;
 
 /*
  * gradient
@@ -56,4 +68,89 @@ int gradient(signed char *out,
         double toldat, 
         const signed char skipped_value);
 
+/*
+ * gradient_start
+ *
+ * Evaluates dat[0] against startdat and toldat, like gradient does, and
+ * initializes state for gradient_resume.
+ */
+void gradient_start(
+        signed char *out,
+        const double *dat,
+        double startdat,
+        double toldat,
+        gradient_state *state);
+
+/*
+ * gradient_resume
+ *
+ * Continues the gradient scan over dat[start:len] from state, so that a
+ * series can be evaluated in pieces with the same result as a single call to
+ * gradient. The arrays must still hold the state->skipped + 1 points before
+ * start; the last state->skipped flags of out remain subject to change until
+ * the next evaluated point.
+ *
+ * Arguments (see gradient for the rest):
+ * size_t start           - First index to evaluate, at least 1.
+ * gradient_state *state  - State from gradient_start or a previous call,
+ *                          updated in place.
+ */
+int gradient_resume(
+        signed char *out,
+        const double *dat,
+        const double *x,
+        size_t start,
+        size_t len,
+        double grad_min,
+        double grad_max,
+        double mindx,
+        double toldat,
+        const signed char skipped_value,
+        gradient_state *state);
+
+/*
+ * gradient_strided, gradient_resume_strided
+ *
+ * gradient and gradient_resume over vectors that are not contiguous, e.g. the
+ * columns of a C ordered 2-D array. Element i of out, dat and x is
+ * out[i * out_stride], dat[i * stride] and x[i * x_stride]. Strides are
+ * counted in elements, not bytes.
+ *
+ * Declared for each type of dat of qc_types.h: gradient_strided over double,
+ * gradient_strided_float32 over float and so on. x is double.
+ */
+#define GRADIENT_DECLARE(T, SUFFIX) \
+int gradient_strided##SUFFIX( \
+        signed char *out, \
+        ptrdiff_t out_stride, \
+        const T *dat, \
+        ptrdiff_t stride, \
+        const double *x, \
+        ptrdiff_t x_stride, \
+        size_t len, \
+        double grad_min, \
+        double grad_max, \
+        double mindx, \
+        double startdat, \
+        double toldat, \
+        const signed char skipped_value); \
+ \
+int gradient_resume_strided##SUFFIX( \
+        signed char *out, \
+        ptrdiff_t out_stride, \
+        const T *dat, \
+        ptrdiff_t stride, \
+        const double *x, \
+        ptrdiff_t x_stride, \
+        size_t start, \
+        size_t len, \
+        double grad_min, \
+        double grad_max, \
+        double mindx, \
+        double toldat, \
+        const signed char skipped_value, \
+        gradient_state *state);
+
+QC_FOR_EACH_TYPE(GRADIENT_DECLARE)
+
 #endif /* __GRADIENT_H__ */
@@ -0,0 +1,118 @@
+/*
+ * gradient_impl.h -- The gradient kernels over data vectors of QC_T, included
+ * by gradient.c once for each type of qc_types.h. x is always double.
+ */
+
+/*
+ * gradient_strided
+ *
+ * gradient over vectors whose elements are out_stride, stride and x_stride
+ * elements apart. A x_stride of 0 is not meaningful, x must advance.
+ */
+int QC_NAME(gradient_strided)(
+        signed char *out,
+        ptrdiff_t out_stride,
+        const QC_T *dat,
+        ptrdiff_t stride,
+        const double *x,
+        ptrdiff_t x_stride,
+        size_t len,
+        double grad_min,
+        double grad_max,
+        double mindx,
+        double startdat,
+        double toldat,
+        const signed char skipped_value)
+{
+    gradient_state state;
+
+    start_state(out, (double) dat[0], startdat, toldat, &state);
+    return QC_NAME(gradient_resume_strided)(out, out_stride, dat, stride, x, x_stride,
+                                            1, len, grad_min, grad_max, mindx, toldat,
+                                            skipped_value, &state);
+}
+
+
+/*
+ * gradient_resume_strided
+ *
+ * gradient_resume over strided vectors, see gradient_strided.
+ */
+int QC_NAME(gradient_resume_strided)(
+        signed char *out,
+        ptrdiff_t out_stride,
+        const QC_T *dat,
+        ptrdiff_t stride,
+        const double *x,
+        ptrdiff_t x_stride,
+        size_t start,
+        size_t len,
+        double grad_min,
+        double grad_max,
+        double mindx,
+        double toldat,
+        const signed char skipped_value,
+        gradient_state *state)
+{
+    double ddatdx; 
+    double startdat = state->startdat;
+    size_t i=0; 
+    size_t j=0; 
+    size_t skipped = state->skipped; 
+    bool bad = state->bad; 
+
+#define DAT(i) ((double) dat[(ptrdiff_t) (i) * stride])
+#define X(i) x[(ptrdiff_t) (i) * x_stride]
+#define OUT(i) out[(ptrdiff_t) (i) * out_stride]
+
+    for(i = start; i < len; i++) {
+
+        /* 
+         * Check if dx < mindx and skip if it's not.
+         */
+        if ( tolerance(X(i), X(i - (1 + skipped)), mindx) ) {
+            skipped++;
+            OUT(i) = skipped_value;
+            continue;
+        }
+
+        /*
+         * If the last value was bad
+         */
+
+        if(bad) { /* Only start again if DAT(i) is within toldat of startdat */
+            if (tolerance(DAT(i), startdat, toldat)) { /* It's good again */
+                bad = false;
+            } else {
+                OUT(i) = 0; /* still bad mark it and move on */
+            }
+            continue; 
+        }
+
+        ddatdx = (DAT(i) - DAT(i-(1+skipped))) / (X(i) - X(i-(1+skipped)));
+
+        /* Calculate the rate of change */
+        if(ddatdx < grad_min || ddatdx > grad_max) {
+            /* If the differential is outside of the min/max */
+            for(j=1;j<=skipped;j++) {
+                /* Set all the skipped to 0 as well */
+                OUT(i-j) = 0;
+            }
+            skipped = 0; /* Reset the skipped */
+            OUT(i) = 0;  /* Set the output to false */
+            bad = true;  /* Mark a bad */
+        } else {
+            /* Continue on our way and update startdat */
+            startdat = DAT(i);
+            /* Reset the skipped count, we're done skiping for the moment */
+            skipped = 0;
+        }
+    }
+    state->startdat = startdat;
+    state->skipped = skipped;
+    state->bad = bad;
+    return 0;
+#undef DAT
+#undef X
+#undef OUT
+}
@@ -0,0 +1,216 @@
+#include <stdlib.h>
+#include <string.h>
+
+#include "qc_suite.h"
+#include "spike.h"
+#include "stuck.h"
+#include "gradient.h"
+#include "runs.h"
+
+static inline size_t size_max(size_t a, size_t b)
+{
+    return (a > b) ? a : b;
+}
+
+/*
+ * Mask that clears bit when flag, a 0 or 1, is 0
+ */
+static inline uint16_t fail_mask(signed char flag, uint16_t bit)
+{
+    return (uint16_t) ~(bit & (uint16_t) (flag - 1));
+}
+
+/*
+ * Runs the tests of cfg block by block and hands the flags to one of two
+ * outputs: the bits of the words of out, or the runs of each test.
+ *
+ * The spike and stuck value flags of a sample only depend on the values
+ * within L-1 and num-1 samples of it, or on the first and last L values of
+ * the vector, so each block is evaluated with a halo of that many samples on
+ * either side, cut at the ends of the vector. The gradient scan is carried
+ * from block to block by gradient_resume; the points it skipped at the end
+ * of a block are kept in the scratch flags of the next one, since a bad
+ * gradient there still marks them bad, and are only encoded as runs once
+ * they are final.
+ */
+static int suite(uint16_t *out, qc_runs *runs, const double *dat, const double *x,
+                 size_t len, const qc_suite_config *cfg, size_t block,
+                 signed char skipped_value)
+{
+    size_t a, b, i;
+    size_t lo, hi;
+    size_t spike_halo=0, stuck_halo=0;
+    size_t base=0, pending;
+    size_t gcap=0;
+    size_t gdone=0, gfinal;
+    signed char *spbuf=NULL;
+    signed char *stbuf=NULL;
+    signed char *gbuf=NULL;
+    signed char *sp, *st, *gr;
+    signed char *tmp;
+    gradient_state state;
+    uint16_t rbit = cfg->range_bit;
+    uint16_t spbit = cfg->spike_bit;
+    uint16_t stbit = cfg->stuck_bit;
+    uint16_t gbit = cfg->gradient_bit;
+    uint16_t word;
+    double d;
+    int rc = -1;
+
+    if(!len)
+        return 0;
+
+    if(spbit && cfg->spike_L > 1)
+        spike_halo = cfg->spike_L - 1;
+    if(stbit) {
+        if(cfg->stuck_num < 1) {
+            stbit = 0;
+        }
+        else if((size_t) cfg->stuck_num > len) {
+            /* Too short for a run, every value is flagged */
+            for(i=0;i<len;i++) {
+                if(out)
+                    out[i] &= (uint16_t) ~stbit;
+                else if(runs_push(&runs[QC_SUITE_STUCK], i, 0))
+                    return -1;
+            }
+            stbit = 0;
+        }
+        else {
+            stuck_halo = cfg->stuck_num - 1;
+        }
+    }
+    if(!block)
+        block = QC_SUITE_BLOCK;
+    block = size_max(block, QC_SUITE_HALO_RATIO * size_max(spike_halo, stuck_halo));
+
+    /*
+     * Tests that are not run read a block of ones, so every word is built
+     * in one loop whatever the tests
+     */
+    spbuf = malloc(block + 2 * spike_halo);
+    stbuf = malloc(block + 2 * stuck_halo);
+    if(!spbuf || !stbuf)
+        goto done;
+    memset(spbuf, 1, block + 2 * spike_halo);
+    memset(stbuf, 1, block + 2 * stuck_halo);
+    sp = spbuf;
+    st = stbuf;
+
+    for(a=0;a<len;a=b) {
+        b = (len - a > block) ? a + block : len;
+
+        if(spbit) {
+            lo = (a > spike_halo) ? a - spike_halo : 0;
+            hi = (len - b > spike_halo) ? b + spike_halo : len;
+            memset(spbuf, 1, hi - lo);
+            if(cfg->spike_L >= SPIKE_RUNNING_MIN_L)
+                spike_running(spbuf, dat + lo, hi - lo, cfg->spike_L, cfg->spike_N, cfg->spike_acc);
+            else
+                spike(spbuf, dat + lo, hi - lo, cfg->spike_L, cfg->spike_N, cfg->spike_acc);
+            sp = spbuf + (a - lo);
+        }
+
+        if(stbit) {
+            lo = (a > stuck_halo) ? a - stuck_halo : 0;
+            hi = (len - b > stuck_halo) ? b + stuck_halo : len;
+            memset(stbuf, 1, hi - lo);
+            stuck(stbuf, dat + lo, hi - lo, cfg->stuck_reso, cfg->stuck_num);
+            st = stbuf + (a - lo);
+        }
+
+        /* With a bit of 0 any flags do */
+        gr = spbuf;
+        if(gbit) {
+            /*
+             * The scratch flags start at base, the point the scan looks back
+             * to, and carry the flags of the points after it from the last
+             * block: a bad gradient still marks the skipped ones among them
+             * bad.
+             */
+            pending = a ? state.skipped + 1 : 0;
+            if(b - (a - pending) > gcap) {
+                gcap = size_max(b - (a - pending), 2 * gcap);
+                tmp = realloc(gbuf, gcap);
+                if(!tmp)
+                    goto done;
+                gbuf = tmp;
+            }
+            if(pending)
+                memmove(gbuf, gbuf + (a - pending - base), pending);
+            base = a - pending;
+            memset(gbuf + pending, 1, b - a);
+            if(!a)
+                gradient_start(gbuf, dat, cfg->grad_startdat, cfg->grad_toldat, &state);
+            gradient_resume(gbuf, dat + base, x + base, a ? pending : 1, b - base,
+                            cfg->grad_min, cfg->grad_max, cfg->grad_mindx,
+                            cfg->grad_toldat, out ? 1 : skipped_value, &state);
+            if(out) {
+                for(i=base;i<a;i++)
+                    out[i] &= fail_mask(gbuf[i - base], gbit);
+            }
+            else {
+                gfinal = (b == len) ? b : b - state.skipped;
+                if(runs_encode(&runs[QC_SUITE_GRADIENT], gbuf + (gdone - base), gdone, gfinal - gdone))
+                    goto done;
+                gdone = gfinal;
+            }
+            gr = gbuf + pending;
+        }
+
+        if(!out) {
+            if(rbit) {
+                for(i=a;i<b;i++) {
+                    d = dat[i];
+                    if(!(cfg->range_min <= d && d <= cfg->range_max) &&
+                            runs_push(&runs[QC_SUITE_RANGE], i, 0))
+                        goto done;
+                }
+            }
+            if(spbit && runs_encode(&runs[QC_SUITE_SPIKE], sp, a, b - a))
+                goto done;
+            if(stbit && runs_encode(&runs[QC_SUITE_STUCK], st, a, b - a))
+                goto done;
+            continue;
+        }
+
+        for(i=a;i<b;i++) {
+            d = dat[i];
+            word = out[i];
+            if(rbit && !(cfg->range_min <= d && d <= cfg->range_max))
+                word &= (uint16_t) ~rbit;
+            word &= fail_mask(sp[i - a], spbit);
+            word &= fail_mask(st[i - a], stbit);
+            word &= fail_mask(gr[i - a], gbit);
+            out[i] = word;
+        }
+    }
+    rc = 0;
+done:
+    free(spbuf);
+    free(stbuf);
+    free(gbuf);
+    return rc;
+}
+
+/*
+ * qc_suite
+ *
+ * Clears the bit of each test in the words of out where it fails.
+ */
+int qc_suite(uint16_t *out, const double *dat, const double *x, size_t len,
+             const qc_suite_config *cfg, size_t block)
+{
+    return suite(out, NULL, dat, x, len, cfg, block, 1);
+}
+
+/*
+ * qc_suite_runs
+ *
+ * Adds the flags of each test other than 1 to its list of runs.
+ */
+int qc_suite_runs(qc_runs *runs, const double *dat, const double *x, size_t len,
+                  const qc_suite_config *cfg, size_t block, signed char skipped_value)
+{
+    return suite(NULL, runs, dat, x, len, cfg, block, skipped_value);
+}
@@ -0,0 +1,94 @@
+#ifndef __QC_SUITE_H__
+#define __QC_SUITE_H__
+
+#include <stddef.h>
+#include <stdint.h>
+
+#include "runs.h"
+
+/*
+ * Parameters of the tests qc_suite runs. A bit of 0 leaves the test out,
+ * otherwise it is the bit of the output word the test writes.
+ */
+typedef struct {
+    uint16_t range_bit;     /* Global range test */
+    double range_min;
+    double range_max;
+
+    uint16_t spike_bit;     /* Spike test */
+    int spike_L;
+    double spike_N;
+    double spike_acc;
+
+    uint16_t stuck_bit;     /* Stuck value test */
+    double stuck_reso;
+    int stuck_num;
+
+    uint16_t gradient_bit;  /* Gradient test, needs x */
+    double grad_min;
+    double grad_max;
+    double grad_mindx;
+    double grad_startdat;   /* 0 for none */
+    double grad_toldat;
+} qc_suite_config;
+
+/*
+ * Samples per block qc_suite evaluates at a time. Blocks are made at least
+ * QC_SUITE_HALO_RATIO times the halo the spike and stuck value tests need
+ * on either side, so the halo is a small part of the work.
+ */
+#define QC_SUITE_BLOCK 4096
+#define QC_SUITE_HALO_RATIO 4
+
+/*
+ * qc_suite
+ *
+ * Runs the global range, spike, stuck value and gradient tests over dat in a
+ * single pass of blocks, each small enough to stay in cache while every
+ * requested test reads it. A failed test clears its bit in out[i]; bits are
+ * otherwise left as they are, so out should be initialized with every bit of
+ * a pass set. The flags are the ones of range, spike, stuck and gradient on
+ * the whole vector, with the gradient test's skipped points counting as a
+ * pass.
+ *
+ * Arguments:
+ * uint16_t *out               - Flag words, one per sample
+ * const double *dat           - The data vector
+ * const double *x             - The axis of dat, only read by the gradient
+ *                               test
+ * size_t len                  - Length of out, dat and x
+ * const qc_suite_config *cfg  - The tests to run
+ * size_t block                - Samples per block, 0 for QC_SUITE_BLOCK
+ *
+ * Returns 0, or -1 if the scratch space could not be allocated.
+ */
+int qc_suite(uint16_t *out, const double *dat, const double *x, size_t len,
+             const qc_suite_config *cfg, size_t block);
+
+/* Index of the runs of each test in the list qc_suite_runs fills */
+#define QC_SUITE_RANGE 0
+#define QC_SUITE_SPIKE 1
+#define QC_SUITE_STUCK 2
+#define QC_SUITE_GRADIENT 3
+#define QC_SUITE_TESTS 4
+
+/*
+ * qc_suite_runs
+ *
+ * Runs the same tests as qc_suite, but adds the flags of each test that are
+ * not a pass to runs[QC_SUITE_RANGE], runs[QC_SUITE_SPIKE] and so on, as
+ * runs of equal flags, instead of writing a word per sample. A bit of cfg
+ * that is not 0 only selects the test. No array as long as dat is written,
+ * the memory used grows with the number of runs.
+ *
+ * Arguments (see qc_suite for the rest):
+ * qc_runs *runs              - QC_SUITE_TESTS lists of runs, appended to
+ * signed char skipped_value  - Code of the points the gradient test skips
+ *
+ * Returns 0, or -1 if the scratch space or a list could not grow. The runs
+ * added so far are left in the lists for runs_free.
+ */
+int qc_suite_runs(qc_runs *runs, const double *dat, const double *x, size_t len,
+                  const qc_suite_config *cfg, size_t block, signed char skipped_value);
+
+#endif /* __QC_SUITE_H__ */
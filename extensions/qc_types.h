@@ -0,0 +1,31 @@
+#ifndef __QC_TYPES_H__
+#define __QC_TYPES_H__
+
+#include <stdint.h>
+
+/*
+ * The element types the QC kernels read data vectors of, and the suffix of
+ * the names of the kernels over each, e.g. spike_strided_int16 over an
+ * int16_t vector. The double kernels keep their plain names.
+ *
+ * The values are compared in their own type and converted to double for any
+ * arithmetic, so every kernel returns the flags of its double kernel over
+ * the vector converted to double, without making that copy.
+ *
+ * X(T, SUFFIX) is expanded once per type.
+ */
+#define QC_FOR_EACH_TYPE(X) \
+    X(double, ) \
+    X(float, _float32) \
+    X(int32_t, _int32) \
+    X(int16_t, _int16)
+
+/*
+ * In the kernel templates, *_impl.h, QC_T is the element type and
+ * QC_NAME(name) the name of the kernel over it.
+ */
+#define QC_CAT_(a, b) a##b
+#define QC_CAT(a, b) QC_CAT_(a, b)
+#define QC_NAME(name) QC_CAT(name, QC_SUFFIX)
+
+#endif /* __QC_TYPES_H__ */
@@ -0,0 +1,21 @@
+#include "range.h"
+
+/*
+ * range_strided
+ * flags the values of dat within [lo, hi] in a single pass. The comparison
+ * is false for NaN, which fails.
+ */
+#define RANGE_DEFINE(T, SUFFIX) \
+int range_strided##SUFFIX(signed char *out, ptrdiff_t out_stride, const T *dat, ptrdiff_t stride, \
+                          size_t len, double lo, double hi) \
+{ \
+    size_t i; \
+    double d; \
+    for(i=0;i<len;i++) { \
+        d = (double) dat[(ptrdiff_t) i * stride]; \
+        out[(ptrdiff_t) i * out_stride] = (lo <= d && d <= hi); \
+    } \
+    return 0; \
+}
+
+QC_FOR_EACH_TYPE(RANGE_DEFINE)
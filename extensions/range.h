@@ -0,0 +1,33 @@
+#ifndef __RANGE_H__
+#define __RANGE_H__
+
+#include <stddef.h>
+
+#include "qc_types.h"
+
+/*
+ * range_strided
+ *
+ * Sets out[i] to 1 where lo <= dat[i] <= hi, else to 0. NaN is outside every
+ * range. Element i is dat[i * stride] and its flag out[i * out_stride].
+ * Strides are counted in elements, not bytes.
+ *
+ * Declared for each element type of qc_types.h: range_strided over double,
+ * range_strided_float32 over float and so on.
+ *
+ * Arguments:
+ * signed char *out     - The output array of flags
+ * ptrdiff_t out_stride - Stride of out
+ * const T *dat         - The data vector
+ * ptrdiff_t stride     - Stride of dat
+ * size_t len           - Length of the data vector
+ * double lo            - Minimum valid value
+ * double hi            - Maximum valid value
+ */
+#define RANGE_DECLARE(T, SUFFIX) \
+int range_strided##SUFFIX(signed char *out, ptrdiff_t out_stride, const T *dat, ptrdiff_t stride, \
+                          size_t len, double lo, double hi);
+
+QC_FOR_EACH_TYPE(RANGE_DECLARE)
+
+#endif /* __RANGE_H__ */
@@ -0,0 +1,81 @@
+#include <stdlib.h>
+#include <string.h>
+
+#include "runs.h"
+
+static int runs_grow(qc_runs *runs)
+{
+    size_t cap = runs->cap ? 2 * runs->cap : 64;
+    qc_run *tmp = realloc(runs->runs, cap * sizeof(qc_run));
+    if(!tmp)
+        return -1;
+    runs->runs = tmp;
+    runs->cap = cap;
+    return 0;
+}
+
+int runs_push(qc_runs *runs, size_t i, signed char code)
+{
+    qc_run *last;
+    if(code == 1)
+        return 0;
+    if(runs->len) {
+        last = runs->runs + runs->len - 1;
+        if(last->stop == i && last->code == code) {
+            last->stop++;
+            return 0;
+        }
+    }
+    if(runs->len == runs->cap && runs_grow(runs))
+        return -1;
+    runs->runs[runs->len++] = (qc_run) {i, i + 1, code};
+    return 0;
+}
+
+/*
+ * runs_encode
+ *
+ * Skips the passes a sample at a time and adds each other stretch of equal
+ * flags as a whole.
+ */
+int runs_encode(qc_runs *runs, const signed char *flags, size_t offset, size_t len)
+{
+    size_t i=0, j;
+    qc_run *last;
+    while(i < len) {
+        if(flags[i] == 1) {
+            i++;
+            continue;
+        }
+        for(j=i+1;j<len && flags[j]==flags[i];j++);
+        last = runs->len ? runs->runs + runs->len - 1 : NULL;
+        if(last && last->stop == offset + i && last->code == flags[i]) {
+            last->stop = offset + j;
+        }
+        else {
+            if(runs->len == runs->cap && runs_grow(runs))
+                return -1;
+            runs->runs[runs->len++] = (qc_run) {offset + i, offset + j, flags[i]};
+        }
+        i = j;
+    }
+    return 0;
+}
+
+void runs_expand(signed char *out, size_t len, const qc_run *runs, size_t nruns)
+{
+    size_t k, stop;
+    for(k=0;k<nruns;k++) {
+        if(runs[k].start >= len)
+            continue;
+        stop = (runs[k].stop < len) ? runs[k].stop : len;
+        memset(out + runs[k].start, runs[k].code, stop - runs[k].start);
+    }
+}
+
+void runs_free(qc_runs *runs)
+{
+    free(runs->runs);
+    runs->runs = NULL;
+    runs->len = runs->cap = 0;
+}
@@ -0,0 +1,55 @@
+#ifndef __RUNS_H__
+#define __RUNS_H__
+
+#include <stddef.h>
+
+/*
+ * A run of samples [start, stop) that share a flag other than 1
+ */
+typedef struct {
+    size_t start;
+    size_t stop;
+    signed char code;
+} qc_run;
+
+/*
+ * Growable list of runs in increasing order. Initialize with {NULL, 0, 0}
+ * and release with runs_free.
+ */
+typedef struct {
+    qc_run *runs;
+    size_t len;
+    size_t cap;
+} qc_runs;
+
+/*
+ * runs_push
+ *
+ * Adds the flag code of sample i, which must be past the samples already
+ * added. A code of 1 is a pass and is not stored; a code equal to the last
+ * run's that follows it directly extends that run.
+ *
+ * Returns 0, or -1 if the list could not grow.
+ */
+int runs_push(qc_runs *runs, size_t i, signed char code);
+
+/*
+ * runs_encode
+ *
+ * Adds the flags of samples offset to offset + len, flags[0:len].
+ *
+ * Returns 0, or -1 if the list could not grow.
+ */
+int runs_encode(qc_runs *runs, const signed char *flags, size_t offset, size_t len);
+
+/*
+ * runs_expand
+ *
+ * Writes the runs into out[0:len], which should be initialized to 1s.
+ * Runs past len are cut.
+ */
+void runs_expand(signed char *out, size_t len, const qc_run *runs, size_t nruns);
+
+void runs_free(qc_runs *runs);
+
+#endif /* __RUNS_H__ */
@@ -1,5 +1,10 @@
 #include <stdio.h>
+#include <stdlib.h>
+#include <math.h>
+#include <float.h>
 
+#include "spike.h"
+#include "deque.h"
 
 static inline double double_max(double a, double b)
 {
@@ -12,62 +17,41 @@ static inline double double_abs(double a)
 }
 
 
-static signed char window_spike(
-            const double *sub_array, 
-            size_t window_len, 
-            size_t window_index, 
-            double N, 
-            double ACC) 
+/*
+ * Bound on the rounding error between the running leave-one-out mean and the
+ * mean window_spike() computes by summing the window in order. The running
+ * sum is rebuilt from scratch at least once every L steps, so it never
+ * accumulates more than O(L) additions of values no larger than abs_max.
+ */
+static inline double spike_guard(size_t L, double abs_max, double focus)
 {
-    size_t j=0;
-    double focus;
-    double max=0;
-    double min=0;
-    double mean=0;
-    double R=0;
-    char initialized=0;
-    for(j=0;j<window_len;j++) {
-        if(j==window_index) { 
-            /*
-             * If j is the focus of this window then set it and continue
-             */
-            focus = sub_array[j];
-            continue;
-        }
-        if(!initialized) {
-            /*
-             * If we haven't initialized max, min do so now
-             */
-            max = min = sub_array[j]; 
-            initialized = 1;
-        }
-        if(sub_array[j] > max)
-            /*
-             * Keep track of the max value in the sub_array
-             */
-            max = sub_array[j];
-        if(sub_array[j] < min)
-            /*
-             * Keep track of the min as well
-             */
-            min = sub_array[j];
-        /*
-         * Sum the elements to make a mean later
-         */
-        mean+= sub_array[j];
-    }
-    mean = mean/(window_len-1);
-    R = max - min;
-    R = double_max(R, ACC);
-    if( double_abs(focus - mean) > (N*R)) {
-        /*
-         * If the deviation of the focus exceeds N*R then it is a spike value
-         */
-        return 0;
-    }
-    return 1;
+    return (8.0 * L + 8.0) * DBL_EPSILON * (abs_max + double_abs(focus));
 }
 
+#define QC_T double
+#define QC_SUFFIX
+#include "spike_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T float
+#define QC_SUFFIX _float32
+#include "spike_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T int32_t
+#define QC_SUFFIX _int32
+#include "spike_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
+#define QC_T int16_t
+#define QC_SUFFIX _int16
+#include "spike_impl.h"
+#undef QC_T
+#undef QC_SUFFIX
+
 /*
  * spike
  *
@@ -86,29 +70,29 @@ static signed char window_spike(
  */
 int spike(signed char *out, const double *dat, size_t len, int L, double N, double ACC) 
 {
-    size_t i;
-    size_t L2 = L/2;
-    if(len < L) {
-        return 0;
-    }
-    for(i=0;i<=(len-L);i++) {
-        /*
-         * Iterate through the main (center) part of the array
-         */
-        out[i+L2] = window_spike(dat + i, L, L2, N, ACC);
-    }
-    for(i=0;i<L2;i++) {
-        /*
-         * Do the beginning
-         */
-        out[i] = window_spike(dat, L, i, N, ACC);
-    }
-    for(i=L2;i<L;i++) {
-        /*
-         * Do the ending
-         */
-        out[(len-L) + i] = window_spike(dat + (len-L), L, i, N, ACC);
-    }
-    return 1;
+    return spike_strided(out, 1, dat, 1, len, L, N, ACC);
+}
+
+/*
+ * spike_running
+ *
+ * Produces the same flags as spike() in O(len) time regardless of the window
+ * length. The leave-one-out window around each focus is split into the values
+ * before and after it; the extrema of each half are tracked with monotonic
+ * deques and the mean with a running sum of the whole window. Windows that
+ * hold non-finite values, and decisions that fall within rounding distance of
+ * the threshold, are evaluated by window_spike() directly.
+ *
+ * Arguments:
+ * signed char *out  - The output array of flags
+ * const double *dat - The data vector
+ * size_t len        - Length of the data vector
+ * int L             - Window Length
+ * double N          - Range multipier
+ * double ACC        - accuracy
+ */
+int spike_running(signed char *out, const double *dat, size_t len, int L, double N, double ACC)
+{
+    return spike_running_strided(out, 1, dat, 1, len, L, N, ACC);
 }
 
@@ -1,6 +1,10 @@
 #ifndef __SPIKE_H__
 #define __SPIKE_H__
 
+#include <stddef.h>
+
+#include "qc_types.h"
+
 /*
  * spike
  *
@@ -19,4 +23,42 @@
  */
 int spike(signed char *out, const double *dat, size_t len, int L, double N, double acc);
 
+/*
+ * spike_running
+ *
+ * Same flags as spike(), computed in O(len) time independent of the window
+ * length by tracking the leave-one-out extrema with monotonic deques and the
+ * mean with a running sum. The rescanning kernel is faster for short windows,
+ * SPIKE_RUNNING_MIN_L is the window length from which this one should be used.
+ *
+ * Arguments:
+ * signed char *out  - The output array of flags
+ * const double *dat - The data vector
+ * size_t len        - Length of the data vector
+ * int L             - Window Length
+ * double N          - Range multipier
+ * double ACC        - accuracy
+ */
+int spike_running(signed char *out, const double *dat, size_t len, int L, double N, double acc);
+
+/*
+ * spike_strided, spike_running_strided
+ *
+ * spike and spike_running over a data vector that is not contiguous, e.g. a
+ * column of a C ordered 2-D array. Element i is dat[i * stride] and its flag
+ * out[i * out_stride]. Strides are counted in elements, not bytes.
+ *
+ * Declared for each element type of qc_types.h: spike_strided over double,
+ * spike_strided_float32 over float and so on.
+ */
+#define SPIKE_DECLARE(T, SUFFIX) \
+int spike_strided##SUFFIX(signed char *out, ptrdiff_t out_stride, const T *dat, ptrdiff_t stride, \
+                          size_t len, int L, double N, double acc); \
+int spike_running_strided##SUFFIX(signed char *out, ptrdiff_t out_stride, const T *dat, ptrdiff_t stride, \
+                                  size_t len, int L, double N, double acc);
+
+QC_FOR_EACH_TYPE(SPIKE_DECLARE)
+
+#define SPIKE_RUNNING_MIN_L 48
+
 #endif /* __SPIKE_H__ */
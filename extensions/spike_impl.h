@@ -0,0 +1,327 @@
+/*
+ * spike_impl.h -- The spike kernels over vectors of QC_T, included by
+ * spike.c once for each type of qc_types.h
+ */
+
+static signed char QC_NAME(window_spike)(
+            const QC_T *sub_array, 
+            ptrdiff_t stride,
+            size_t window_len, 
+            size_t window_index, 
+            double N, 
+            double ACC) 
+{
+    size_t j=0;
+    double focus;
+    double max=0;
+    double min=0;
+    double mean=0;
+    double R=0;
+    char initialized=0;
+    for(j=0;j<window_len;j++) {
+        if(j==window_index) { 
+            /*
+             * If j is the focus of this window then set it and continue
+             */
+            focus = sub_array[(ptrdiff_t) j * stride];
+            continue;
+        }
+        if(!initialized) {
+            /*
+             * If we haven't initialized max, min do so now
+             */
+            max = min = sub_array[(ptrdiff_t) j * stride]; 
+            initialized = 1;
+        }
+        if(sub_array[(ptrdiff_t) j * stride] > max)
+            /*
+             * Keep track of the max value in the sub_array
+             */
+            max = sub_array[(ptrdiff_t) j * stride];
+        if(sub_array[(ptrdiff_t) j * stride] < min)
+            /*
+             * Keep track of the min as well
+             */
+            min = sub_array[(ptrdiff_t) j * stride];
+        /*
+         * Sum the elements to make a mean later
+         */
+        mean+= sub_array[(ptrdiff_t) j * stride];
+    }
+    mean = mean/(window_len-1);
+    R = max - min;
+    R = double_max(R, ACC);
+    if( double_abs(focus - mean) > (N*R)) {
+        /*
+         * If the deviation of the focus exceeds N*R then it is a spike value
+         */
+        return 0;
+    }
+    return 1;
+}
+
+/*
+ * spike_strided
+ *
+ * spike over a data vector whose elements are stride elements apart, writing
+ * the flags out_stride apart.
+ */
+int QC_NAME(spike_strided)(
+            signed char *out,
+            ptrdiff_t out_stride,
+            const QC_T *dat,
+            ptrdiff_t stride,
+            size_t len,
+            int L,
+            double N,
+            double ACC) 
+{
+    size_t i;
+    size_t L2 = L/2;
+    if(len < L) {
+        return 0;
+    }
+    for(i=0;i<=(len-L);i++) {
+        /*
+         * Iterate through the main (center) part of the array
+         */
+        out[(ptrdiff_t) (i+L2) * out_stride] = QC_NAME(window_spike)(dat + (ptrdiff_t) i * stride, stride, L, L2, N, ACC);
+    }
+    for(i=0;i<L2;i++) {
+        /*
+         * Do the beginning
+         */
+        out[(ptrdiff_t) i * out_stride] = QC_NAME(window_spike)(dat, stride, L, i, N, ACC);
+    }
+    for(i=L2;i<L;i++) {
+        /*
+         * Do the ending
+         */
+        out[(ptrdiff_t) ((len-L) + i) * out_stride] = QC_NAME(window_spike)(dat + (ptrdiff_t) (len-L) * stride, stride, L, i, N, ACC);
+    }
+    return 1;
+}
+
+/*
+ * Evaluates the flag from the leave-one-out statistics of a window. When the
+ * deviation lands within the rounding guard of the threshold, the decision is
+ * handed back to window_spike() so the flags match it exactly.
+ */
+static inline signed char QC_NAME(running_flag)(
+            const QC_T *sub_array,
+            ptrdiff_t stride,
+            size_t window_len,
+            size_t window_index,
+            double sum,
+            double min,
+            double max,
+            double abs_max,
+            double N,
+            double ACC)
+{
+    double focus = sub_array[(ptrdiff_t) window_index * stride];
+    double mean = (sum - focus)/(window_len-1);
+    double R = double_max(max - min, ACC);
+    double dev = double_abs(focus - mean);
+
+    if(!isfinite(mean) || !(double_abs(dev - N*R) > spike_guard(window_len, abs_max, focus)))
+        return QC_NAME(window_spike)(sub_array, stride, window_len, window_index, N, ACC);
+    return (dev > N*R) ? 0 : 1;
+}
+
+/*
+ * Flags every focus in [first, last) of a single, fixed window of length L,
+ * using prefix and suffix extrema of the window so that each focus costs O(1).
+ */
+static void QC_NAME(edge_spike)(
+            signed char *out,
+            ptrdiff_t out_stride,
+            const QC_T *sub_array,
+            ptrdiff_t stride,
+            size_t L,
+            size_t first,
+            size_t last,
+            double N,
+            double ACC,
+            double *scratch)
+{
+    double *pre_min = scratch;
+    double *pre_max = scratch + L;
+    double *suf_min = scratch + 2*L;
+    double *suf_max = scratch + 3*L;
+    double sum=0;
+    double abs_max=0;
+    double min, max;
+    double v;
+    size_t j;
+
+    for(j=0;j<L;j++) {
+        v = sub_array[(ptrdiff_t) j * stride];
+        if(!isfinite(v)) {
+            for(j=first;j<last;j++)
+                out[(ptrdiff_t) j * out_stride] = QC_NAME(window_spike)(sub_array, stride, L, j, N, ACC);
+            return;
+        }
+        sum += v;
+        abs_max = double_max(abs_max, double_abs(v));
+        pre_min[j] = pre_max[j] = v;
+        if(j) {
+            if(pre_min[j-1] < pre_min[j]) pre_min[j] = pre_min[j-1];
+            if(pre_max[j-1] > pre_max[j]) pre_max[j] = pre_max[j-1];
+        }
+    }
+    for(j=L;j-->0;) {
+        suf_min[j] = suf_max[j] = sub_array[(ptrdiff_t) j * stride];
+        if(j<L-1) {
+            if(suf_min[j+1] < suf_min[j]) suf_min[j] = suf_min[j+1];
+            if(suf_max[j+1] > suf_max[j]) suf_max[j] = suf_max[j+1];
+        }
+    }
+    for(j=first;j<last;j++) {
+        if(j==0) {
+            min = suf_min[1];
+            max = suf_max[1];
+        }
+        else if(j==L-1) {
+            min = pre_min[L-2];
+            max = pre_max[L-2];
+        }
+        else {
+            min = (pre_min[j-1] < suf_min[j+1]) ? pre_min[j-1] : suf_min[j+1];
+            max = (pre_max[j-1] > suf_max[j+1]) ? pre_max[j-1] : suf_max[j+1];
+        }
+        out[(ptrdiff_t) j * out_stride] = QC_NAME(running_flag)(sub_array, stride, L, j, sum, min, max, abs_max, N, ACC);
+    }
+}
+
+/*
+ * spike_running_strided
+ *
+ * spike_running over a data vector whose elements are stride elements apart,
+ * writing the flags out_stride apart.
+ */
+int QC_NAME(spike_running_strided)(
+            signed char *out,
+            ptrdiff_t out_stride,
+            const QC_T *dat,
+            ptrdiff_t stride,
+            size_t len,
+            int L,
+            double N,
+            double ACC)
+{
+    size_t L2 = L/2;
+    size_t k, s, j;
+    size_t last;
+    size_t since_seed=0;
+    size_t cap=dq_capacity(L);
+    size_t nonfinite=0;
+    size_t *buf;
+    double *scratch;
+    double sum=0;
+    double abs_max=0;
+    double min, max;
+    mono_deque left_min, left_max, right_min, right_max;
+
+#define DAT(i) ((double) dat[(ptrdiff_t) (i) * stride])
+
+    if(L < 3 || len < L) {
+        return QC_NAME(spike_strided)(out, out_stride, dat, stride, len, L, N, ACC);
+    }
+    buf = malloc(sizeof(size_t) * 4 * cap + sizeof(double) * 4 * L);
+    if(!buf) {
+        return QC_NAME(spike_strided)(out, out_stride, dat, stride, len, L, N, ACC);
+    }
+    scratch = (double *) (buf + 4 * cap);
+    left_min = (mono_deque) {buf, cap-1, 0, 0};
+    left_max = (mono_deque) {buf + cap, cap-1, 0, 0};
+    right_min = (mono_deque) {buf + 2*cap, cap-1, 0, 0};
+    right_max = (mono_deque) {buf + 3*cap, cap-1, 0, 0};
+
+    /*
+     * Prime the deques and the running sum with the first window
+     */
+    for(j=0;j<L;j++) {
+        if(!isfinite(DAT(j))) {
+            nonfinite++;
+            continue;
+        }
+        sum += DAT(j);
+        abs_max = double_max(abs_max, double_abs(DAT(j)));
+        if(j < L2) {
+            QC_NAME(dq_push_min)(&left_min, dat, stride, j);
+            QC_NAME(dq_push_max)(&left_max, dat, stride, j);
+        }
+        else if(j > L2) {
+            QC_NAME(dq_push_min)(&right_min, dat, stride, j);
+            QC_NAME(dq_push_max)(&right_max, dat, stride, j);
+        }
+    }
+
+    last = len - L + L2;
+    for(k=L2;k<=last;k++) {
+        s = k - L2;
+        if(k > L2) {
+            /*
+             * Slide the window by one: DAT(s-1) leaves, DAT(s+L-1) enters and
+             * the old focus DAT(k-1) moves into the left half.
+             */
+            if(isfinite(DAT(s-1)))
+                sum -= DAT(s-1);
+            else
+                nonfinite--;
+            if(isfinite(DAT(s+L-1))) {
+                sum += DAT(s+L-1);
+                abs_max = double_max(abs_max, double_abs(DAT(s+L-1)));
+                QC_NAME(dq_push_min)(&right_min, dat, stride, s+L-1);
+                QC_NAME(dq_push_max)(&right_max, dat, stride, s+L-1);
+            }
+            else
+                nonfinite++;
+            if(isfinite(DAT(k-1))) {
+                QC_NAME(dq_push_min)(&left_min, dat, stride, k-1);
+                QC_NAME(dq_push_max)(&left_max, dat, stride, k-1);
+            }
+            dq_expire(&left_min, s);
+            dq_expire(&left_max, s);
+            dq_expire(&right_min, k+1);
+            dq_expire(&right_max, k+1);
+
+            if(++since_seed >= L) {
+                /*
+                 * Rebuild the sum so the rounding error stays bounded
+                 */
+                sum = abs_max = 0;
+                for(j=s;j<s+L;j++) {
+                    if(isfinite(DAT(j))) {
+                        sum += DAT(j);
+                        abs_max = double_max(abs_max, double_abs(DAT(j)));
+                    }
+                }
+                since_seed = 0;
+            }
+        }
+        if(nonfinite) {
+            out[(ptrdiff_t) k * out_stride] = QC_NAME(window_spike)(dat + (ptrdiff_t) s * stride, stride, L, L2, N, ACC);
+            continue;
+        }
+        min = DAT(dq_front(&left_min));
+        max = DAT(dq_front(&left_max));
+        if(DAT(dq_front(&right_min)) < min)
+            min = DAT(dq_front(&right_min));
+        if(DAT(dq_front(&right_max)) > max)
+            max = DAT(dq_front(&right_max));
+        out[(ptrdiff_t) k * out_stride] = QC_NAME(running_flag)(dat + (ptrdiff_t) s * stride, stride, L, L2, sum, min, max, abs_max, N, ACC);
+    }
+
+    /*
+     * The beginning and the ending share a single window each
+     */
+    QC_NAME(edge_spike)(out, out_stride, dat, stride, L, 0, L2, N, ACC, scratch);
+    QC_NAME(edge_spike)(out + (ptrdiff_t) (len-L) * out_stride, out_stride,
+               dat + (ptrdiff_t) (len-L) * stride, stride, L, L2, L, N, ACC, scratch);
+
+    free(buf);
+    return 1;
+#undef DAT
+}
@@ -1,6 +1,41 @@
 #ifndef __STUCK_H__
 #define __STUCK_H__
 
+#include <stddef.h>
+
+#include "qc_types.h"
+
+/*
+ * stuck
+ *
+ * Sets out[i] to 0 where dat[i] belongs to a run of at least num successive
+ * values that are all within reso of the last value of the run. Runs in O(len)
+ * time independent of num. The out array should be initialized to 1s by the
+ * client.
+ *
+ * Arguments:
+ * signed char *out  - The output array of flags
+ * const double *dat - The data vector
+ * size_t len        - Length of the data vector
+ * double reso       - Resolution, values closer than reso are repeats
+ * int num           - Minimum number of repeats that is a stuck value
+ */
 int stuck(signed char *out, const double *dat, size_t len, double reso, int num);
 
+/*
+ * stuck_strided
+ *
+ * stuck over a data vector that is not contiguous, e.g. a column of a C
+ * ordered 2-D array. Element i is dat[i * stride] and its flag
+ * out[i * out_stride]. Strides are counted in elements, not bytes.
+ *
+ * Declared for each element type of qc_types.h: stuck_strided over double,
+ * stuck_strided_float32 over float and so on.
+ */
+#define STUCK_DECLARE(T, SUFFIX) \
+int stuck_strided##SUFFIX(signed char *out, ptrdiff_t out_stride, const T *dat, ptrdiff_t stride, \
+                          size_t len, double reso, int num);
+
+QC_FOR_EACH_TYPE(STUCK_DECLARE)
+
 #endif /* __STUCK_H__ */
@@ -0,0 +1,71 @@
+/*
+ * stuck_impl.h -- The stuck value kernel over vectors of QC_T, included by
+ * stuck.c once for each type of qc_types.h
+ */
+
+/*
+ * stuck_strided
+ * stuck over a data vector whose elements are stride elements apart, writing
+ * the flags out_stride apart.
+ */
+int QC_NAME(stuck_strided)(signed char *out, ptrdiff_t out_stride, const QC_T *dat, ptrdiff_t stride,
+                           size_t len, double reso, int num)
+{
+    size_t i;
+    size_t w;
+    size_t flagged=0;   /* OUT(0:flagged) has already been written */
+    size_t nans=0;      /* NaNs within the num-1 preceding values */
+    size_t *buf;
+    mono_deque lo, hi;
+
+#define DAT(i) ((double) dat[(ptrdiff_t) (i) * stride])
+#define OUT(i) out[(ptrdiff_t) (i) * out_stride]
+
+    if(num < 1 || len < num) {
+        return 0;
+    }
+    if(num == 1) {
+        /* Every value is a run of its own */
+        for(i=0;i<len;i++) {
+            if(fabs(DAT(i) - DAT(i)) < reso)
+                OUT(i) = 0;
+        }
+        return 0;
+    }
+    w = num - 1;
+    buf = malloc(sizeof(size_t) * 2 * dq_capacity(num));
+    if(!buf) {
+        return -1;
+    }
+    lo = (mono_deque) {buf, dq_capacity(num) - 1, 0, 0};
+    hi = (mono_deque) {buf + dq_capacity(num), dq_capacity(num) - 1, 0, 0};
+
+    for(i=0;i<len;i++) {
+        if(i >= w) {
+            /*
+             * The deques hold DAT(i-w:i). The run ending at i is stuck when
+             * both its extrema lie within reso of DAT(i).
+             */
+            if(!nans && !isnan(DAT(i)) &&
+                    fabs(DAT(i) - DAT(dq_front(&lo))) < reso &&
+                    fabs(DAT(dq_front(&hi)) - DAT(i)) < reso) {
+                for(flagged = (flagged > i - w) ? flagged : i - w; flagged <= i; flagged++)
+                    OUT(flagged) = 0;
+            }
+            if(isnan(DAT(i - w)))
+                nans--;
+            dq_expire(&lo, i - w + 1);
+            dq_expire(&hi, i - w + 1);
+        }
+        if(isnan(DAT(i))) {
+            nans++;
+        } else {
+            QC_NAME(dq_push_min)(&lo, dat, stride, i);
+            QC_NAME(dq_push_max)(&hi, dat, stride, i);
+        }
+    }
+    free(buf);
+    return 0;
+#undef DAT
+#undef OUT
+}
@@ -1,4 +1,5 @@
 #include <stdio.h>
+#include <string.h>
 #include <strings.h>
 #include <unistd.h>
 #include <stdlib.h>
@@ -6,10 +7,13 @@
 #include <math.h>
 #include <float.h>
 #include "spike.h"
+#include "stuck.h"
 #include "utils.h"
 #include "polycals.h"
 #include "time_utils.h"
 #include "gradient.h"
+#include "qc_suite.h"
+#include "range.h"
 #include "wmm.h"
 
 void arange(double *arr, size_t len);
@@ -20,6 +24,13 @@ void print_array_size_t(size_t *array, size_t len);
 char test_spike_simple(void);
 char test_spike_l(void);
 char test_spike_long(void);
+char test_spike_running(void);
+char test_stuck(void);
+char test_stuck_overlap(void);
+char test_strided(void);
+char test_range(void);
+char test_qc_suite(void);
+char test_qc_suite_runs(void);
 char test_polyval(void);
 char test_gradient(void);
 char test_gradient2(void);
@@ -30,6 +41,7 @@ char test_gradient6(void);
 char test_time_month(void);
 char test_time_vector(void);
 char test_time_vector_split(void);
+char test_time_civil(void);
 char test_mag_decl(void);
 char test_velocity_corr(void);
 char test_search_sorted(void);
@@ -46,6 +58,13 @@ int main(int argc, char *argv[])
     test(&test_spike_simple);
     test(&test_spike_l);
     test(&test_spike_long);
+    test(&test_spike_running);
+    test(&test_stuck);
+    test(&test_stuck_overlap);
+    test(&test_strided);
+    test(&test_range);
+    test(&test_qc_suite);
+    test(&test_qc_suite_runs);
     test(&test_polyval);
     test(&test_gradient);
     test(&test_gradient2);
@@ -56,6 +75,7 @@ int main(int argc, char *argv[])
     test(&test_time_month);
     test(&test_time_vector);
     test(&test_time_vector_split);
+    test(&test_time_civil);
     test(&test_mag_decl);
     test(&test_velocity_corr);
     test(&test_search_sorted);
@@ -207,6 +227,37 @@ char test_time_vector_split()
     }
     return true;
 }
+char test_time_civil()
+{
+    /* 1900-01-01, 1970-01-01, 2000-02-29 23:59:59.75, 2012-12-31 12:00 */
+    double dat[] = {0, 2208988800, 3160857599.75, 3565944000, NAN};
+    int year[] = {1900, 1970, 2000, 2012, 0};
+    short int month[] = {1, 1, 2, 12, 0};
+    short int day[] = {1, 1, 29, 31, 0};
+    short int yday[] = {1, 1, 60, 366, 0};
+    double sod[] = {0, 0, 86399.75, 43200};
+    int r_year[5];
+    short int r_month[5], r_day[5], r_yday[5];
+    double r_sod[5];
+
+    printf("test_time_civil... ");
+
+    ntp_civil_vector(dat, 5, r_year, r_month, r_day, r_yday, r_sod);
+    for(int i=0;i<5;i++) {
+        if(year[i] != r_year[i] || month[i] != r_month[i] || day[i] != r_day[i] ||
+                yday[i] != r_yday[i] || (i < 4 && sod[i] != r_sod[i])) {
+            message = "Expected doesn't match received";
+            printf("\n%d: %d-%d-%d %d %f\n", i, r_year[i], r_month[i], r_day[i], r_yday[i], r_sod[i]);
+            return false;
+        }
+    }
+    if(!isnan(r_sod[4])) {
+        message = "Expected NaN seconds of day";
+        return false;
+    }
+    return true;
+}
+
 char test_time_month()
 {
     double tval = 3580142023.566965;
@@ -475,6 +526,332 @@ char test_spike_long()
     return 1;
 }
 
+char test_spike_running()
+{
+    const size_t len = 500;
+    double dat[len];
+    signed char expected[len];
+    signed char output[len];
+    int windows[] = {3, 4, 7, 50, 101, 499, 500};
+    size_t i=0, j=0;
+    printf("test_spike_running... ");
+
+    srand(42);
+    for(i=0;i<len;i++) {
+        dat[i] = sin(i / 10.) + (rand() / (double) RAND_MAX);
+        if(!(rand() % 40))
+            dat[i] += 20; /* Make some spikes */
+    }
+    dat[250] = NAN;
+    for(j=0;j<sizeof(windows)/sizeof(int);j++) {
+        memset(expected, 1, len);
+        memset(output, 1, len);
+        spike(expected, dat, len, windows[j], 2, 0.1);
+        spike_running(output, dat, len, windows[j], 2, 0.1);
+        for(i=0;i<len;i++) {
+            if(expected[i] != output[i]) {
+                message = "Running kernel does not match spike.";
+                printf("\nL=%d, index %lu\n", windows[j], i);
+                return 0;
+            }
+        }
+    }
+    return 1;
+}
+
+char test_stuck()
+{
+    double dat[] = {4.83, 1.40, 3.33, 3.33, 3.33, 3.33, 4.09, 2.97, 2.85, 3.67};
+    signed char expected[] = {1, 1, 0, 0, 0, 0, 1, 1, 1, 1};
+    size_t len = sizeof(dat)/sizeof(double);
+    signed char output[len];
+    size_t i=0;
+    printf("test_stuck... ");
+
+    memset(output, 1, len);
+    stuck(output, dat, len, 0.001, 4);
+    for(i=0;i<len;i++) {
+        if(expected[i] != output[i]) {
+            message = "Expected does not match received.";
+            printf("\n");
+            print_array(expected, len);
+            print_array(output, len);
+            return 0;
+        }
+    }
+    return 1;
+}
+
+char test_stuck_overlap()
+{
+    /* Values drift within reso of their neighbours but not of the run end */
+    double dat[] = {1.0, 1.0, 1.0, 1.05, 1.1, 1.1, 1.1, 1.1, NAN, 1.1, 1.1, 1.1};
+    signed char expected[] = {0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1};
+    size_t len = sizeof(dat)/sizeof(double);
+    signed char output[len];
+    size_t i=0;
+    printf("test_stuck_overlap... ");
+
+    memset(output, 1, len);
+    stuck(output, dat, len, 0.06, 4);
+    for(i=0;i<len;i++) {
+        if(expected[i] != output[i]) {
+            message = "Expected does not match received.";
+            printf("\n");
+            print_array(expected, len);
+            print_array(output, len);
+            return 0;
+        }
+    }
+    return 1;
+}
+
+char test_strided()
+{
+    /* Each column of a C ordered 2-D array against its contiguous copy */
+    const size_t len = 300;
+    const size_t ncols = 3;
+    double dat[len * ncols];
+    double x[len];
+    double column[len];
+    signed char out[len * ncols];
+    signed char expected[len];
+    size_t i=0, c=0;
+    printf("test_strided... ");
+
+    srand(7);
+    for(i=0;i<len*ncols;i++) {
+        dat[i] = floor(4 * rand() / (double) RAND_MAX) * 0.5;
+        if(!(rand() % 30))
+            dat[i] += 20;
+    }
+    for(i=0;i<len;i++)
+        x[i] = i + (i % 3 ? 0 : 0.5);
+
+    for(c=0;c<ncols;c++) {
+        for(i=0;i<len;i++)
+            column[i] = dat[i * ncols + c];
+
+        memset(expected, 1, len);
+        memset(out, 1, len * ncols);
+        spike(expected, column, len, 61, 2, 0.1);
+        spike_running_strided(out + c, ncols, dat + c, ncols, len, 61, 2, 0.1);
+        for(i=0;i<len;i++) {
+            if(expected[i] != out[i * ncols + c]) {
+                message = "Strided spike does not match spike.";
+                return 0;
+            }
+        }
+
+        memset(expected, 1, len);
+        memset(out, 1, len * ncols);
+        stuck(expected, column, len, 0.01, 3);
+        stuck_strided(out + c, ncols, dat + c, ncols, len, 0.01, 3);
+        for(i=0;i<len;i++) {
+            if(expected[i] != out[i * ncols + c]) {
+                message = "Strided stuck does not match stuck.";
+                return 0;
+            }
+        }
+
+        memset(expected, 1, len);
+        memset(out, 1, len * ncols);
+        gradient(expected, column, x, len, -2, 2, 0.6, 0, 1, -99);
+        gradient_strided(out + c, ncols, dat + c, ncols, x, 1, len, -2, 2, 0.6, 0, 1, -99);
+        for(i=0;i<len;i++) {
+            if(expected[i] != out[i * ncols + c]) {
+                message = "Strided gradient does not match gradient.";
+                return 0;
+            }
+        }
+    }
+    return 1;
+}
+
+char test_range()
+{
+    /* Columns of a 2-D block, each against its own limits, NaN fails */
+    double dat[4][2] = {{9, 1.5}, {10, NAN}, {20, 2.5}, {20.5, -1}};
+    int16_t counts[4] = {-3, 0, 7, 12};
+    double lo[2] = {10, 0};
+    double hi[2] = {20, 2};
+    signed char expected[4][2] = {{0, 1}, {1, 0}, {1, 0}, {0, 0}};
+    signed char expected_counts[4] = {0, 1, 1, 0};
+    signed char out[4][2];
+    size_t i=0, c=0;
+    printf("test_range... ");
+
+    for(c=0;c<2;c++)
+        range_strided(&out[0][c], 2, &dat[0][c], 2, 4, lo[c], hi[c]);
+    for(i=0;i<4;i++) {
+        for(c=0;c<2;c++) {
+            if(out[i][c] != expected[i][c]) {
+                message = "Range flags do not match.";
+                return 0;
+            }
+        }
+    }
+    range_strided_int16(&out[0][0], 2, counts, 1, 4, 0, 10);
+    for(i=0;i<4;i++) {
+        if(out[i][0] != expected_counts[i]) {
+            message = "Range flags of int16 do not match.";
+            return 0;
+        }
+    }
+    return 1;
+}
+
+char test_qc_suite()
+{
+    /* The fused suite against each kernel on the whole vector */
+    const size_t len = 500;
+    const size_t blocks[] = {1, 5, 64, 0};
+    const int Ls[] = {7, 61};
+    double dat[len];
+    double x[len];
+    signed char flags[4][len];
+    uint16_t out[len];
+    uint16_t expected;
+    qc_suite_config cfg;
+    size_t i=0, k=0, l=0;
+    printf("test_qc_suite... ");
+
+    srand(11);
+    for(i=0;i<len;i++) {
+        dat[i] = floor(4 * rand() / (double) RAND_MAX) * 0.5;
+        if(!(rand() % 25))
+            dat[i] += 20;
+    }
+    /* Runs of points closer than mindx, which the gradient test skips */
+    x[0] = 0;
+    for(i=1;i<len;i++)
+        x[i] = x[i-1] + ((i / 40) % 2 ? 0.1 : 1.0);
+
+    for(l=0;l<2;l++) {
+        memset(&cfg, 0, sizeof(cfg));
+        cfg.range_bit = 1;
+        cfg.range_min = 0.2;
+        cfg.range_max = 20;
+        cfg.spike_bit = 4;
+        cfg.spike_L = Ls[l];
+        cfg.spike_N = 2;
+        cfg.spike_acc = 0.1;
+        cfg.stuck_bit = 16;
+        cfg.stuck_reso = 0.01;
+        cfg.stuck_num = 3;
+        cfg.gradient_bit = 32;
+        cfg.grad_min = -2;
+        cfg.grad_max = 2;
+        cfg.grad_mindx = 0.6;
+        cfg.grad_toldat = 1;
+
+        memset(flags, 1, sizeof(flags));
+        for(i=0;i<len;i++)
+            flags[0][i] = (0.2 <= dat[i] && dat[i] <= 20);
+        spike(flags[1], dat, len, Ls[l], 2, 0.1);
+        stuck(flags[2], dat, len, 0.01, 3);
+        gradient(flags[3], dat, x, len, -2, 2, 0.6, 0, 1, -99);
+
+        for(k=0;k<4;k++) {
+            for(i=0;i<len;i++)
+                out[i] = 0xffff;
+            if(qc_suite(out, dat, x, len, &cfg, blocks[k])) {
+                message = "qc_suite failed to allocate.";
+                return 0;
+            }
+            for(i=0;i<len;i++) {
+                expected = 0xffff;
+                if(!flags[0][i]) expected &= ~1;
+                if(!flags[1][i]) expected &= ~4;
+                if(!flags[2][i]) expected &= ~16;
+                if(!flags[3][i]) expected &= ~32;
+                if(out[i] != expected) {
+                    message = "qc_suite does not match the separate tests.";
+                    return 0;
+                }
+            }
+        }
+    }
+    return 1;
+}
+
+char test_qc_suite_runs()
+{
+    /* The runs of each test expand to the flags of its kernel */
+    const size_t len = 500;
+    const size_t blocks[] = {1, 5, 64, 0};
+    double dat[len];
+    double x[len];
+    signed char flags[QC_SUITE_TESTS][len];
+    signed char got[len];
+    qc_runs runs[QC_SUITE_TESTS];
+    qc_suite_config cfg;
+    size_t i=0, k=0, t=0, n=0;
+    printf("test_qc_suite_runs... ");
+
+    srand(12);
+    for(i=0;i<len;i++) {
+        dat[i] = floor(4 * rand() / (double) RAND_MAX) * 0.5;
+        if(!(rand() % 25))
+            dat[i] += 20;
+    }
+    x[0] = 0;
+    for(i=1;i<len;i++)
+        x[i] = x[i-1] + ((i / 40) % 2 ? 0.1 : 1.0);
+
+    memset(&cfg, 0, sizeof(cfg));
+    cfg.range_bit = cfg.spike_bit = cfg.stuck_bit = cfg.gradient_bit = 1;
+    cfg.range_min = 0.2;
+    cfg.range_max = 20;
+    cfg.spike_L = 7;
+    cfg.spike_N = 2;
+    cfg.spike_acc = 0.1;
+    cfg.stuck_reso = 0.01;
+    cfg.stuck_num = 3;
+    cfg.grad_min = -2;
+    cfg.grad_max = 2;
+    cfg.grad_mindx = 0.6;
+    cfg.grad_toldat = 1;
+
+    memset(flags, 1, sizeof(flags));
+    for(i=0;i<len;i++)
+        flags[QC_SUITE_RANGE][i] = (0.2 <= dat[i] && dat[i] <= 20);
+    spike(flags[QC_SUITE_SPIKE], dat, len, 7, 2, 0.1);
+    stuck(flags[QC_SUITE_STUCK], dat, len, 0.01, 3);
+    gradient(flags[QC_SUITE_GRADIENT], dat, x, len, -2, 2, 0.6, 0, 1, -99);
+
+    for(k=0;k<4;k++) {
+        memset(runs, 0, sizeof(runs));
+        if(qc_suite_runs(runs, dat, x, len, &cfg, blocks[k], -99)) {
+            message = "qc_suite_runs failed to allocate.";
+            return 0;
+        }
+        for(t=0;t<QC_SUITE_TESTS;t++) {
+            memset(got, 1, len);
+            runs_expand(got, len, runs[t].runs, runs[t].len);
+            if(memcmp(got, flags[t], len)) {
+                message = "Expanded runs do not match the kernel flags.";
+                return 0;
+            }
+            for(i=1;i<runs[t].len;i++) {
+                if(runs[t].runs[i].start < runs[t].runs[i-1].stop ||
+                        (runs[t].runs[i].start == runs[t].runs[i-1].stop &&
+                         runs[t].runs[i].code == runs[t].runs[i-1].code)) {
+                    message = "Runs overlap or are not merged.";
+                    return 0;
+                }
+            }
+            n += runs[t].len;
+            runs_free(&runs[t]);
+        }
+    }
+    if(!n) {
+        message = "No runs to compare.";
+        return 0;
+    }
+    return 1;
+}
+
 char test_search_sorted()
 {
     double a[] = {1, 2, 3, 4, 5};
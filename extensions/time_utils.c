@@ -1,36 +1,140 @@
+#include <math.h>
 #include <stddef.h>
 #include "utils.h"
 #include "time_utils.h"
 
+#define DAY_S 86400
 
-int ntp_month_vector(short int *out, const double *in, size_t len)
+/* Days before the first of each month in a common year */
+static const short int month_days[12] = {0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334};
+
+/*
+ * civil_from_days
+ * Converts days since 1970-01-01 to year, month (1-12) and day (1-31).
+ *
+ * The year is shifted to begin on March 1st so the leap day falls at its end,
+ * then split into 400 year eras of 146097 days. See H. Hinnant,
+ * "chrono-Compatible Low-Level Date Algorithms".
+ */
+static inline void civil_from_days(long long z, long long *y, int *m, int *d)
+{
+    long long era;
+    long long doe, yoe, doy, mp;
+
+    z += 719468;
+    era = (z >= 0 ? z : z - 146096) / 146097;
+    doe = z - era * 146097;                                     /* [0, 146096] */
+    yoe = (doe - doe/1460 + doe/36524 - doe/146096) / 365;      /* [0, 399] */
+    doy = doe - (365*yoe + yoe/4 - yoe/100);                    /* [0, 365] */
+    mp = (5*doy + 2)/153;                                       /* [0, 11] */
+    *d = doy - (153*mp + 2)/5 + 1;
+    *m = mp < 10 ? mp + 3 : mp - 9;
+    *y = yoe + era * 400 + (*m <= 2);
+}
+
+static inline int is_leap(long long y)
+{
+    return (y % 4 == 0) && (y % 100 != 0 || y % 400 == 0);
+}
+
+static inline int month_length(long long y, int m)
+{
+    static const char lengths[12] = {31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31};
+    return lengths[m-1] + (m == 2 && is_leap(y));
+}
+
+/*
+ * floor_div
+ * Integer division rounding towards negative infinity
+ */
+static inline long long floor_div(long long a, long long b)
+{
+    return a / b - (a % b < 0);
+}
+
+int ntp_civil_vector(const double *in, size_t len, int *year, short int *month,
+                     short int *day, short int *yday, double *sod)
 {
     size_t i;
-    /* We're going to chop it up baby! */
-    short int i0, i1;
-    double dt;
-    int ret1;
-    int ret2;
-    i0 = ntp_month(in[0]);
-    i1 = ntp_month(in[len-1]);
-    dt = in[len-1] - in[0];
-    if((i0==i1) && (dt < MONTH_S)) {/* The first and last value are in the same month */
-        for(i=0;i<len;i++) {
-            out[i] = i0;
+    long long y=0;
+    long long secs;
+    long long days;
+    double day_start=1, day_end=0;      /* Seconds of the last day converted */
+    int m=0, d=0, yd=0;
+    double t;
+
+    for(i=0;i<len;i++) {
+        t = in[i] - NTP_OFFSET;
+        if(!isfinite(t)) {
+            if(year) year[i] = 0;
+            if(month) month[i] = 0;
+            if(day) day[i] = 0;
+            if(yday) yday[i] = 0;
+            if(sod) sod[i] = NAN;
+            continue;
+        }
+        if(!(t >= day_start && t < day_end)) {
+            /* Consecutive samples mostly share a day, only convert new ones */
+            secs = (long long) floor(t);
+            days = floor_div(secs, DAY_S);
+            civil_from_days(days, &y, &m, &d);
+            yd = month_days[m-1] + d + (m > 2 && is_leap(y));
+            day_start = days * DAY_S;
+            day_end = day_start + DAY_S;
         }
+        if(year) year[i] = y;
+        if(month) month[i] = m;
+        if(day) day[i] = d;
+        if(yday) yday[i] = yd;
+        if(sod) sod[i] = t - (double) day_start;
     }
-    else {
-        /* Binary traversal */
-        if(!(len%2)) { /* len is even */
-            ret1 = ntp_month_vector(out, in, len/2);
-            ret2 = ntp_month_vector(out + (len/2), in + (len/2), len/2);
-            return ret1 + ret2;
+    return 0;
+}
+
+/*
+ * ntp_month_vector
+ * Sets out[i] to the month (0-11) of in[i], rounded to the nearest second.
+ * Times that are not finite give -1.
+ */
+int ntp_month_vector(short int *out, const double *in, size_t len)
+{
+    size_t i;
+    long long y;
+    long long secs;
+    long long days;
+    long long month_start, month_end;
+    double lo=1, hi=0;      /* Times that round into the last month */
+    int m=0, d;
+    double t;
+
+    for(i=0;i<len;i++) {
+        t = in[i] - NTP_OFFSET;
+        if(t >= lo && t < hi) {
+            out[i] = m - 1;
+            continue;
+        }
+        if(!isfinite(t)) {
+            out[i] = -1;
+            continue;
+        }
+        secs = llround(t);
+        days = floor_div(secs, DAY_S);
+        civil_from_days(days, &y, &m, &d);
+        month_start = (days - (d - 1)) * DAY_S;
+        month_end = month_start + (long long) month_length(y, m) * DAY_S;
+        /*
+         * llround rounds halves away from zero, the shortcut only covers
+         * months after 1970 where that is up
+         */
+        if(month_start > 0) {
+            lo = month_start - 0.5;
+            hi = month_end - 0.5;
         }
         else {
-            ret1 = ntp_month_vector(out, in, len/2);
-            ret2 = ntp_month_vector(out + (len/2), in + (len/2), len/2 + 1);
+            lo = 1;
+            hi = 0;
         }
+        out[i] = m - 1;
     }
     return len;
 }
-
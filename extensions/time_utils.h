@@ -1,8 +1,32 @@
 #ifndef __TIME_UTILS_H__
 #define __TIME_UTILS_H__
 
+#include <stddef.h>
+
 int ntp_month_vector(short int *out, const double *in, size_t len);
 
+/*
+ * ntp_civil_vector
+ *
+ * Converts NTP seconds (since 1900-01-01 UTC) to UTC calendar fields in a
+ * single pass, using integer days-from-civil arithmetic (proleptic Gregorian
+ * calendar) instead of gmtime. The date is the one of floor(in[i]) seconds,
+ * as time.gmtime gives for positive times; seconds of day keep the fraction.
+ * Any output may be NULL if it is not needed. Inputs that are not finite give
+ * 0 for the integer fields and NaN seconds of day.
+ *
+ * Arguments:
+ * const double *in - NTP seconds
+ * size_t len       - Length of in and of each output
+ * int *year        - Year, e.g. 2014
+ * short int *month - Month, 1 to 12
+ * short int *day   - Day of month, 1 to 31
+ * short int *yday  - Day of year, 1 to 366
+ * double *sod      - Seconds since midnight, [0, 86400)
+ */
+int ntp_civil_vector(const double *in, size_t len, int *year, short int *month,
+                     short int *day, short int *yday, double *sod);
+
 #define MONTH_S (3600*24*28)
 
 #endif /* __TIME_UTILS_H__ */
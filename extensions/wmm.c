@@ -7,6 +7,7 @@
 #include <sys/time.h>
 #include <libgen.h>
 #include "wmm.h"
+#include "time_utils.h"
 #include "EGM9615.h"
 
 // Add support for internal caching of initialized models.  Alloc storate here,
@@ -15,6 +16,8 @@
 WMM_ModelCache wmm_mcache[WMM_MAX_NCACHED];
 
 
+static void timed_reset(WMM_Model *model);
+
 static bool fexists(char *filename)
 {
     FILE *f;
@@ -100,6 +103,8 @@ int wmm_initialize(char *filename, WMM_Model **model)
     if (wmm_mcache[tIdx].inited == 1) {
         // this slot was already used, free prealloc'd model memory to prevent memory leak
         // when MAG_robustReadMagModels internally allocs memory
+        timed_reset(&wmm_mcache[tIdx].model);
+        pthread_mutex_destroy(&wmm_mcache[tIdx].model.timedLock);
         MAG_FreeMagneticModelMemory(wmm_mcache[tIdx].model.TimedMagneticModel);
         MAG_FreeMagneticModelMemory(wmm_mcache[tIdx].model.MagneticModel);
         wmm_mcache[tIdx].model.initialized = 0;
@@ -122,6 +127,13 @@ int wmm_initialize(char *filename, WMM_Model **model)
         return 1;
     }
 
+    // no time adjusted coefficient sets yet
+    memset(wmm_mcache[tIdx].model.timed, 0, sizeof(wmm_mcache[tIdx].model.timed));
+    wmm_mcache[tIdx].model.timedTick = 0;
+    wmm_mcache[tIdx].model.timedHits = 0;
+    wmm_mcache[tIdx].model.timedMisses = 0;
+    pthread_mutex_init(&wmm_mcache[tIdx].model.timedLock, NULL);
+
     // mark internal model as initialized
     wmm_mcache[tIdx].model.initialized = 1;
 
@@ -183,19 +195,16 @@ size_t wmm_velocity_correction(const velocity_profile *in, WMM_Model *model, vel
     return i;
 }
 
-double wmm_declination(WMM_Model *model, double lat, double lon, double z, int year, int month, int day)
+/*
+ * declination of a point with coefficients already adjusted to its date
+ */
+static double timed_declination(MAGtype_MagneticModel *TimedMagneticModel, double lat, double lon, double z)
 {
     MAGtype_Ellipsoid Ellip;
     MAGtype_CoordSpherical CoordSpherical;
     MAGtype_CoordGeodetic CoordGeodetic;
-    MAGtype_Date MagneticDate;
     MAGtype_GeoMagneticElements GeoMagneticElements;
     MAGtype_Geoid Geoid;
-    if(model->initialized != 1)
-    {
-        wmm_errmsg = "Uninitialized model";
-        return NaN;
-    }
 
     MAG_SetDefaults(&Ellip, &Geoid);
 
@@ -210,20 +219,400 @@ double wmm_declination(WMM_Model *model, double lat, double lon, double z, int y
     CoordGeodetic.HeightAboveGeoid = z;
     Geoid.UseGeoid = 1;
     MAG_ConvertGeoidToEllipsoidHeight(&CoordGeodetic, &Geoid);
-    
-    /* Set the date */
+
+    /* Convert from geodetic to spherical equations */
+    MAG_GeodeticToSpherical(Ellip, CoordGeodetic, &CoordSpherical);
+    MAG_Geomag(Ellip, CoordSpherical, CoordGeodetic, TimedMagneticModel, &GeoMagneticElements);
+
+    return GeoMagneticElements.Decl;
+}
+
+/*
+ * The decimal year of a date, the key of its time adjusted coefficients
+ */
+static MAGtype_Date magnetic_date(int year, int month, int day)
+{
+    MAGtype_Date MagneticDate;
+
     MagneticDate.Year = year;
     MagneticDate.Month = month;
     MagneticDate.Day = day;
     MAG_DateToYear(&MagneticDate, NULL);
+    return MagneticDate;
+}
 
-    /* Convert from geodetic to spherical equations */
-    MAG_GeodeticToSpherical(Ellip, CoordGeodetic, &CoordSpherical);
-    /* Time adjust the coefficients */
-    MAG_TimelyModifyMagneticModel(MagneticDate, model->MagneticModel, model->TimedMagneticModel);
-    MAG_Geomag(Ellip, CoordSpherical, CoordGeodetic, model->TimedMagneticModel, &GeoMagneticElements);
+/*
+ * Drops the time adjusted coefficient sets no evaluation holds
+ */
+static void timed_reset(WMM_Model *model)
+{
+    int i;
+    for(i=0;i<WMM_TIMED_NCACHED;i++) {
+        if(model->timed[i].model != NULL && model->timed[i].users == 0) {
+            MAG_FreeMagneticModelMemory(model->timed[i].model);
+            model->timed[i].model = NULL;
+        }
+    }
+}
 
-    return GeoMagneticElements.Decl;
+/*
+ * timed_acquire
+ * The coefficients of model time adjusted to a date, shared with the other
+ * evaluations of the date until timed_release. A set is looked up among the
+ * sets the model keeps and built on a miss, outside of the lock, into the
+ * empty entry or the least recently used one not held. When every entry is
+ * held the set is private to the caller. Returns NULL if memory ran out.
+ */
+static MAGtype_MagneticModel *timed_acquire(WMM_Model *model, int year, int month, int day)
+{
+    MAGtype_Date MagneticDate = magnetic_date(year, month, day);
+    MAGtype_MagneticModel *timed = NULL;
+    WMM_Timed *entry = NULL;
+    int nMax = model->MagneticModel->nMax;
+    int i, found=0;
+
+    pthread_mutex_lock(&model->timedLock);
+    for(i=0;i<WMM_TIMED_NCACHED;i++) {
+        if(model->timed[i].model != NULL && model->timed[i].decimalYear == MagneticDate.DecimalYear) {
+            entry = &model->timed[i];
+            entry->users++;
+            entry->lastUse = ++model->timedTick;
+            model->timedHits++;
+            pthread_mutex_unlock(&model->timedLock);
+            return entry->model;
+        }
+    }
+    model->timedMisses++;
+    pthread_mutex_unlock(&model->timedLock);
+
+    timed = MAG_AllocateModelMemory((nMax + 1) * (nMax + 2) / 2);
+    if(timed == NULL)
+        return NULL;
+    MAG_TimelyModifyMagneticModel(MagneticDate, model->MagneticModel, timed);
+
+    pthread_mutex_lock(&model->timedLock);
+    for(i=0;i<WMM_TIMED_NCACHED;i++) {
+        if(model->timed[i].model != NULL && model->timed[i].decimalYear == MagneticDate.DecimalYear) {
+            // built by another evaluation meanwhile
+            entry = &model->timed[i];
+            found = 1;
+            break;
+        }
+        if(model->timed[i].users)
+            continue;
+        if(model->timed[i].model == NULL) {
+            // an empty entry is taken before any used one
+            if(entry == NULL || entry->model != NULL)
+                entry = &model->timed[i];
+        } else if(entry == NULL || (entry->model != NULL && model->timed[i].lastUse < entry->lastUse)) {
+            entry = &model->timed[i];
+        }
+    }
+    if(found) {
+        MAG_FreeMagneticModelMemory(timed);
+    } else if(entry != NULL) {
+        if(entry->model != NULL)
+            MAG_FreeMagneticModelMemory(entry->model);
+        entry->model = timed;
+        entry->decimalYear = MagneticDate.DecimalYear;
+        entry->users = 0;
+    } else {
+        pthread_mutex_unlock(&model->timedLock);
+        return timed;
+    }
+    entry->users++;
+    entry->lastUse = ++model->timedTick;
+    pthread_mutex_unlock(&model->timedLock);
+    return entry->model;
+}
 
+/*
+ * timed_release
+ * Lets go of a set of timed_acquire, freeing it if it is private
+ */
+static void timed_release(WMM_Model *model, MAGtype_MagneticModel *timed)
+{
+    int i;
+    pthread_mutex_lock(&model->timedLock);
+    for(i=0;i<WMM_TIMED_NCACHED;i++) {
+        if(model->timed[i].model == timed) {
+            model->timed[i].users--;
+            pthread_mutex_unlock(&model->timedLock);
+            return;
+        }
+    }
+    pthread_mutex_unlock(&model->timedLock);
+    MAG_FreeMagneticModelMemory(timed);
 }
 
+void wmm_timed_stats(WMM_Model *model, size_t *hits, size_t *misses, size_t *size)
+{
+    int i;
+    pthread_mutex_lock(&model->timedLock);
+    *hits = model->timedHits;
+    *misses = model->timedMisses;
+    *size = 0;
+    for(i=0;i<WMM_TIMED_NCACHED;i++) {
+        if(model->timed[i].model != NULL)
+            (*size)++;
+    }
+    pthread_mutex_unlock(&model->timedLock);
+}
+
+void wmm_timed_clear(WMM_Model *model)
+{
+    pthread_mutex_lock(&model->timedLock);
+    timed_reset(model);
+    model->timedHits = 0;
+    model->timedMisses = 0;
+    pthread_mutex_unlock(&model->timedLock);
+}
+
+/*
+ * The UTC day of NTP seconds, days since 1900-01-01, rounded to the
+ * microsecond and truncated towards zero like datetime.utcfromtimestamp
+ * does. Returns 0 for times that are not finite.
+ */
+static int ntp_to_day(double ntp, int64_t *day)
+{
+    double unix_time = ntp - 2208988800.;
+    double secs, us;
+
+    if(!isfinite(unix_time))
+        return 0;
+    secs = trunc(unix_time);
+    us = round((unix_time - secs) * 1e6);
+    if(us < 0)
+        secs -= 1;
+    else if(us == 1e6)
+        secs += 1;
+    *day = (int64_t) floor((secs + 2208988800.) / 86400.);
+    return 1;
+}
+
+void wmm_utc_days(const double *ntp, size_t len, double *out)
+{
+    size_t i;
+    int64_t day;
+    for(i=0;i<len;i++)
+        out[i] = ntp_to_day(ntp[i], &day) ? (double) day : NaN;
+}
+
+/*
+ * The civil date of a day of ntp_to_day
+ */
+static void day_to_date(int64_t day, int *year, int *month, int *dom)
+{
+    double midnight = (double) day * 86400.;
+    short int m, d;
+    ntp_civil_vector(&midnight, 1, year, &m, &d, NULL, NULL);
+    *month = m;
+    *dom = d;
+}
+
+double wmm_declination(WMM_Model *model, double lat, double lon, double z, int year, int month, int day)
+{
+    MAGtype_MagneticModel *timed;
+    double decl;
+    if(model->initialized != 1)
+    {
+        wmm_errmsg = "Uninitialized model";
+        return NaN;
+    }
+
+    /* Time adjust the coefficients, or find them adjusted */
+    timed = timed_acquire(model, year, month, day);
+    if(timed == NULL)
+    {
+        wmm_errmsg = "Failed to allocate WMM models";
+        return NaN;
+    }
+    decl = timed_declination(timed, lat, lon, z);
+    timed_release(model, timed);
+    return decl;
+}
+
+typedef struct point_day_ {
+    int64_t day;
+    size_t index;
+} point_day;
+
+static int compare_point_day(const void *a, const void *b)
+{
+    const point_day *pa = a;
+    const point_day *pb = b;
+    if(pa->day != pb->day)
+        return pa->day < pb->day ? -1 : 1;
+    return pa->index < pb->index ? -1 : pa->index > pb->index;
+}
+
+/*
+ * points_by_day
+ * The day of each NTP time of ntp with its index, in time order, sorted only
+ * if they are not already. Times that are not finite are left out and give
+ * NaN in out. Returns NULL if memory ran out.
+ */
+static point_day *points_by_day(const double *ntp, ptrdiff_t stride, size_t len, double *out, size_t *n)
+{
+    point_day *points;
+    size_t i;
+    int64_t day;
+    bool sorted = true;
+
+    points = malloc(sizeof(point_day) * (len ? len : 1));
+    if(points == NULL)
+    {
+        wmm_errmsg = "Failed to allocate WMM points";
+        return NULL;
+    }
+    *n = 0;
+    for(i=0;i<len;i++) {
+        if(!ntp_to_day(ntp[(ptrdiff_t) i * stride], &day)) {
+            out[i] = NaN;
+            continue;
+        }
+        if(*n && day < points[*n - 1].day)
+            sorted = false;
+        points[*n].day = day;
+        points[*n].index = i;
+        (*n)++;
+    }
+    if(!sorted)
+        qsort(points, *n, sizeof(point_day), compare_point_day);
+    return points;
+}
+
+size_t wmm_declination_vector(WMM_Model *model, const wmm_points *in, double *out)
+{
+    MAGtype_MagneticModel *timed = NULL;
+    point_day *points;
+    size_t i, j, n;
+    int64_t timed_day=0;
+    int year, month, dom;
+
+    if(model->initialized != 1)
+    {
+        wmm_errmsg = "Uninitialized model";
+        return 0;
+    }
+    /* Take the points date by date */
+    points = points_by_day(in->ntp, in->ntp_stride, in->len, out, &n);
+    if(points == NULL)
+        return 0;
+    for(j=0;j<n;j++) {
+        if(timed == NULL || points[j].day != timed_day) {
+            if(timed != NULL)
+                timed_release(model, timed);
+            day_to_date(points[j].day, &year, &month, &dom);
+            timed = timed_acquire(model, year, month, dom);
+            if(timed == NULL)
+            {
+                wmm_errmsg = "Failed to allocate WMM models";
+                free(points);
+                return 0;
+            }
+            timed_day = points[j].day;
+        }
+        i = points[j].index;
+        out[i] = timed_declination(timed,
+                                   in->lat[(ptrdiff_t) i * in->lat_stride],
+                                   in->lon[(ptrdiff_t) i * in->lon_stride],
+                                   in->z[(ptrdiff_t) i * in->z_stride]);
+    }
+    if(timed != NULL)
+        timed_release(model, timed);
+    free(points);
+    return in->len;
+}
+
+int wmm_site_init(WMM_Model *model, wmm_site *site, double lat, double lon, double z)
+{
+    MAGtype_Geoid Geoid;
+    int nMax = model->MagneticModel->nMax;
+
+    /* As timed_declination does for each point */
+    MAG_SetDefaults(&site->Ellip, &Geoid);
+    Geoid.GeoidHeightBuffer = GeoidHeightBuffer;
+    Geoid.Geoid_Initialized = 1;
+    site->CoordGeodetic.phi = lat;
+    site->CoordGeodetic.lambda = lon;
+    site->CoordGeodetic.HeightAboveGeoid = z;
+    Geoid.UseGeoid = 1;
+    MAG_ConvertGeoidToEllipsoidHeight(&site->CoordGeodetic, &Geoid);
+    MAG_GeodeticToSpherical(site->Ellip, site->CoordGeodetic, &site->CoordSpherical);
+
+    /* and MAG_Geomag before it sums the field */
+    site->LegendreFunction = MAG_AllocateLegendreFunctionMemory((nMax + 1) * (nMax + 2) / 2);
+    site->SphVariables = MAG_AllocateSphVarMemory(nMax);
+    if(site->LegendreFunction == NULL || site->SphVariables == NULL)
+    {
+        wmm_site_free(site);
+        wmm_errmsg = "Failed to allocate WMM site";
+        return 1;
+    }
+    MAG_ComputeSphericalHarmonicVariables(site->Ellip, site->CoordSpherical, nMax, site->SphVariables);
+    MAG_AssociatedLegendreFunction(site->CoordSpherical, nMax, site->LegendreFunction);
+    return 0;
+}
+
+void wmm_site_free(wmm_site *site)
+{
+    if(site->LegendreFunction != NULL)
+        MAG_FreeLegendreMemory(site->LegendreFunction);
+    if(site->SphVariables != NULL)
+        MAG_FreeSphVarMemory(site->SphVariables);
+    site->LegendreFunction = NULL;
+    site->SphVariables = NULL;
+}
+
+/*
+ * The declination of MAG_Geomag at a site, with coefficients adjusted to
+ * the date. The secular variation it also sums does not enter it.
+ */
+static double site_declination(const wmm_site *site, MAGtype_MagneticModel *timed)
+{
+    MAGtype_MagneticResults MagneticResultsSph, MagneticResultsGeo;
+    MAGtype_GeoMagneticElements GeoMagneticElements;
+
+    MAG_Summation(site->LegendreFunction, timed, *site->SphVariables, site->CoordSpherical, &MagneticResultsSph);
+    MAG_RotateMagneticVector(site->CoordSpherical, site->CoordGeodetic, MagneticResultsSph, &MagneticResultsGeo);
+    MAG_CalculateGeoMagneticElements(&MagneticResultsGeo, &GeoMagneticElements);
+    return GeoMagneticElements.Decl;
+}
+
+size_t wmm_site_declination_vector(WMM_Model *model, const wmm_site *site, const double *ntp,
+                                   ptrdiff_t stride, size_t len, double *out)
+{
+    MAGtype_MagneticModel *timed;
+    point_day *points;
+    size_t j, n;
+    int year, month, dom;
+    double decl=NaN;
+
+    if(model->initialized != 1)
+    {
+        wmm_errmsg = "Uninitialized model";
+        return 0;
+    }
+    points = points_by_day(ntp, stride, len, out, &n);
+    if(points == NULL)
+        return 0;
+    for(j=0;j<n;j++) {
+        /* The site only changes with the date */
+        if(j == 0 || points[j].day != points[j - 1].day) {
+            day_to_date(points[j].day, &year, &month, &dom);
+            timed = timed_acquire(model, year, month, dom);
+            if(timed == NULL)
+            {
+                wmm_errmsg = "Failed to allocate WMM models";
+                free(points);
+                return 0;
+            }
+            decl = site_declination(site, timed);
+            timed_release(model, timed);
+        }
+        out[points[j].index] = decl;
+    }
+    free(points);
+    return len;
+}
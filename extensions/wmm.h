@@ -4,7 +4,9 @@
 
 #include "GeomagnetismHeader.h"
 #include <inttypes.h>
+#include <stddef.h>
 #include <sys/time.h>
+#include <pthread.h>
 
 
 static const char *wmm_errmsg;
@@ -18,13 +20,61 @@ typedef struct velocity_profile_ {
     int64_t *timestamp;
 } velocity_profile;
 
+/*
+ * Points at which to evaluate the declination. Element i of each input is
+ * x[i * x_stride], a stride of 0 holds the value for every point. Strides
+ * are counted in elements, not bytes.
+ */
+typedef struct wmm_points_ {
+    size_t len;
+    double *lat;      /* degrees north */
+    double *lon;      /* degrees east */
+    double *z;        /* km (MSL) */
+    double *ntp;      /* NTP seconds (since 1900-01-01 UTC) */
+    ptrdiff_t lat_stride;
+    ptrdiff_t lon_stride;
+    ptrdiff_t z_stride;
+    ptrdiff_t ntp_stride;
+} wmm_points;
+
+// number of time adjusted coefficient sets a model keeps, one per date
+#define WMM_TIMED_NCACHED 64
+
+// a coefficient set time adjusted to a date, shared by the evaluations of
+// that date while users is not 0
+typedef struct WMM_Timed {
+    double decimalYear;                     // the date the set is adjusted to
+    MAGtype_MagneticModel *model;           // NULL for an empty entry
+    int users;                              // evaluations holding the set
+    unsigned long lastUse;                  // tick of the last use, for replacements
+} WMM_Timed;
+
 typedef struct wmm_model_ {
     MAGtype_MagneticModel *MagneticModel;
     MAGtype_MagneticModel *TimedMagneticModel;
     int initialized;
+    WMM_Timed timed[WMM_TIMED_NCACHED];     // time adjusted sets of recent dates
+    unsigned long timedTick;
+    size_t timedHits;                       // sets found in timed
+    size_t timedMisses;                     // sets built
+    pthread_mutex_t timedLock;              // guards the above
 } WMM_Model;
 
 
+/*
+ * The position dependent terms of the field at a fixed site: its spherical
+ * coordinates and the spherical harmonic variables and Legendre functions of
+ * the model degree, computed once for every date evaluated there.
+ */
+typedef struct wmm_site_ {
+    MAGtype_Ellipsoid Ellip;
+    MAGtype_CoordGeodetic CoordGeodetic;
+    MAGtype_CoordSpherical CoordSpherical;
+    MAGtype_LegendreFunction *LegendreFunction;
+    MAGtype_SphericalHarmonicVariables *SphVariables;
+} wmm_site;
+
+
 // adding a associated array mapping configuration file with WMM_model,
 // to prevent reinitialization when presented with a previously seen
 // configuration. Arrange as a simple linked list
@@ -44,6 +94,62 @@ int wmm_initialize(char *filename, WMM_Model **model);
 int wmm_free(WMM_Model *model);
 double wmm_declination(WMM_Model *model, double lat, double lon, double z, int year, int month, int day);
 
+/*
+ * wmm_declination_vector
+ *
+ * The declination at each point of in, written to out, for the UTC date of
+ * its NTP time as datetime.utcfromtimestamp gives it. The points are taken
+ * date by date, in time order unless they already are, so each date takes
+ * the time adjusted coefficients from the model once. Calls may run
+ * concurrently. Returns the number of points evaluated, less than in->len
+ * only if memory ran out.
+ */
+size_t wmm_declination_vector(WMM_Model *model, const wmm_points *in, double *out);
+
+/*
+ * wmm_site_init, wmm_site_free
+ *
+ * Computes the terms of the site at lat (degrees north), lon (degrees east)
+ * and z (km MSL) for the degree of model, and frees them. wmm_site_init
+ * returns 1 if memory ran out.
+ */
+int wmm_site_init(WMM_Model *model, wmm_site *site, double lat, double lon, double z);
+void wmm_site_free(wmm_site *site);
+
+/*
+ * wmm_site_declination_vector
+ *
+ * The declination at the site for the UTC date of each NTP time of ntp,
+ * element i being ntp[i * stride], as wmm_declination_vector gives it at
+ * that position. The field is summed once per date. Returns the number of
+ * times evaluated, less than len only if memory ran out.
+ */
+size_t wmm_site_declination_vector(WMM_Model *model, const wmm_site *site, const double *ntp,
+                                   ptrdiff_t stride, size_t len, double *out);
+
+/*
+ * wmm_utc_days
+ *
+ * The UTC day of each NTP time, days since 1900-01-01, as the dates of
+ * wmm_declination_vector, NaN for times that are not finite.
+ */
+void wmm_utc_days(const double *ntp, size_t len, double *out);
+
+/*
+ * wmm_timed_stats
+ *
+ * The number of coefficient sets found among the time adjusted sets the
+ * model keeps, built and kept.
+ */
+void wmm_timed_stats(WMM_Model *model, size_t *hits, size_t *misses, size_t *size);
+
+/*
+ * wmm_timed_clear
+ *
+ * Drops the time adjusted sets not in use and resets the counts.
+ */
+void wmm_timed_clear(WMM_Model *model);
+
 #ifndef NaN
 #define NaN 0./0.
 #endif 
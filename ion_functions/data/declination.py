@@ -0,0 +1,415 @@
+#!/usr/bin/env python
+"""
+@package ion_functions.data.declination
+@file ion_functions/data/declination.py
+@brief Deduplicated and memoized evaluation of the WMM magnetic declination,
+    and its interpolation from a precomputed grid
+"""
+
+import datetime
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from ion_functions.data.wmm import utc_days
+
+# Declinations kept by the process wide memo
+DECLINATION_MEMO_SIZE = 65536
+
+
+class DeclinationMemo(object):
+    '''
+    The declinations of the most recently used (model, lat, lon, z, day)
+    keys, z in km and day the UTC day the model is evaluated for. The model
+    has a resolution of a day, so every sample of a day at a position shares
+    its declination, and a stream evaluated call after call at the same
+    positions is summed once per day. The least recently used keys are
+    dropped beyond maxsize.
+    '''
+    def __init__(self, maxsize=DECLINATION_MEMO_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def lookup(self, keys):
+        '''
+        The declinations of keys, NaN for the ones not kept, and the indices
+        of these
+        '''
+        values = np.empty(len(keys), dtype=np.float)
+        missing = []
+        with self._lock:
+            entries = self._entries
+            for i, key in enumerate(keys):
+                value = entries.pop(key, None)
+                if value is None:
+                    values[i] = np.nan
+                    missing.append(i)
+                else:
+                    entries[key] = value
+                    values[i] = value
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return values, np.array(missing, dtype=np.intp)
+
+    def store(self, keys, values):
+        '''
+        Keeps the declinations values of keys
+        '''
+        with self._lock:
+            entries = self._entries
+            for key, value in zip(keys, values):
+                entries.pop(key, None)
+                entries[key] = float(value)
+            self._trim()
+
+    def _trim(self):
+        while len(self._entries) > max(self.maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def resize(self, maxsize):
+        '''
+        Keeps up to maxsize declinations from now on, dropping the least
+        recently used ones beyond it
+        '''
+        with self._lock:
+            self.maxsize = maxsize
+            self._trim()
+
+    def info(self):
+        '''
+        Returns the hits, misses, number of declinations kept and maxsize
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        '''
+        Drops every declination and resets the counters
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+declination_memo = DeclinationMemo()
+
+
+def _unique(keys):
+    '''
+    The unique rows of keys, the index of the first row of each and the
+    index into them of each row. The keys of a time series at a fixed site
+    are usually sorted by day, and are grouped into runs without sorting:
+    the index is then None and the number of rows of each is returned.
+    '''
+    n = keys.shape[0]
+    if keys.shape[1] == 1:
+        day = keys[:, 0]
+        if n < 2 or (day[1:] >= day[:-1]).all():
+            first = np.flatnonzero(np.r_[True, day[1:] != day[:-1]])
+            return keys[first], first, None, np.diff(np.r_[first, n])
+    rows = np.ascontiguousarray(keys).view(np.dtype((np.void, keys.itemsize * keys.shape[1])))
+    _, first, inverse = np.unique(rows.ravel(), return_index=True, return_inverse=True)
+    return keys[first], first, inverse, None
+
+
+def memoized_declination(wmm, model, lat, lon, z, ntp_timestamp, memo=None):
+    '''
+    The declination of WMM.declination_array(lat, lon, z, ntp_timestamp),
+    z in km, evaluated once for each distinct position and UTC day of the
+    samples, and only for the ones memo, declination_memo by default, does
+    not keep. model names the coefficients of wmm in the keys of memo. The
+    declinations are identical to those of evaluating every sample.
+    '''
+    if memo is None:
+        memo = declination_memo
+    shape = np.broadcast(lat, lon, z, ntp_timestamp).shape
+    inputs = [np.asanyarray(v, dtype=np.float) for v in (lat, lon, z)]
+    ntp = np.broadcast_to(np.asanyarray(ntp_timestamp, dtype=np.float), shape).ravel()
+    days = utc_days(ntp)
+
+    # samples of a time that is not finite have no date
+    valid = np.flatnonzero(~np.isnan(days))
+    if valid.size == days.size:
+        valid = slice(None)
+    elif not valid.size:
+        return days.reshape(shape)
+    # a single position leaves the day as the only key column
+    varying = [i for i, v in enumerate(inputs) if v.size != 1]
+    columns = [np.broadcast_to(inputs[i], shape).ravel()[valid] for i in varying]
+    if columns:
+        keys = np.column_stack(columns + [days[valid]])
+    else:
+        keys = days[valid][:, np.newaxis]
+    keys, first, inverse, runs = _unique(keys)
+
+    def evaluate(rows):
+        # any sample of a day evaluates the declination of the day
+        at = np.arange(days.size)[valid][first[rows]]
+        pos = [np.broadcast_to(v, shape).ravel()[at] if v.size != 1 else v.ravel()[0] for v in inputs]
+        return wmm.declination_array(pos[0], pos[1], pos[2], ntp[at])
+
+    if keys.shape[0] > memo.maxsize:
+        # more distinct keys than the memo holds would only displace each
+        # other, e.g. the positions of a glider, and are evaluated without it
+        values = evaluate(slice(None))
+    else:
+        fixed = [float(v.ravel()[0]) for v in inputs]
+        points = []
+        for row in keys:
+            point = list(fixed)
+            for i, value in zip(varying, row):
+                point[i] = float(value)
+            points.append((model,) + tuple(point) + (float(row[-1]),))
+
+        values, missing = memo.lookup(points)
+        if missing.size:
+            values[missing] = evaluate(missing)
+            memo.store([points[i] for i in missing], values[missing])
+    values = np.repeat(values, runs) if inverse is None else values[inverse]
+    if isinstance(valid, slice):
+        return values.reshape(shape)
+    mag_dec = np.empty(days.shape, dtype=np.float)
+    mag_dec.fill(np.nan)
+    mag_dec[valid] = values
+    return mag_dec.reshape(shape)
+
+# Declination evaluation modes of magnetic_declination
+DECLINATION_MODES = ('exact', 'grid')
+
+
+def _day(date):
+    return float((date - datetime.date(1900, 1, 1)).days)
+
+
+class DeclinationGrid(object):
+    '''
+    The declination of a WMM model at the knots of a lat x lon x time grid,
+    the time being the UTC day the model is evaluated for, and at a single
+    altitude z [km]. Queries are answered by trilinear interpolation, of the
+    angles unwrapped about the knot at the lower corner of their cell, and
+    are NaN outside the grid.
+
+    The altitude of the queries is not used: over the depths of the ocean
+    the declination changes by far less than the interpolation error, which
+    self_check measures. Close to the magnetic poles the declination turns
+    through every direction within a cell, and the interpolation is poor.
+
+    Build a grid once and keep it, in memory or on disk:
+
+        grid = DeclinationGrid.cached(wmm, wmm_model, cache_dir='/tmp')
+        mag_dec = grid.declination(lat, lon, ntp_timestamp)
+    '''
+    def __init__(self, lat, lon, day, values, z=0.0):
+        self.lat = np.asanyarray(lat, dtype=np.float)
+        self.lon = np.asanyarray(lon, dtype=np.float)
+        self.day = np.asanyarray(day, dtype=np.float)
+        self.values = np.asanyarray(values, dtype=np.float)
+        self.z = z
+        if self.values.shape != (self.lat.size, self.lon.size, self.day.size):
+            raise ValueError('The values must be of shape (%d, %d, %d)'
+                             % (self.lat.size, self.lon.size, self.day.size))
+        for name in ('lat', 'lon', 'day'):
+            axis = getattr(self, name)
+            if axis.size < 2 or not (np.diff(axis) > 0).all():
+                raise ValueError("The '%s' knots must be at least 2 and increasing" % name)
+        if self.lon[0] != -180 or self.lon[-1] != 180:
+            raise ValueError("The 'lon' knots must span -180 to 180")
+
+    @staticmethod
+    def knots(start=datetime.date(2010, 1, 1), stop=datetime.date(2015, 1, 1),
+              lat_step=1.0, lon_step=1.0, day_step=90):
+        '''
+        The lat, lon and day knots of a grid of the globe from the date start
+        to the date stop, both included
+        '''
+        lat = np.linspace(-90, 90, int(round(180. / lat_step)) + 1)
+        lon = np.linspace(-180, 180, int(round(360. / lon_step)) + 1)
+        day = np.arange(_day(start), _day(stop), day_step)
+        return lat, lon, np.r_[day, _day(stop)]
+
+    @classmethod
+    def build(cls, wmm, z=0.0, **knots):
+        '''
+        Evaluates the declination of wmm at the knots, of the keyword
+        arguments of knots
+        '''
+        lat, lon, day = cls.knots(**knots)
+        # noon of each day, in NTP seconds
+        ntp = (day + 0.5) * 86400.
+        values = wmm.declination_array(lat[:, None, None], lon[None, :, None], z, ntp[None, None, :])
+        return cls(lat, lon, day, values, z)
+
+    @classmethod
+    def cached(cls, wmm, model, cache_dir=None, z=0.0, **knots):
+        '''
+        The grid of build, loaded from a .npy file of cache_dir if it was
+        saved there, else built and saved, unless cache_dir is None. The name
+        of the file identifies the model file and every parameter of the
+        grid.
+        '''
+        lat, lon, day = cls.knots(**knots)
+        if cache_dir is None:
+            return cls.build(wmm, z, **knots)
+        name = 'declination_%s_%g_%g_%d_%d_%d_%g_%g_%g.npy' % (
+            os.path.splitext(os.path.basename(model))[0], lat[0], lon[0], day[0], day[-1],
+            day.size, lat[1] - lat[0], lon[1] - lon[0], z)
+        path = os.path.join(cache_dir, name)
+        if os.path.exists(path):
+            values = np.load(path)
+            if values.shape == (lat.size, lon.size, day.size):
+                return cls(lat, lon, day, values, z)
+        grid = cls.build(wmm, z, **knots)
+        # written to a temporary file first, so no other process loads it
+        # before it is complete
+        tmp = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, grid.values)
+        os.rename(tmp, path)
+        return grid
+
+    @staticmethod
+    def _cell(axis, q):
+        '''
+        The index of the cell of axis holding each q and the fraction of the
+        way across it, and where q lies within the axis
+        '''
+        i = np.searchsorted(axis, q, side='right') - 1
+        i = np.clip(i, 0, axis.size - 2)
+        lo = axis[i]
+        frac = (q - lo) / (axis[i + 1] - lo)
+        with np.errstate(invalid='ignore'):
+            return i, frac, (q >= axis[0]) & (q <= axis[-1])
+
+    def interpolate(self, lat, lon, day):
+        '''
+        The declination at lat, lon and the UTC day of utc_days, broadcast
+        together, interpolated from the knots around each point. NaN outside
+        the grid.
+        '''
+        lat, lon, day = np.broadcast_arrays(*[np.asanyarray(v, dtype=np.float) for v in (lat, lon, day)])
+        shape = lat.shape
+        lon = np.mod(lon.ravel() + 180., 360.) - 180.
+        i, fi, inside = self._cell(self.lat, lat.ravel())
+        j, fj, _ = self._cell(self.lon, lon)
+        k, fk, in_time = self._cell(self.day, day.ravel())
+        inside &= in_time
+
+        v = self.values
+        base = v[i, j, k]
+        out = np.zeros(base.shape, dtype=np.float)
+        for di, wi in ((0, 1 - fi), (1, fi)):
+            for dj, wj in ((0, 1 - fj), (1, fj)):
+                for dk, wk in ((0, 1 - fk), (1, fk)):
+                    # the angle of the knot nearest the one of the lower
+                    # corner, for the cells the declination wraps in
+                    d = v[i + di, j + dj, k + dk] - base
+                    d -= 360. * np.round(d / 360.)
+                    out += (wi * wj * wk) * d
+        out += base
+        out -= 360. * np.round(out / 360.)
+        out[~inside] = np.nan
+        return out.reshape(shape)
+
+    def declination(self, lat, lon, ntp_timestamp):
+        '''
+        The declination at lat, lon and the UTC day of ntp_timestamp, as
+        WMM.declination_array at the altitude of the grid
+        '''
+        return self.interpolate(lat, lon, utc_days(np.asanyarray(ntp_timestamp, dtype=np.float)))
+
+    def self_check(self, wmm, n=10000, max_lat=None, seed=0):
+        '''
+        The error of the interpolated declination of n points drawn at random
+        over the globe, within max_lat of the equator if given, and the days
+        of the grid, against the declination wmm evaluates for them. Returns
+        the largest and mean absolute errors [degrees] and n.
+        '''
+        rs = np.random.RandomState(seed)
+        # uniform over the sphere
+        lat = np.degrees(np.arcsin(rs.uniform(-1, 1, n)))
+        if max_lat is not None:
+            lat *= max_lat / 90.
+        lon = rs.uniform(-180, 180, n)
+        day = np.floor(rs.uniform(self.day[0], self.day[-1] + 1, n))
+        ntp = (day + rs.uniform(0, 1, n)) * 86400.
+        exact = wmm.declination_array(lat, lon, self.z, ntp)
+        err = self.declination(lat, lon, ntp) - exact
+        err = np.abs(err - 360. * np.round(err / 360.))
+        return {'max_error': float(err.max()), 'mean_error': float(err.mean()), 'n': n}
+
+
+class _DeclinationMode(object):
+    '''
+    The declination mode of magnetic_declination and the grid of the grid
+    mode, built on first use unless one was set
+    '''
+    def __init__(self):
+        self.mode = 'exact'
+        self.grid = None
+        self.cache_dir = None
+        self._lock = threading.Lock()
+
+    def get_grid(self, wmm, model):
+        with self._lock:
+            if self.grid is None:
+                self.grid = DeclinationGrid.cached(wmm, model, self.cache_dir)
+            return self.grid
+
+_declination_mode = _DeclinationMode()
+
+
+def set_declination_mode(mode, grid=None, cache_dir=None):
+    '''
+    Selects how magnetic_declination evaluates the declination when called
+    without a mode: 'exact', evaluating the WMM model, or 'grid',
+    interpolating grid. Without a grid, the default one of DeclinationGrid
+    is built, or loaded from cache_dir, on first use. Check the accuracy of
+    a grid with DeclinationGrid.self_check before selecting it.
+    '''
+    if mode not in DECLINATION_MODES:
+        raise ValueError("Unknown declination mode '%s', expected one of %s" % (mode, DECLINATION_MODES))
+    with _declination_mode._lock:
+        _declination_mode.mode = mode
+        _declination_mode.grid = grid
+        _declination_mode.cache_dir = cache_dir
+
+
+def get_declination_mode():
+    '''
+    The mode magnetic_declination evaluates the declination in by default
+    '''
+    return _declination_mode.mode
+
+
+def declination(wmm, model, lat, lon, z, ntp_timestamp, mode=None):
+    '''
+    The declination of memoized_declination in the 'exact' mode, and
+    interpolated from the grid of set_declination_mode in the 'grid' mode,
+    with the samples outside the grid evaluated exactly. mode defaults to
+    the one of set_declination_mode.
+    '''
+    if mode is None:
+        mode = _declination_mode.mode
+    if mode not in DECLINATION_MODES:
+        raise ValueError("Unknown declination mode '%s', expected one of %s" % (mode, DECLINATION_MODES))
+    if mode == 'exact':
+        return memoized_declination(wmm, model, lat, lon, z, ntp_timestamp)
+
+    grid = _declination_mode.get_grid(wmm, model)
+    shape = np.broadcast(lat, lon, z, ntp_timestamp).shape
+    ntp = np.broadcast_to(np.asanyarray(ntp_timestamp, dtype=np.float), shape)
+    mag_dec = np.asanyarray(grid.declination(lat, lon, ntp))
+    outside = np.isnan(mag_dec) & np.isfinite(ntp)
+    if outside.any():
+        at = [np.broadcast_to(np.asanyarray(v, dtype=np.float), shape)[outside] for v in (lat, lon, z)]
+        mag_dec[outside] = memoized_declination(wmm, model, at[0], at[1], at[2], ntp[outside])
+    return mag_dec
@@ -17,6 +17,7 @@ from numbers import Integral
 
 # ION Functions imports
 from ion_functions.data.wmm import WMM
+from ion_functions.data.declination import declination
 
 # CyberInfrastructure fill value for all integer data types
 SYSTEM_FILLVALUE = -999999999
@@ -120,7 +121,7 @@ def replace_fill_with_nan(instrument_fillvalue, *args):
     return args
 
 
-def magnetic_declination(lat, lon, ntp_timestamp, z=0.0, zflag=-1):
+def magnetic_declination(lat, lon, ntp_timestamp, z=0.0, zflag=-1, mode=None):
     """
     Description:
 
@@ -150,25 +151,31 @@ def magnetic_declination(lat, lon, ntp_timestamp, z=0.0, zflag=-1):
         zflag = indicates whether to use z as a depth or height relative
             to sealevel. -1=depth (i.e. -z) and 1=height (i.e. +z). -1
             is the default
+        mode = 'exact' to evaluate the WMM model, 'grid' to interpolate a
+            precomputed grid of it (see declination.DeclinationGrid).
+            Defaults to the mode of declination.set_declination_mode,
+            'exact' unless set.
 
     Implemented by:
 
         2014-02-02: Christopher Wingard. Initial Code.
     """
 
-    # CSF move WMM instantiation outside of the vectorize call, to prevent
-    # repeated build/teardown during the vectorize.  Need to then pass it as
-    # an arg
-    # NOTE that this means that all the data being vectorized over are assumed
-    # to have the same appropriate model year.  If this is not the case, we
-    # should add code to split and batch the vectorize call to like year sets
-
     # determine which WMM model to use (only one currently is for 2010-2015).
+    # NOTE that this means that all the data are assumed to have the same
+    # appropriate model year.  If this is not the case, we should add code to
+    # split and batch the call to like year sets
     wmm_model = set_wmm_model(2010)
     wmm = WMM(wmm_model)
 
-    decln = np.vectorize(wmm_declination_remod)
-    mag_dec = decln(lat, lon, ntp_timestamp, wmm, z, zflag)
+    # convert from meters to kilometers. As in wmm_declination_remod, whose
+    # depth check never holds, z is not negated for zflag
+    z = np.asanyarray(z, dtype=np.float) / 1000.  # m -> km
+
+    # evaluate each distinct position and UTC date of the timestamps (see
+    # wmm_declination_remod) once, in a single C loop, and only if it was not
+    # evaluated by a recent call, or interpolate them in the grid mode
+    mag_dec = declination(wmm, wmm_model, lat, lon, z, ntp_timestamp, mode)
     return mag_dec
 
 
@@ -5,7 +5,10 @@ from ion_functions.data.vel_functions import nobska_mag_corr_east, nobska_mag_co
 from ion_functions.data.vel_functions import nortek_mag_corr_east, nortek_mag_corr_north
 from ion_functions.data.vel_functions import vel3dk_east, vel3dk_north
 from ion_functions.data.generic_functions import magnetic_declination, magnetic_correction
+from ion_functions.data.generic_functions import WMM, set_wmm_model
+from ion_functions.data.declination import DeclinationGrid, set_declination_mode
 
+import datetime
 import numpy as np
 
 
@@ -24,6 +27,7 @@ class TestVelPerformance(PerformanceTestCase):
         self.ts = np.ones(10000, dtype=np.int) * 3319563600
         self.ve = np.ones(10000, dtype=np.float) * -3.2
         self.vn = np.ones(10000, dtype=np.float) * 18.2
+        self.wmm = WMM(set_wmm_model(2010))
         #self.vu = np.ones(10000, dtype=np.float) * -1.1
         #vel0 = np.ones(10000, dtype=np.int) * 12345
         #vel1 = np.ones(10000, dtype=np.int) * 15432
@@ -106,6 +110,34 @@ class TestVelPerformance(PerformanceTestCase):
         self.profile(
             stats, magnetic_declination, self.lat, self.lon, self.ts, 3)
 
+    def test_magnetic_declination_site(self):
+        """
+        Performance test for the magnetic_declination function over a week
+        of 1 Hz records at a fixed site, evaluated once per date.
+        """
+        stats = []
+        ts = 3319563600 + np.arange(7 * a_day, dtype=np.float)
+        self.profile(
+            stats, magnetic_declination, 14.6846, -51.044, ts, 3)
+
+    def test_magnetic_declination_grid(self):
+        """
+        Performance test for the magnetic_declination function interpolating
+        the declination grid, over a day of 1 Hz glider records.
+        """
+        stats = []
+        grid = DeclinationGrid.build(self.wmm, lat_step=2.0, lon_step=2.0,
+                                     start=datetime.date(2011, 1, 1), stop=datetime.date(2012, 1, 1))
+        lat = np.linspace(14.6, 15.4, a_day)
+        lon = np.linspace(-51.5, -50.5, a_day)
+        # 2011-03-02, within the grid
+        ts = 3508012800 + np.arange(a_day, dtype=np.float)
+        try:
+            set_declination_mode('grid', grid)
+            self.profile(stats, magnetic_declination, lat, lon, ts, 3)
+        finally:
+            set_declination_mode('exact')
+
     def test_magnetic_correction(self):
         """
         Performance test for the magnetic_correction function for the
@@ -440,6 +440,182 @@ class TestGenericFunctionsUnit(BaseUnitTestCase):
 
         self.assertTrue(np.allclose(out, decln, rtol=0, atol=1e-2))
 
+    def test_magnetic_declination_array(self):
+        """
+        The declination of arrays in a single call equals the declination of
+        each sample on its own, dates rounded at midnight as utcfromtimestamp
+        does included.
+        """
+        np.random.seed(11)
+        lat = np.random.uniform(-80, 80, 200)
+        lon = np.random.uniform(-180, 180, 200)
+        z = np.random.uniform(0, 2000, 200)
+        timestamp = np.random.uniform(3.47e9, 3.62e9, 200)
+        midnight = 3471292800.0 + 86400. * 400
+        timestamp[:4] = [midnight, midnight - 1e-7, midnight - 6e-7, midnight + 1e-7]
+
+        wmm = gfunc.WMM(gfunc.set_wmm_model(2010))
+        expected = np.array([gfunc.wmm_declination_remod(*args + (wmm,) + (zz, -1))
+                             for args, zz in zip(zip(lat, lon, timestamp), z)])
+        out = gfunc.magnetic_declination(lat, lon, timestamp, z, -1)
+        np.testing.assert_array_equal(out, expected)
+
+        # Scalars and broadcasting, as np.vectorize gave them
+        out = gfunc.magnetic_declination(lat[0], lon[0], timestamp[:5])
+        self.assertEqual(out.shape, (5,))
+        np.testing.assert_array_equal(out[0], gfunc.magnetic_declination(lat[0], lon[0], timestamp[0]))
+        grid = gfunc.magnetic_declination(lat[:3, None], lon[:4], timestamp[0])
+        self.assertEqual(grid.shape, (3, 4))
+        self.assertEqual(grid[2, 1], gfunc.wmm_declination_remod(lat[2], lon[1], timestamp[0], wmm))
+
+    def test_declination_site(self):
+        """
+        A site bound evaluator gives the declination of declination_array
+        at its position.
+        """
+        wmm = gfunc.WMM(gfunc.set_wmm_model(2010))
+        np.random.seed(17)
+        timestamp = np.random.uniform(3.47e9, 3.62e9, 500)
+        timestamp[7] = np.nan
+        for lat, lon, z in ((45.0, -128.0, -1.0), (-80.0, 240.0, 0.0), (89.9999, 0.0, 100.0)):
+            site = wmm.site(lat, lon, z)
+            out = site.declination(timestamp)
+            expected = wmm.declination_array(lat, lon, z, timestamp)
+            np.testing.assert_array_equal(out, expected)
+            self.assertTrue(np.isnan(out[7]))
+            self.assertEqual(site.declination(timestamp[0]).shape, ())
+
+        # magnetic_declination of a fixed position
+        expected = [gfunc.wmm_declination_remod(45.0, -128.0, t, wmm, 1000.0) for t in timestamp[10:30]]
+        np.testing.assert_array_equal(gfunc.magnetic_declination(45.0, -128.0, timestamp[10:30], 1000.0), expected)
+
+    def test_declination_coefficient_cache(self):
+        """
+        The coefficients are time adjusted once per date, whatever the order
+        of the timestamps.
+        """
+        wmm = gfunc.WMM(gfunc.set_wmm_model(2010))
+        np.random.seed(13)
+        midnight = 3575053740.0 - 3575053740.0 % 86400
+        # 3 dates, none at midnight
+        timestamp = midnight + np.random.randint(0, 3, 1000) * 86400. + np.random.uniform(100, 80000, 1000)
+        wmm.coefficient_cache_clear()
+        out = wmm.declination_array(45.0, -128.0, 0.0, timestamp)
+        info = wmm.coefficient_cache_info()
+        self.assertEqual(info['misses'], 3)
+        self.assertEqual(info['size'], 3)
+
+        order = np.argsort(timestamp)
+        np.testing.assert_array_equal(wmm.declination_array(45.0, -128.0, 0.0, timestamp[order]), out[order])
+        self.assertEqual(wmm.coefficient_cache_info()['hits'], 3)
+        self.assertEqual(out[0], wmm.declination(45.0, -128.0, 0.0,
+                                                 gfunc.datetime.datetime.utcfromtimestamp(timestamp[0] - 2208988800.).date()))
+
+    def test_declination_memo(self):
+        """
+        magnetic_declination evaluates each distinct position and date once,
+        and not again while they are kept, for the declinations of every
+        sample.
+        """
+        from ion_functions.data.declination import declination_memo, DECLINATION_MEMO_SIZE
+        from ion_functions.data.wmm import utc_days
+        wmm = gfunc.WMM(gfunc.set_wmm_model(2010))
+        np.random.seed(29)
+        midnight = 3575053740.0 - 3575053740.0 % 86400
+        # 4 dates, 3 positions, samples near midnight as well
+        timestamp = midnight + np.random.randint(0, 4, 600) * 86400. + np.random.uniform(-0.5, 86400, 600)
+        timestamp[[5, 50]] = np.nan
+        lat = np.array([45.0, -30.5, 45.0])[np.random.randint(0, 3, 600)]
+        lon = np.where(lat > 0, -128.0, 150.25)
+        z = np.where(lat > 0, 1000.0, 0.0)
+        day = utc_days(timestamp)
+        for i in (0, 1, 2, 3, 4):
+            date = gfunc.datetime.datetime.utcfromtimestamp(timestamp[i] - 2208988800.).date()
+            self.assertEqual(day[i], (date - gfunc.datetime.date(1900, 1, 1)).days)
+        self.assertTrue(np.isnan(day[5]))
+
+        declination_memo.clear()
+        out = gfunc.magnetic_declination(lat, lon, timestamp, z)
+        expected = wmm.declination_array(lat, lon, z / 1000., timestamp)
+        np.testing.assert_array_equal(out, expected)
+        info = declination_memo.info()
+        self.assertEqual((info['hits'], info['misses'], info['size']), (0, 8, 8))
+
+        # a second call of the same positions and dates is not evaluated
+        order = np.argsort(timestamp)
+        out2 = gfunc.magnetic_declination(lat[order], lon[order], timestamp[order], z[order])
+        np.testing.assert_array_equal(out2, expected[order])
+        self.assertEqual(declination_memo.info()['hits'], 8)
+
+        # a fixed position, keyed by the day alone
+        out = gfunc.magnetic_declination(45.0, -128.0, timestamp[order], 1000.0)
+        np.testing.assert_array_equal(out, wmm.declination_array(45.0, -128.0, 1.0, timestamp[order]))
+        self.assertEqual(gfunc.magnetic_declination(45.0, -128.0, timestamp[0], 1000.0).shape, ())
+
+        # beyond its size the least recently used are dropped
+        declination_memo.resize(2)
+        self.assertEqual(len(declination_memo), 2)
+        np.testing.assert_array_equal(gfunc.magnetic_declination(lat, lon, timestamp, z), expected)
+        declination_memo.resize(DECLINATION_MEMO_SIZE)
+        declination_memo.clear()
+
+    def test_declination_grid(self):
+        """
+        A declination grid reproduces the model at its knots, interpolates it
+        in between, and is saved to and loaded from a cache directory.
+        magnetic_declination interpolates it in the grid mode.
+        """
+        import datetime
+        import os
+        import shutil
+        import tempfile
+        from ion_functions.data import declination as decl
+        model = gfunc.set_wmm_model(2010)
+        wmm = gfunc.WMM(model)
+        knots = dict(start=datetime.date(2012, 1, 1), stop=datetime.date(2013, 1, 1),
+                     lat_step=2.0, lon_step=2.0, day_step=60)
+        tmp = tempfile.mkdtemp()
+        try:
+            grid = decl.DeclinationGrid.cached(wmm, model, tmp, **knots)
+            self.assertEqual(grid.values.shape, (91, 181, 8))
+            self.assertEqual(len(os.listdir(tmp)), 1)
+            loaded = decl.DeclinationGrid.cached(wmm, model, tmp, **knots)
+            np.testing.assert_array_equal(loaded.values, grid.values)
+        finally:
+            shutil.rmtree(tmp)
+
+        # the knots are the declinations of the model
+        lat, lon = np.meshgrid(grid.lat[::15], grid.lon[::20], indexing='ij')
+        ntp = (grid.day[3] + 0.25) * 86400.
+        np.testing.assert_allclose(grid.declination(lat, lon, ntp),
+                                   wmm.declination_array(lat, lon, 0.0, ntp), atol=1e-9)
+
+        check = grid.self_check(wmm, 2000, max_lat=60)
+        self.assertEqual(check['n'], 2000)
+        self.assertLess(check['mean_error'], 0.05)
+        self.assertLess(check['max_error'], 2.0)
+
+        # outside the grid in time and with no time
+        ntp = np.array([grid.day[0] * 86400. - 1.0, np.nan, (grid.day[2] + 0.5) * 86400.])
+        out = grid.declination(45.0, 190.0, ntp)
+        self.assertTrue(np.isnan(out[:2]).all())
+        self.assertAlmostEqual(out[2], grid.declination(45.0, -170.0, ntp[2]))
+
+        exact = gfunc.magnetic_declination(45.0, -170.0, ntp, 1000.0)
+        try:
+            decl.set_declination_mode('grid', grid)
+            self.assertEqual(decl.get_declination_mode(), 'grid')
+            out = gfunc.magnetic_declination(45.0, -170.0, ntp, 1000.0)
+            # evaluated where the grid has no value
+            self.assertEqual(out[0], exact[0])
+            self.assertTrue(np.isnan(out[1]))
+            self.assertAlmostEqual(out[2], grid.declination(45.0, -170.0, ntp[2]))
+            np.testing.assert_array_equal(gfunc.magnetic_declination(45.0, -170.0, ntp, 1000.0, mode='exact'), exact)
+        finally:
+            decl.set_declination_mode('exact')
+        self.assertRaises(ValueError, decl.set_declination_mode, 'nearest')
+        self.assertRaises(ValueError, gfunc.magnetic_declination, 45.0, -170.0, ntp, mode='nearest')
+
     def test_magnetic_correction(self):
         """
         Test magentic_correction function.
@@ -19,11 +19,65 @@ cdef extern from "wmm.h":
         double *lon
         double *z
         np.int64_t *timestamp
+    ctypedef struct wmm_points:
+        size_t len
+        double *lat
+        double *lon
+        double *z
+        double *ntp
+        Py_ssize_t lat_stride
+        Py_ssize_t lon_stride
+        Py_ssize_t z_stride
+        Py_ssize_t ntp_stride
 
     int wmm_initialize(char *filename, WMM_Model **model)
     int wmm_free(WMM_Model *model)
     double wmm_declination(WMM_Model *model, double lat, double lon, double z, int year, int month, int day)
     size_t wmm_velocity_correction(velocity_profile *in_vp, WMM_Model *model, velocity_profile *out_vp)
+    size_t wmm_declination_vector(WMM_Model *model, wmm_points *in_pts, double *out) nogil
+    ctypedef struct wmm_site:
+        pass
+    int wmm_site_init(WMM_Model *model, wmm_site *site, double lat, double lon, double z)
+    void wmm_site_free(wmm_site *site)
+    size_t wmm_site_declination_vector(WMM_Model *model, wmm_site *site, double *ntp, Py_ssize_t stride, size_t len, double *out) nogil
+    void wmm_utc_days(double *ntp, size_t len, double *out) nogil
+    void wmm_timed_stats(WMM_Model *model, size_t *hits, size_t *misses, size_t *size)
+    void wmm_timed_clear(WMM_Model *model)
+    int WMM_TIMED_NCACHED
+
+
+cdef np.ndarray _points(value, shape, double **data, Py_ssize_t *stride):
+    '''
+    Points data at value as float64 laid out over shape: a single value is
+    held once with a stride of 0, others are broadcast to shape and made
+    contiguous. Returns the array that owns the data.
+    '''
+    cdef np.ndarray arr = np.asanyarray(value, dtype=np.float64)
+    if arr.size == 1:
+        arr = arr.reshape(1)
+        stride[0] = 0
+    else:
+        arr = np.ascontiguousarray(np.broadcast_to(arr, shape)).reshape(-1)
+        stride[0] = 1
+    data[0] = <double *> np.PyArray_DATA(arr)
+    return arr
+
+def utc_days(ntp_timestamp):
+    '''
+    The UTC day of NTP seconds (since 1900-01-01), counted from 1900-01-01,
+    which the declination is evaluated for: the date of
+    datetime.datetime.utcfromtimestamp. Returns a float64 array of the shape
+    of ntp_timestamp, NaN where it is not finite.
+    '''
+    cdef np.ndarray ntp = np.ascontiguousarray(ntp_timestamp, dtype=np.float64)
+    cdef np.ndarray out = np.empty(np.shape(ntp_timestamp), dtype=np.float64)
+    cdef double *ntp_data = <double *> np.PyArray_DATA(ntp)
+    cdef double *out_data = <double *> np.PyArray_DATA(out)
+    cdef size_t n = out.size
+    with nogil:
+        wmm_utc_days(ntp_data, n, out_data)
+    return out
+
 
 cdef class WMM:
     # CSF change this to us a pointer to a WMM_Model.  wmm_initialize will
@@ -73,6 +127,62 @@ cdef class WMM:
         cdef retval = wmm_declination(<WMM_Model *>self.model, <double>lat, <double>lon, <double>z, <int> date.year, <int> date.month, <int> date.day)
         return retval
 
+    def site(self, double lat, double lon, double z):
+        '''
+        Declination evaluator bound to a fixed site, e.g. a mooring
+        lat: degrees north
+        lon: degrees east
+        z: km (MSL)
+        '''
+        return WMMSite(self, lat, lon, z)
+
+    def coefficient_cache_info(self):
+        '''
+        Returns the hits, misses, size and capacity of the coefficient sets
+        time adjusted to recent dates. The sets are kept by the model, shared
+        by every WMM of the same coefficients file.
+        '''
+        cdef size_t hits, misses, size
+        wmm_timed_stats(self.model, &hits, &misses, &size)
+        return {'hits': hits, 'misses': misses, 'size': size, 'maxsize': WMM_TIMED_NCACHED}
+
+    def coefficient_cache_clear(self):
+        '''
+        Drops the time adjusted coefficient sets and resets the counts
+        '''
+        wmm_timed_clear(self.model)
+
+    def declination_array(self, lat, lon, z, ntp_timestamp):
+        '''
+        Declination over arrays, broadcast against each other
+        lat: degrees north
+        lon: degrees east
+        z: km (MSL)
+        ntp_timestamp: NTP seconds (since 1900-01-01), evaluated for their
+            UTC date as datetime.datetime.utcfromtimestamp gives it
+        Returns an array of the broadcast shape, NaN where ntp_timestamp is
+        not finite. The points are evaluated date by date, each with the
+        coefficients time adjusted to it once.
+        '''
+        cdef wmm_points pts
+        cdef size_t retval
+        shape = np.broadcast(lat, lon, z, ntp_timestamp).shape
+        cdef np.ndarray out = np.empty(shape, dtype=np.float64)
+        # Keep the buffers alive while the C loop runs
+        buffers = (_points(lat, shape, &pts.lat, &pts.lat_stride),
+                   _points(lon, shape, &pts.lon, &pts.lon_stride),
+                   _points(z, shape, &pts.z, &pts.z_stride),
+                   _points(ntp_timestamp, shape, &pts.ntp, &pts.ntp_stride))
+        cdef double *out_data = <double *> np.PyArray_DATA(out)
+        pts.len = out.size
+        if pts.len == 0:
+            return out
+        with nogil:
+            retval = wmm_declination_vector(self.model, &pts, out_data)
+        if retval != pts.len:
+            raise RuntimeError("Failed to Process All Vector Elements")
+        return out
+
     @cython.boundscheck(False)
     @cython.wraparound(False)
     def velocity_correction(self, uu, vv, lat, lon, z, timestamp, zflag=-1):
@@ -134,3 +244,50 @@ cdef class WMM:
             raise RuntimeError("Failed to Process All Vector Elements")
         return uu_cor, vv_cor
 
+
+cdef class WMMSite:
+    '''
+    The declination at a fixed site. The geoid height, the spherical
+    coordinates, the spherical harmonic variables and the Legendre functions
+    of the site are computed once, so each date only costs the summation of
+    its time adjusted coefficients. Made by WMM.site.
+    '''
+    cdef WMM wmm
+    cdef wmm_site site
+    cdef bint ready
+    cdef readonly double lat, lon, z
+
+    def __cinit__(self, WMM wmm, double lat, double lon, double z):
+        self.wmm = wmm
+        self.lat = lat
+        self.lon = lon
+        self.z = z
+        if wmm_site_init(wmm.model, &self.site, lat, lon, z):
+            raise MemoryError("Unable to initialize the WMM site")
+        self.ready = True
+
+    def __dealloc__(self):
+        if self.ready:
+            wmm_site_free(&self.site)
+
+    def declination(self, ntp_timestamp):
+        '''
+        Declination at the site, equal to WMM.declination_array there
+        ntp_timestamp: NTP seconds (since 1900-01-01), evaluated for their
+            UTC date as datetime.datetime.utcfromtimestamp gives it
+        Returns an array of the shape of ntp_timestamp, NaN where it is not
+        finite
+        '''
+        cdef np.ndarray ntp = np.ascontiguousarray(ntp_timestamp, dtype=np.float64)
+        cdef np.ndarray out = np.empty(np.shape(ntp_timestamp), dtype=np.float64)
+        cdef double *ntp_data = <double *> np.PyArray_DATA(ntp)
+        cdef double *out_data = <double *> np.PyArray_DATA(out)
+        cdef size_t n = out.size
+        cdef size_t retval
+        if n == 0:
+            return out
+        with nogil:
+            retval = wmm_site_declination_vector(self.wmm.model, &self.site, ntp_data, 1, n, out_data)
+        if retval != n:
+            raise RuntimeError("Failed to Process All Vector Elements")
+        return out
@@ -1,11 +1,20 @@
 from ion_functions.data.perf.test_performance import PerformanceTestCase, a_year, a_day
 from ion_functions.qc.qc_functions import dataqc_globalrangetest_minmax as grt
+from ion_functions.qc.qc_functions import dataqc_globalrangetest_batch as grt_batch
+from ion_functions.qc.qc_functions import globalrange_limits
 from ion_functions.qc.qc_functions import dataqc_spiketest as spiketest
 from ion_functions.qc.qc_functions import dataqc_stuckvaluetest as stuckvalue
 from ion_functions.qc.qc_functions import dataqc_polytrendtest as trend
 from ion_functions.qc.qc_functions import dataqc_gradienttest as grad
 from ion_functions.qc.qc_functions import dataqc_localrangetest as local
-from ion_functions.qc.qc_functions import ntp_to_month
+from ion_functions.qc.qc_functions import dataqc_solarelevation as solarelevation
+from ion_functions.qc.qc_functions import ntp_to_month, ntp_to_civil
+from ion_functions.qc.qc_parallel import run_qc_batch, run_qc_sharded
+from ion_functions.qc.qc_interpolation import interpolate_limits
+from ion_functions.qc.qc_suite import run_qc_suite
+from ion_functions.qc.qc_incremental import recompute_qc
+
+from multiprocessing import cpu_count
 
 import numpy as np
 import unittest
@@ -25,6 +34,17 @@ class TestQCPerformance(PerformanceTestCase):
 
         self.profile(stats, grt, sample_set, mins, maxs)
 
+    def test_globalrangetest_batch(self):
+        stats = []
+        # A day of 40 parameters tested against a limits table parsed once
+        block = np.empty((a_day, 40), dtype=np.float32)
+        block.fill(17.)
+        block[::20] = 40
+        datlim = globalrange_limits(np.arange(40) - 20., np.arange(40) + 20.)
+        out = np.empty(block.shape, dtype=np.int8)
+
+        self.profile(stats, grt_batch, block, datlim, out)
+
     def test_spiketest(self):
         stats = []
 
@@ -35,6 +55,26 @@ class TestQCPerformance(PerformanceTestCase):
 
         self.profile(stats, spiketest, sample_set, 0.1)
 
+    def test_spiketest_long_window(self):
+        stats = []
+
+        sample_set = np.empty(a_year, dtype=np.float)
+        sample_set.fill(3)
+        indexes = [i for i in xrange(a_day * 2) if not i%20]
+        sample_set[indexes] = 40
+
+        self.profile(stats, spiketest, sample_set, 0.1, 5, 301)
+
+    def test_spiketest_int32(self):
+        stats = []
+
+        # Raw counts are read in place, not converted to float64
+        sample_set = np.empty(a_year, dtype=np.int32)
+        sample_set.fill(3)
+        indexes = [i for i in xrange(a_day * 2) if not i%20]
+        sample_set[indexes] = 40
+
+        self.profile(stats, spiketest, sample_set, 0.1)
 
     def test_stuckvalue(self):
         stats = []
@@ -44,12 +84,97 @@ class TestQCPerformance(PerformanceTestCase):
         sample_set[0:len(v)] = v
         self.profile(stats, stuckvalue, sample_set, 0.001, 4)
 
+    def test_stuckvalue_num_scaling(self):
+        # The run-length kernel should take the same time whatever num is
+        sample_set = np.arange(a_year, dtype=np.float)
+        sample_set[a_day:a_day * 2] = 3.33
+        for num in (4, 40, 400, 4000):
+            stats = []
+            print 'num=%i' % num
+            self.profile(stats, stuckvalue, sample_set, 0.001, num)
+
+    def test_qc_batch_scaling(self):
+        # One parameter per thread, the run time should fall close to
+        # linearly with the number of workers up to the core count
+        sample_set = np.sin(np.arange(a_day * 7, dtype=np.float) / 60.) * 4 + 2
+        series = [sample_set.copy() for i in xrange(16)]
+        params = {'acc': 0.1, 'N': 5, 'L': 5}
+        workers = 1
+        while workers <= cpu_count():
+            stats = []
+            print 'workers=%i' % workers
+            self.profile(stats, run_qc_batch, series, 'spike', params, workers=workers)
+            workers *= 2
+
+    def test_qc_sharded_scaling(self):
+        # A year of 1 Hz data split into one shard per thread
+        sample_set = np.sin(np.arange(a_year, dtype=np.float) / 600.) * 4 + 2
+        params = {'acc': 0.1, 'N': 5, 'L': 101}
+        workers = 1
+        while workers <= cpu_count():
+            stats = []
+            print 'workers=%i' % workers
+            self.profile(stats, run_qc_sharded, sample_set, 'spike', params, workers=workers)
+            workers *= 2
+
     def test_trend(self):
         stats = []
         x = np.arange(a_year, dtype=np.float)
         sample_set = np.sin(np.pi * 2 * x/60.) * 6 + 3.
         self.profile(stats, trend, sample_set, np.arange(a_year, dtype=np.float))
 
+    def test_trend_windowed(self):
+        # A week of 1 Hz data in hour long windows, one a minute
+        stats = []
+        n = a_day * 7
+        t = 3.6e9 + np.arange(n, dtype=np.float)
+        sample_set = np.sin(np.arange(n, dtype=np.float) / 600.) + np.random.random_sample(n)
+
+        self.profile(stats, trend, sample_set, t, 1, 3, window=3600, step=60)
+
+    def suite_input(self):
+        # A year of 1 Hz float32 samples, as instruments deliver them
+        dat = (np.sin(np.arange(a_year, dtype=np.float) / 600.) * 4 + 2).astype(np.float32)
+        x = np.arange(a_year, dtype=np.float)
+        config = {'glblrng': {'datlim': [-10, 10]},
+                  'spketst': {'acc': 0.1, 'N': 5, 'L': 5},
+                  'stuckvl': {'reso': 0.001, 'num': 10},
+                  'gradtst': {'ddatdx': [-5, 5], 'mindx': 0, 'startdat': np.nan, 'toldat': 1.0}}
+        return dat, x, config
+
+    def test_qc_suite(self):
+        stats = []
+        dat, x, config = self.suite_input()
+        self.profile(stats, run_qc_suite, dat, x, config)
+
+    def test_qc_suite_sequential(self):
+        # The same tests as test_qc_suite, one call each
+        stats = []
+        dat, x, config = self.suite_input()
+        def sequential():
+            grt(dat, *config['glblrng']['datlim'])
+            spiketest(dat, **config['spketst'])
+            stuckvalue(dat, **config['stuckvl'])
+            grad(dat, x, **config['gradtst'])
+        self.profile(stats, sequential)
+
+    def test_qc_suite_runs(self):
+        # test_qc_suite with the flags of each test returned as runs
+        stats = []
+        dat, x, config = self.suite_input()
+        self.profile(stats, run_qc_suite, dat, x, config, runs=True)
+
+    def test_qc_incremental(self):
+        # A day of a year of data recalibrated, against test_qc_suite_sequential
+        stats = []
+        dat, x, config = self.suite_input()
+        flags = {'glblrng': np.asarray(grt(dat, *config['glblrng']['datlim']), dtype=np.int8),
+                 'spketst': spiketest(dat, **config['spketst']),
+                 'stuckvl': stuckvalue(dat, **config['stuckvl']),
+                 'gradtst': np.asarray(grad(dat, x, **config['gradtst']), dtype=np.int8)}
+        dat[a_day * 100:a_day * 101] *= 1.01
+        self.profile(stats, recompute_qc, dat, x, config, flags, [(a_day * 100, a_day * 101)])
+
     def test_gradient(self):
         stats = []
         sample_set = np.arange(a_year, dtype=np.float)
@@ -65,6 +190,22 @@ class TestQCPerformance(PerformanceTestCase):
         datlimz = np.arange(a_year)
         self.profile(stats, local, dat, z, datlim, datlimz)
 
+    def test_local_range_grid(self):
+        # Month x depth bin climatology, looked up on the rectilinear grid and
+        # through the Delaunay triangulation for a million samples
+        n = 1000000
+        depth, month = np.meshgrid(np.arange(0, 1000, 20.), np.arange(1, 13.))
+        datlimz = np.column_stack([depth.flatten(), month.flatten()])
+        datlim = np.column_stack([datlimz[:, 0] / 100., datlimz[:, 0] / 100. + 10])
+        z = np.column_stack([np.random.uniform(0, 980, n), np.random.randint(1, 13, n)])
+
+        print 'grid'
+        stats = []
+        self.profile(stats, interpolate_limits, z, datlim, datlimz)
+        print 'delaunay'
+        stats = []
+        self.profile(stats, interpolate_limits, z, datlim, datlimz, grid=False)
+
     def test_ntp_to_month(self):
         stats = []
         t0 = 1356998400 + 2208988800 # 2013-01-01 + NTP Offset
@@ -73,4 +214,41 @@ class TestQCPerformance(PerformanceTestCase):
 
         self.profile(stats, ntp_to_month, dat)
 
-        
+    def test_ntp_to_month_irregular(self):
+        # Unordered times spread over ten years, every sample needs its own
+        # calendar conversion
+        stats = []
+        t0 = 1356998400 + 2208988800 # 2013-01-01 + NTP Offset
+        dat = np.random.uniform(t0, t0 + 10 * 365 * 86400., a_year)
+
+        self.profile(stats, ntp_to_month, dat)
+
+    def test_ntp_to_civil(self):
+        stats = []
+        t0 = 1356998400 + 2208988800 # 2013-01-01 + NTP Offset
+        dat = np.arange(a_year) + t0 + 0.5
+
+        self.profile(stats, ntp_to_civil, dat)
+
+    def test_solarelevation(self):
+        # A year of one minute METBK shortwave timestamps
+        stats = []
+        n = a_year / 60
+        dt = 1356998400 + np.arange(n, dtype=np.float) * 60 # 2013-01-01
+        lon = np.empty(n, dtype=np.float)
+        lon.fill(-124.3)
+        lat = np.empty(n, dtype=np.float)
+        lat.fill(44.6)
+
+        self.profile(stats, solarelevation, lon, lat, dt)
+
+    def test_solarelevation_tabulated(self):
+        stats = []
+        n = a_year / 60
+        dt = 1356998400 + np.arange(n, dtype=np.float) * 60 # 2013-01-01
+        lon = np.empty(n, dtype=np.float)
+        lon.fill(-124.3)
+        lat = np.empty(n, dtype=np.float)
+        lat.fill(44.6)
+
+        self.profile(stats, solarelevation, lon, lat, dt, tabulated=True)
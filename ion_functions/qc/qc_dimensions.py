@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_dimensions
+@file ion_functions/qc/qc_dimensions.py
+@brief Per-dataset cache of the dimension vectors of the local range test
+"""
+
+import threading
+
+import numpy as np
+
+from ion_functions.qc.qc_extensions import ntp_to_month
+
+
+def _month(time):
+    return ntp_to_month(np.asanyarray(time, dtype=np.float))
+
+# Dimensions computed from another one the callback provides
+DERIVED_DIMENSIONS = {'month': ('time', _month)}
+
+
+class DimensionCache(object):
+    '''
+    The dimension vectors of one dataset, fetched from its pval_callback once
+    and kept for every local range test run on it. Derived dimensions, such
+    as the month of the time vector, and the stacked z of a set of dimensions
+    are kept as well. Binding the cache to another dataset drops them all.
+
+    Hand the cache to dataqc_localrangetest_wrapper in place of the callback:
+
+        dims = DimensionCache(pval_callback, dataset=stream_id)
+        for dat, datlim, datlimz in parameters:
+            qcflag = dataqc_localrangetest_wrapper(dat, datlim, datlimz,
+                                                   ['pressure', 'month'], dims)
+        dims.bind(pval_callback, dataset=next_stream_id)
+
+    The vectors are shared between the tests and must not be modified.
+    '''
+    def __init__(self, pval_callback=None, dataset=None):
+        self.pval_callback = pval_callback
+        self.dataset = dataset
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._lock = threading.RLock()
+
+    def bind(self, pval_callback, dataset=None):
+        '''
+        Fetches from pval_callback from now on. The vectors kept are dropped
+        unless dataset is the one the cache holds.
+        '''
+        with self._lock:
+            if dataset is None or dataset != self.dataset:
+                self._entries.clear()
+            self.pval_callback = pval_callback
+            self.dataset = dataset
+
+    def _cached(self, key, compute):
+        with self._lock:
+            if key in self._entries:
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+            value = self._entries[key] = compute()
+            return value
+
+    def get(self, dim):
+        '''
+        The vector of dimension dim, fetched or derived on the first request
+        '''
+        if dim in DERIVED_DIMENSIONS:
+            source, derive = DERIVED_DIMENSIONS[dim]
+            return self._cached(dim, lambda: derive(self.get(source)))
+        if self.pval_callback is None:
+            raise ValueError('The dimension cache is not bound to a callback')
+        return self._cached(dim, lambda: self.pval_callback(dim))
+
+    def stack(self, dims):
+        '''
+        z of the local range test for dims: the vector of a single dimension,
+        else the vectors as columns
+        '''
+        dims = tuple(dims)
+        if len(dims) == 1:
+            return self.get(dims[0])
+        return self._cached(dims, lambda: np.column_stack([self.get(dim) for dim in dims]))
+
+    def info(self):
+        '''
+        Returns the hits, misses and number of vectors kept
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+    def clear(self):
+        '''
+        Drops every vector and resets the counters
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
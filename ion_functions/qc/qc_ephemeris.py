@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_ephemeris
+@file ion_functions/qc/qc_ephemeris.py
+@brief Solar ephemeris for dataqc_solarelevation, exact and tabulated
+"""
+
+import threading
+
+import numpy as np
+from ion_functions.qc.qc_extensions import ntp_to_civil
+
+# Seconds from 1900-01-01 (NTP) to 1970-01-01 (Epoch)
+NTP_OFFSET = 2208988800
+
+deg2rad = np.pi / 180.0
+
+
+def solar_time(dt):
+    '''
+    Returns the Universal Time in hours and the Julian ephemeris date in days
+    of the Epoch times dt (seconds since 1970-01-01, whole seconds).
+    '''
+    # Break the Epoch time input down into UTC calendar elements. Like
+    # time.gmtime, whole seconds are used, truncated towards zero.
+    yy, mn, dd, yday, sod = ntp_to_civil(np.fix(dt) + NTP_OFFSET)
+    yy = yy.astype(np.int)
+    mn = mn.astype(np.int)
+    dd = dd.astype(np.int)
+    sod = sod.astype(np.int)
+    hh = sod // 3600
+    mm = sod // 60 % 60
+    ss = sod % 60
+
+    # compute Universal Time in hours
+    utime = hh + (mm + ss / 60.0) / 60.0
+
+    # compute Julian ephemeris date in days (Day 1 is 1 Jan 4713 B.C. which
+    # equals -4712 Jan 1)
+    jed = (367.0 * yy - np.fix(7.0*(yy+np.fix((mn+9)/12.0))/4.0)
+           + np.fix(275.0*mn/9.0) + dd + 1721013 + utime / 24.0)
+
+    return utime, jed
+
+
+def solar_ephemeris(jed):
+    '''
+    Returns the solar declination [radians], the equation of time [minutes]
+    and rho, the square of the sun radius vector, at the Julian ephemeris
+    dates jed. These are the reduced accuracy expressions of the Almanac for
+    Computers (1978), valid for the years 1800-2100.
+    '''
+    # compute interval in Julian centuries since 1900
+    jc_int = (jed - 2415020.0) / 36525.0
+
+    # compute mean anomaly of the sun
+    ma_sun = 358.475833 + 35999.049750 * jc_int - 0.000150 * jc_int**2
+    ma_sun = (ma_sun - np.fix(ma_sun/360.0) * 360.0) * deg2rad
+
+    # compute mean longitude of sun
+    ml_sun = 279.696678 + 36000.768920 * jc_int + 0.000303 * jc_int**2
+    ml_sun = (ml_sun - np.fix(ml_sun/360.0) * 360.0) * deg2rad
+
+    # compute mean anomaly of Jupiter
+    ma_jup = 225.444651 + 2880.0 * jc_int + 154.906654 * jc_int
+    ma_jup = (ma_jup - np.fix(ma_jup/360.0) * 360.0) * deg2rad
+
+    # compute longitude of the ascending node of the moon's orbit
+    an_moon = (259.183275 - 1800 * jc_int - 134.142008 * jc_int
+               + 0.002078 * jc_int**2)
+    an_moon = (an_moon - np.fix(an_moon/360.0) * 360.0 + 360.0) * deg2rad
+
+    # compute mean anomaly of Venus
+    ma_ven = (212.603219 + 58320 * jc_int + 197.803875 * jc_int
+              + 0.001286 * jc_int**2)
+    ma_ven = (ma_ven - np.fix(ma_ven/360.0) * 360.0) * deg2rad
+
+    # compute sun theta
+    theta = (0.397930 * np.sin(ml_sun) + 0.009999 * np.sin(ma_sun-ml_sun)
+             + 0.003334 * np.sin(ma_sun+ml_sun) - 0.000208 * jc_int
+             * np.sin(ml_sun) + 0.000042 * np.sin(2*ma_sun+ml_sun) - 0.000040
+             * np.cos(ml_sun) - 0.000039 * np.sin(an_moon-ml_sun) - 0.000030
+             * jc_int * np.sin(ma_sun-ml_sun) - 0.000014
+             * np.sin(2*ma_sun-ml_sun) - 0.000010
+             * np.cos(ma_sun-ml_sun-ma_jup) - 0.000010 * jc_int
+             * np.sin(ma_sun+ml_sun))
+
+    # compute sun rho
+    rho = (1.000421 - 0.033503 * np.cos(ma_sun) - 0.000140 * np.cos(2*ma_sun)
+           + 0.000084 * jc_int * np.cos(ma_sun) - 0.000033
+           * np.sin(ma_sun-ma_jup) + 0.000027 * np.sin(2.*ma_sun-2.*ma_ven))
+
+    # compute declination
+    decln = np.arcsin(theta/np.sqrt(rho))
+
+    # compute equation of time (in seconds of time)
+    l = 276.697 + 0.98564734 * (jed-2415020.0)
+    l = (l - 360.0 * np.fix(l/360.0)) * deg2rad
+    eqt = (-97.8 * np.sin(l) - 431.3 * np.cos(l) + 596.6 * np.sin(2*l)
+           - 1.9 * np.cos(2*l) + 4.0 * np.sin(3*l) + 19.3 * np.cos(3*l)
+           - 12.7 * np.sin(4*l))
+    eqt = eqt / 60.0
+
+    return decln, eqt, rho
+
+
+class SolarEphemerisTable(object):
+    '''
+    solar_ephemeris tabulated every step seconds over 1800-2100 and linearly
+    interpolated.
+
+    The declination, equation of time and sun distance only depend on time,
+    so a long record of positions can share them. The table is built lazily
+    in blocks of block_size steps (455 days at the default ten minutes,
+    1.5 MB) the first time a time inside them is looked up, and kept for the
+    life of the process. Times outside the table are evaluated exactly.
+
+    Against the exact series, linear interpolation on the ten minute grid
+    changes the declination by less than 1e-7 degrees and the equation of
+    time by less than 1e-6 minutes (measured maxima over 1800-2100: 5e-8
+    degrees and 9e-8 minutes), so solar altitude moves by less than 1e-6
+    degrees and the radiation by less than 1e-5 W m^-2. The bound is
+    checked in the unit tests.
+    '''
+    start = -5364662400     # 1800-01-01 in seconds since 1970-01-01
+    stop = 4102444800       # 2100-01-01
+
+    def __init__(self, step=600, block_size=65536):
+        self.step = step
+        self.block_size = block_size
+        self._blocks = {}
+        self._lock = threading.Lock()
+
+    def _block(self, b):
+        '''
+        Returns the table of block b, the exact terms at block_size + 1 nodes
+        '''
+        table = self._blocks.get(b)
+        if table is None:
+            nodes = self.start + (b * self.block_size + np.arange(self.block_size + 1)) * self.step
+            utime, jed = solar_time(nodes.astype(np.float))
+            table = np.column_stack(solar_ephemeris(jed))
+            with self._lock:
+                table = self._blocks.setdefault(b, table)
+        return table
+
+    def __call__(self, dt):
+        '''
+        Returns decln, eqt and rho at the Epoch times dt (whole seconds), like
+        solar_ephemeris(solar_time(dt)[1]).
+        '''
+        dt = np.asanyarray(dt, dtype=np.float)
+        out = np.empty((dt.size, 3))
+        inside = (dt >= self.start) & (dt < self.stop)
+        if not inside.all():
+            out[~inside] = np.column_stack(solar_ephemeris(solar_time(dt[~inside])[1]))
+
+        # Node below each time, its block and the fraction to the next node
+        pos = (dt[inside] - self.start) / self.step
+        node = np.floor(pos).astype(np.int64)
+        frac = (pos - node)[:, None]
+        block = node // self.block_size
+        offset = node - block * self.block_size
+        blocks = np.unique(block)
+        values = np.empty((node.size, 3))
+        for b in blocks:
+            # Most records fall in a single block
+            sel = slice(None) if blocks.size == 1 else block == b
+            table = self._block(b)
+            o = offset[sel]
+            lower = table[o]
+            values[sel] = lower + (table[o + 1] - lower) * frac[sel]
+        out[inside] = values
+        return out[:, 0], out[:, 1], out[:, 2]
+
+    def __len__(self):
+        return len(self._blocks)
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+
+
+# Shared by all calls to dataqc_solarelevation(..., tabulated=True)
+solar_ephemeris_table = SolarEphemerisTable()
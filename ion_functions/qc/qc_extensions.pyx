@@ -5,63 +5,562 @@ cimport cython
 
 np.import_array()
 
-cdef extern from "stuck.h":
+cdef extern from "stuck.h" nogil:
     int stuck(signed char *out, double *dat, size_t len, double reso, int num)
+    int stuck_strided(signed char *out, Py_ssize_t out_stride, double *dat, Py_ssize_t stride, size_t len, double reso, int num)
+    int stuck_strided_float32(signed char *out, Py_ssize_t out_stride, float *dat, Py_ssize_t stride, size_t len, double reso, int num)
+    int stuck_strided_int32(signed char *out, Py_ssize_t out_stride, int *dat, Py_ssize_t stride, size_t len, double reso, int num)
+    int stuck_strided_int16(signed char *out, Py_ssize_t out_stride, short *dat, Py_ssize_t stride, size_t len, double reso, int num)
 
-cdef extern from "spike.h":
+cdef extern from "spike.h" nogil:
     int spike(signed char *out, double *dat, size_t len, int L, double N, double acc)
+    int spike_running(signed char *out, double *dat, size_t len, int L, double N, double acc)
+    int spike_strided(signed char *out, Py_ssize_t out_stride, double *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_running_strided(signed char *out, Py_ssize_t out_stride, double *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_strided_float32(signed char *out, Py_ssize_t out_stride, float *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_running_strided_float32(signed char *out, Py_ssize_t out_stride, float *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_strided_int32(signed char *out, Py_ssize_t out_stride, int *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_running_strided_int32(signed char *out, Py_ssize_t out_stride, int *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_strided_int16(signed char *out, Py_ssize_t out_stride, short *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int spike_running_strided_int16(signed char *out, Py_ssize_t out_stride, short *dat, Py_ssize_t stride, size_t len, int L, double N, double acc)
+    int SPIKE_RUNNING_MIN_L
 
-cdef extern from "gradient.h":
+cdef extern from "gradient.h" nogil:
+    ctypedef struct gradient_state:
+        double startdat
+        size_t skipped
+        bint bad
     int gradient(signed char *out, double *dat, double *x, size_t len, double grad_min, double grad_max, double mindx, double startdat, double toldat, double skipped_value)
+    void gradient_start(signed char *out, double *dat, double startdat, double toldat, gradient_state *state)
+    int gradient_resume(signed char *out, double *dat, double *x, size_t start, size_t len, double grad_min, double grad_max, double mindx, double toldat, signed char skipped_value, gradient_state *state)
+    int gradient_strided(signed char *out, Py_ssize_t out_stride, double *dat, Py_ssize_t stride, double *x, Py_ssize_t x_stride, size_t len, double grad_min, double grad_max, double mindx, double startdat, double toldat, signed char skipped_value)
+    int gradient_strided_float32(signed char *out, Py_ssize_t out_stride, float *dat, Py_ssize_t stride, double *x, Py_ssize_t x_stride, size_t len, double grad_min, double grad_max, double mindx, double startdat, double toldat, signed char skipped_value)
+    int gradient_strided_int32(signed char *out, Py_ssize_t out_stride, int *dat, Py_ssize_t stride, double *x, Py_ssize_t x_stride, size_t len, double grad_min, double grad_max, double mindx, double startdat, double toldat, signed char skipped_value)
+    int gradient_strided_int16(signed char *out, Py_ssize_t out_stride, short *dat, Py_ssize_t stride, double *x, Py_ssize_t x_stride, size_t len, double grad_min, double grad_max, double mindx, double startdat, double toldat, signed char skipped_value)
     
-cdef extern from "time_utils.h":
+cdef extern from "qc_suite.h" nogil:
+    ctypedef unsigned short uint16_t
+    ctypedef struct qc_suite_config:
+        uint16_t range_bit
+        double range_min
+        double range_max
+        uint16_t spike_bit
+        int spike_L
+        double spike_N
+        double spike_acc
+        uint16_t stuck_bit
+        double stuck_reso
+        int stuck_num
+        uint16_t gradient_bit
+        double grad_min
+        double grad_max
+        double grad_mindx
+        double grad_startdat
+        double grad_toldat
+    int qc_suite(uint16_t *out, double *dat, double *x, size_t len, qc_suite_config *cfg, size_t block)
+    int qc_suite_runs(qc_runs *runs, double *dat, double *x, size_t len, qc_suite_config *cfg, size_t block, signed char skipped_value)
+    int QC_SUITE_TESTS
+
+cdef extern from "range.h" nogil:
+    int range_strided(signed char *out, Py_ssize_t out_stride, double *dat, Py_ssize_t stride, size_t len, double lo, double hi)
+    int range_strided_float32(signed char *out, Py_ssize_t out_stride, float *dat, Py_ssize_t stride, size_t len, double lo, double hi)
+    int range_strided_int32(signed char *out, Py_ssize_t out_stride, int *dat, Py_ssize_t stride, size_t len, double lo, double hi)
+    int range_strided_int16(signed char *out, Py_ssize_t out_stride, short *dat, Py_ssize_t stride, size_t len, double lo, double hi)
+
+cdef extern from "runs.h" nogil:
+    ctypedef struct qc_run:
+        size_t start
+        size_t stop
+        signed char code
+    ctypedef struct qc_runs:
+        qc_run *runs
+        size_t len
+        size_t cap
+    void runs_free(qc_runs *runs)
+
+cdef extern from "time_utils.h" nogil:
     int ntp_month_vector(short int *out, double *input, size_t len)
+    int ntp_civil_vector(double *input, size_t len, int *year, short int *month, short int *day, short int *yday, double *sod)
+
+
+
+# Sample types the kernels read in place, any other is converted to float64
+ctypedef fused sample_t:
+    short
+    int
+    float
+    double
+
+NATIVE_TYPES = (np.int16, np.int32, np.float32, np.float64)
+
+
+cdef class _Columns:
+    '''
+    Element strides of a 1-D or 2-D array laid out as columns along axis, and
+    the int8 flag array with the same shape, or out. int16, int32, float32
+    and float64 arrays are read as they are, others are converted to float64,
+    as are all of them unless native.
+    '''
+    cdef object arr
+    cdef object out
+    cdef char *data
+    cdef int typenum
+    cdef signed char *out_data
+    cdef Py_ssize_t length, ncols, stride, col_stride, out_stride, out_col_stride
+
+    def __init__(self, dat, axis=0, native=True, out=None):
+        cdef np.ndarray arr = np.asanyarray(dat)
+        cdef np.ndarray flags
+        cdef Py_ssize_t itemsize
+        if not native or arr.dtype.type not in NATIVE_TYPES or not arr.dtype.isnative:
+            arr = np.asanyarray(arr, dtype=np.float64)
+        itemsize = arr.itemsize
+        if arr.ndim == 0:
+            arr = arr.reshape(1)
+        if arr.ndim > 2:
+            raise ValueError('Expected a 1-D or 2-D array, got %d dimensions' % arr.ndim)
+        if axis not in (0, 1, -1, -2) or (arr.ndim == 1 and axis not in (0, -1)):
+            raise ValueError('axis %r is out of bounds for a %d-D array' % (axis, arr.ndim))
+        if not arr.flags.aligned or any(st % itemsize for st in (<object> arr).strides):
+            # Only views that can not be addressed in elements are copied
+            arr = np.array(arr)
+        if out is None:
+            flags = np.ones((<object> arr).shape, dtype=np.int8)
+        elif not isinstance(out, np.ndarray) or out.dtype != np.int8 or out.shape != (<object> arr).shape:
+            raise ValueError("'out' must be an int8 array of shape %s" % ((<object> arr).shape,))
+        else:
+            flags = out
+        self.arr = arr
+        self.out = flags
+        self.data = <char *> np.PyArray_DATA(arr)
+        self.typenum = np.PyArray_TYPE(arr)
+        self.out_data = <signed char *> np.PyArray_DATA(flags)
+        if arr.ndim == 1:
+            self.length = arr.shape[0]
+            self.ncols = 1
+            self.stride = arr.strides[0] / itemsize
+            self.out_stride = flags.strides[0]
+            self.col_stride = self.out_col_stride = 0
+        else:
+            axis = axis % 2
+            self.length = arr.shape[axis]
+            self.ncols = arr.shape[1 - axis]
+            self.stride = arr.strides[axis] / itemsize
+            self.col_stride = arr.strides[1 - axis] / itemsize
+            self.out_stride = flags.strides[axis]
+            self.out_col_stride = flags.strides[1 - axis]
 
+    cdef np.ndarray params(self, value, name, dtype):
+        '''
+        Returns value as one entry per column, a scalar applies to all
+        '''
+        cdef np.ndarray arr = np.array(value, dtype=dtype, ndmin=1).ravel()
+        if arr.shape[0] == 1:
+            return np.repeat(arr, self.ncols)
+        if arr.shape[0] != self.ncols:
+            raise ValueError("'%s' must be a scalar or have one entry per column (%d), got %d" % (name, self.ncols, arr.shape[0]))
+        return arr
 
 
+cdef void _stuck_columns(_Columns cols, sample_t *data, double *reso, int *num) nogil:
+    cdef Py_ssize_t c
+    cdef signed char *out
+    cdef sample_t *col
+    for c in range(cols.ncols):
+        out = cols.out_data + c * cols.out_col_stride
+        col = data + c * cols.col_stride
+        if sample_t is short:
+            stuck_strided_int16(out, cols.out_stride, col, cols.stride, cols.length, reso[c], num[c])
+        elif sample_t is int:
+            stuck_strided_int32(out, cols.out_stride, col, cols.stride, cols.length, reso[c], num[c])
+        elif sample_t is float:
+            stuck_strided_float32(out, cols.out_stride, col, cols.stride, cols.length, reso[c], num[c])
+        else:
+            stuck_strided(out, cols.out_stride, col, cols.stride, cols.length, reso[c], num[c])
 
+cdef void _spike_columns(_Columns cols, sample_t *data, int *L, double *N, double *acc) nogil:
+    cdef Py_ssize_t c
+    cdef signed char *out
+    cdef sample_t *col
+    for c in range(cols.ncols):
+        out = cols.out_data + c * cols.out_col_stride
+        col = data + c * cols.col_stride
+        if L[c] >= SPIKE_RUNNING_MIN_L:
+            # Long windows: O(n) kernel, flags identical to spike()
+            if sample_t is short:
+                spike_running_strided_int16(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            elif sample_t is int:
+                spike_running_strided_int32(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            elif sample_t is float:
+                spike_running_strided_float32(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            else:
+                spike_running_strided(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+        else:
+            if sample_t is short:
+                spike_strided_int16(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            elif sample_t is int:
+                spike_strided_int32(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            elif sample_t is float:
+                spike_strided_float32(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+            else:
+                spike_strided(out, cols.out_stride, col, cols.stride, cols.length, L[c], N[c], acc[c])
+
+cdef void _gradient_columns(_Columns cols, sample_t *data, _Columns xcols, Py_ssize_t x_col_stride,
+                            double *grad_min, double *grad_max, double *mindx, double *startdat,
+                            double *toldat, signed char skip) nogil:
+    cdef Py_ssize_t c
+    cdef signed char *out
+    cdef sample_t *col
+    cdef double *x
+    for c in range(cols.ncols):
+        out = cols.out_data + c * cols.out_col_stride
+        col = data + c * cols.col_stride
+        x = (<double *> xcols.data) + c * x_col_stride
+        if sample_t is short:
+            gradient_strided_int16(out, cols.out_stride, col, cols.stride, x, xcols.stride, cols.length,
+                                   grad_min[c], grad_max[c], mindx[c], startdat[c], toldat[c], skip)
+        elif sample_t is int:
+            gradient_strided_int32(out, cols.out_stride, col, cols.stride, x, xcols.stride, cols.length,
+                                   grad_min[c], grad_max[c], mindx[c], startdat[c], toldat[c], skip)
+        elif sample_t is float:
+            gradient_strided_float32(out, cols.out_stride, col, cols.stride, x, xcols.stride, cols.length,
+                                     grad_min[c], grad_max[c], mindx[c], startdat[c], toldat[c], skip)
+        else:
+            gradient_strided(out, cols.out_stride, col, cols.stride, x, xcols.stride, cols.length,
+                             grad_min[c], grad_max[c], mindx[c], startdat[c], toldat[c], skip)
+
+
+cdef void _range_columns(_Columns cols, sample_t *data, double *lo, double *hi) nogil:
+    cdef Py_ssize_t c
+    cdef signed char *out
+    cdef sample_t *col
+    for c in range(cols.ncols):
+        out = cols.out_data + c * cols.out_col_stride
+        col = data + c * cols.col_stride
+        if sample_t is short:
+            range_strided_int16(out, cols.out_stride, col, cols.stride, cols.length, lo[c], hi[c])
+        elif sample_t is int:
+            range_strided_int32(out, cols.out_stride, col, cols.stride, cols.length, lo[c], hi[c])
+        elif sample_t is float:
+            range_strided_float32(out, cols.out_stride, col, cols.stride, cols.length, lo[c], hi[c])
+        else:
+            range_strided(out, cols.out_stride, col, cols.stride, cols.length, lo[c], hi[c])
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def stuckvalues(dat, reso, num):
-    cdef int dat_shape = dat.shape[0]
-    cdef np.ndarray[double] x = dat
-    cdef np.ndarray[signed char] out = np.zeros([dat_shape], dtype=np.int8)
-    out.fill(1)
-    stuck(&out[0], &x[0], dat_shape, reso, num)
+def rangevalues(dat, lo, hi, axis=0, out=None):
+    '''
+    Global range flags of a vector, or of each column of a 2-D array along
+    axis: 1 where lo <= value <= hi, else 0, NaN included. lo and hi may be
+    scalars or hold one value per column. The columns are read once, in place
+    and in their own type if int16, int32, float32 or float64. The flags are
+    written to out when given, an int8 array of the shape of dat.
+    '''
+    cdef _Columns cols = _Columns(dat, axis, out=out)
+    cdef np.ndarray[double] _lo = cols.params(lo, 'lo', np.float64)
+    cdef np.ndarray[double] _hi = cols.params(hi, 'hi', np.float64)
+    if cols.length == 0:
+        return cols.out
+    with nogil:
+        if cols.typenum == np.NPY_SHORT:
+            _range_columns(cols, <short *> cols.data, &_lo[0], &_hi[0])
+        elif cols.typenum == np.NPY_INT:
+            _range_columns(cols, <int *> cols.data, &_lo[0], &_hi[0])
+        elif cols.typenum == np.NPY_FLOAT:
+            _range_columns(cols, <float *> cols.data, &_lo[0], &_hi[0])
+        else:
+            _range_columns(cols, <double *> cols.data, &_lo[0], &_hi[0])
 
-    return out
+    return cols.out
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def stuckvalues(dat, reso, num, axis=0):
+    '''
+    Stuck value flags of a vector, or of each column of a 2-D array along
+    axis. reso and num may be scalars or hold one value per column. The
+    columns are read in place through their strides, in their own type if
+    int16, int32, float32 or float64.
+    '''
+    cdef _Columns cols = _Columns(dat, axis)
+    cdef np.ndarray[double] _reso = cols.params(reso, 'reso', np.float64)
+    cdef np.ndarray[int] _num = cols.params(num, 'num', np.intc)
+    if cols.length == 0:
+        return cols.out
+    with nogil:
+        if cols.typenum == np.NPY_SHORT:
+            _stuck_columns(cols, <short *> cols.data, &_reso[0], &_num[0])
+        elif cols.typenum == np.NPY_INT:
+            _stuck_columns(cols, <int *> cols.data, &_reso[0], &_num[0])
+        elif cols.typenum == np.NPY_FLOAT:
+            _stuck_columns(cols, <float *> cols.data, &_reso[0], &_num[0])
+        else:
+            _stuck_columns(cols, <double *> cols.data, &_reso[0], &_num[0])
+
+    return cols.out
             
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def spikevalues(dat, L, N, acc):
-    cdef int dat_shape = dat.shape[0]
-    cdef np.ndarray[double] x = dat
-    cdef np.ndarray[signed char] out = np.zeros([dat_shape], dtype=np.int8)
-    out.fill(1)
-    spike(&out[0], &x[0], dat_shape, L, N, acc)
+def spikevalues(dat, L, N, acc, axis=0):
+    '''
+    Spike flags of a vector, or of each column of a 2-D array along axis. L, N
+    and acc may be scalars or hold one value per column. The columns are read
+    in place through their strides, in their own type if int16, int32,
+    float32 or float64.
+    '''
+    cdef _Columns cols = _Columns(dat, axis)
+    cdef np.ndarray[int] _L = cols.params(L, 'L', np.intc)
+    cdef np.ndarray[double] _N = cols.params(N, 'N', np.float64)
+    cdef np.ndarray[double] _acc = cols.params(acc, 'acc', np.float64)
+    if cols.length == 0:
+        return cols.out
+    with nogil:
+        if cols.typenum == np.NPY_SHORT:
+            _spike_columns(cols, <short *> cols.data, &_L[0], &_N[0], &_acc[0])
+        elif cols.typenum == np.NPY_INT:
+            _spike_columns(cols, <int *> cols.data, &_L[0], &_N[0], &_acc[0])
+        elif cols.typenum == np.NPY_FLOAT:
+            _spike_columns(cols, <float *> cols.data, &_L[0], &_N[0], &_acc[0])
+        else:
+            _spike_columns(cols, <double *> cols.data, &_L[0], &_N[0], &_acc[0])
 
-    return out
+    return cols.out
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
-def gradientvalues(dat, x, grad_min, grad_max, mindx, startdat, toldat, skipped_value=-99):
-    cdef int dat_shape = dat.shape[0]
-    cdef np.ndarray[double] idat = dat
-    cdef np.ndarray[double] ix = x
-    cdef np.ndarray[signed char] out = np.zeros([dat_shape], dtype=np.int8)
+def gradientvalues(dat, x, grad_min, grad_max, mindx, startdat, toldat, skipped_value=-99, axis=0):
+    '''
+    Gradient flags of a vector, or of each column of a 2-D array along axis.
+    x is either shared by all columns (1-D) or has the shape of dat. The
+    scalar parameters may hold one value per column instead. dat is read in
+    its own type if int16, int32, float32 or float64, x as float64.
+    '''
+    cdef _Columns cols = _Columns(dat, axis)
+    cdef _Columns xcols
+    cdef np.ndarray[double] _grad_min = cols.params(grad_min, 'grad_min', np.float64)
+    cdef np.ndarray[double] _grad_max = cols.params(grad_max, 'grad_max', np.float64)
+    cdef np.ndarray[double] _mindx = cols.params(mindx, 'mindx', np.float64)
+    cdef np.ndarray[double] _startdat = cols.params(startdat, 'startdat', np.float64)
+    cdef np.ndarray[double] _toldat = cols.params(toldat, 'toldat', np.float64)
     cdef signed char _skip = skipped_value
-    out.fill(1)
-    gradient(&out[0], &idat[0], &ix[0], dat_shape, grad_min, grad_max, mindx, startdat, toldat, _skip)
+    cdef Py_ssize_t x_col_stride
+    if np.ndim(x) == 1 and np.ndim(cols.arr) == 2:
+        xcols = _Columns(x, native=False)
+        x_col_stride = 0
+    else:
+        xcols = _Columns(x, axis, native=False)
+        if np.shape(xcols.arr) != np.shape(cols.arr):
+            raise ValueError("'x' must be 1-D or have the shape of 'dat'")
+        x_col_stride = xcols.col_stride
+    if xcols.length != cols.length:
+        raise ValueError("'dat' and 'x' must be of equal len")
+    if cols.length == 0:
+        return cols.out
+    with nogil:
+        if cols.typenum == np.NPY_SHORT:
+            _gradient_columns(cols, <short *> cols.data, xcols, x_col_stride, &_grad_min[0], &_grad_max[0],
+                              &_mindx[0], &_startdat[0], &_toldat[0], _skip)
+        elif cols.typenum == np.NPY_INT:
+            _gradient_columns(cols, <int *> cols.data, xcols, x_col_stride, &_grad_min[0], &_grad_max[0],
+                              &_mindx[0], &_startdat[0], &_toldat[0], _skip)
+        elif cols.typenum == np.NPY_FLOAT:
+            _gradient_columns(cols, <float *> cols.data, xcols, x_col_stride, &_grad_min[0], &_grad_max[0],
+                              &_mindx[0], &_startdat[0], &_toldat[0], _skip)
+        else:
+            _gradient_columns(cols, <double *> cols.data, xcols, x_col_stride, &_grad_min[0], &_grad_max[0],
+                              &_mindx[0], &_startdat[0], &_toldat[0], _skip)
+    return cols.out
+
+cdef class GradientState:
+    '''
+    Carries the gradient test across calls to resume, so a series can be
+    evaluated piece by piece with the same flags as gradientvalues.
+    '''
+    cdef gradient_state state
+    cdef bint started
+    cdef double grad_min, grad_max, mindx, startdat, toldat
+    cdef signed char skipped_value
+
+    def __init__(self, grad_min, grad_max, mindx, startdat, toldat, skipped_value=-99):
+        self.grad_min = grad_min
+        self.grad_max = grad_max
+        self.mindx = mindx
+        self.startdat = startdat
+        self.toldat = toldat
+        self.skipped_value = skipped_value
+        self.started = False
+
+    property skipped:
+        '''
+        Number of trailing points whose flags may still change
+        '''
+        def __get__(self):
+            return self.state.skipped
+
+    @cython.boundscheck(False)
+    @cython.wraparound(False)
+    def resume(self, np.ndarray[signed char] out, np.ndarray[double] dat, np.ndarray[double] x, size_t start):
+        '''
+        Evaluates dat[start:] and updates out in place. The arrays must begin
+        no later than skipped + 1 points before start.
+        '''
+        cdef size_t dat_shape = dat.shape[0]
+        if dat_shape == 0 or start >= dat_shape:
+            return
+        if not self.started:
+            gradient_start(&out[0], &dat[0], self.startdat, self.toldat, &self.state)
+            self.started = True
+            start = max(start, 1)
+        with nogil:
+            gradient_resume(&out[0], &dat[0], &x[0], start, dat_shape, self.grad_min, self.grad_max, self.mindx, self.toldat, self.skipped_value, &self.state)
+
+cdef _suite_config(qc_suite_config *cfg, ranges, spike, stuck, gradient):
+    cfg.range_bit = cfg.spike_bit = cfg.stuck_bit = cfg.gradient_bit = 0
+    if ranges is not None:
+        cfg.range_bit, cfg.range_min, cfg.range_max = ranges
+    if spike is not None:
+        cfg.spike_bit, cfg.spike_L, cfg.spike_N, cfg.spike_acc = spike
+    if stuck is not None:
+        cfg.stuck_bit, cfg.stuck_reso, cfg.stuck_num = stuck
+    if gradient is not None:
+        (cfg.gradient_bit, cfg.grad_min, cfg.grad_max, cfg.grad_mindx,
+         cfg.grad_startdat, cfg.grad_toldat) = gradient
+
+cdef np.ndarray _suite_axis(dat, x, gradient):
+    '''
+    x as a contiguous float64 vector of the length of dat, or dat itself when
+    the gradient test, the only one to read it, does not run
+    '''
+    if gradient is None:
+        return dat
+    if x is None:
+        raise ValueError("The gradient test needs 'x'")
+    x = np.ascontiguousarray(np.ravel(x), dtype=np.float64)
+    if x.shape[0] != dat.shape[0]:
+        raise ValueError("'dat' and 'x' must be of equal len")
+    return x
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def suitevalues(np.ndarray[unsigned short] out, dat, x=None, ranges=None, spike=None, stuck=None, gradient=None, size_t block=0):
+    '''
+    Runs the global range, spike, stuck value and gradient tests over dat in
+    one blocked pass, clearing the bit of a test in the words of out where it
+    fails. Each test is given as a tuple starting with its bit, and is left
+    out when None:
+
+        ranges = (bit, min, max)
+        spike = (bit, L, N, acc)
+        stuck = (bit, reso, num)
+        gradient = (bit, grad_min, grad_max, mindx, startdat, toldat)
+    '''
+    cdef np.ndarray[double] idat = np.ascontiguousarray(np.ravel(dat), dtype=np.float64)
+    cdef np.ndarray[double] ix = _suite_axis(idat, x, gradient)
+    cdef size_t dat_shape = idat.shape[0]
+    cdef qc_suite_config cfg
+    cdef int rc
+    if out.shape[0] != dat_shape:
+        raise ValueError("'out' and 'dat' must be of equal len")
+    if not out.flags.c_contiguous:
+        raise ValueError("'out' must be contiguous")
+    _suite_config(&cfg, ranges, spike, stuck, gradient)
+    if dat_shape == 0:
+        return out
+    with nogil:
+        rc = qc_suite(&out[0], &idat[0], &ix[0], dat_shape, &cfg, block)
+    if rc:
+        raise MemoryError('Could not allocate the QC suite scratch space')
     return out
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def runvalues(dat, x=None, ranges=None, spike=None, stuck=None, gradient=None, signed char skipped_value=-99, size_t block=0):
+    '''
+    Runs the tests like suitevalues, the bit of each tuple only has to be
+    nonzero, but returns the flags of every test other than 1 as runs of
+    equal flags. No flag array as long as dat is made.
+
+        range_runs, spike_runs, stuck_runs, gradient_runs = runvalues(...)
+
+    Each is a (start, stop, code) tuple of arrays, the runs covering
+    dat[start:stop], or None for a test that did not run.
+    '''
+    cdef np.ndarray[double] idat = np.ascontiguousarray(np.ravel(dat), dtype=np.float64)
+    cdef np.ndarray[double] ix = _suite_axis(idat, x, gradient)
+    cdef size_t dat_shape = idat.shape[0]
+    cdef qc_suite_config cfg
+    cdef qc_runs runs[4]
+    cdef np.ndarray[Py_ssize_t] start
+    cdef np.ndarray[Py_ssize_t] stop
+    cdef np.ndarray[signed char] code
+    cdef size_t t, k
+    cdef int rc = 0
+    _suite_config(&cfg, ranges, spike, stuck, gradient)
+    for t in range(QC_SUITE_TESTS):
+        runs[t].runs = NULL
+        runs[t].len = runs[t].cap = 0
+    try:
+        if dat_shape > 0:
+            with nogil:
+                rc = qc_suite_runs(runs, &idat[0], &ix[0], dat_shape, &cfg, block, skipped_value)
+        if rc:
+            raise MemoryError('Could not allocate the QC suite runs')
+        result = []
+        for t, test in enumerate((ranges, spike, stuck, gradient)):
+            if test is None:
+                result.append(None)
+                continue
+            start = np.empty(runs[t].len, dtype=np.intp)
+            stop = np.empty(runs[t].len, dtype=np.intp)
+            code = np.empty(runs[t].len, dtype=np.int8)
+            for k in range(runs[t].len):
+                start[k] = runs[t].runs[k].start
+                stop[k] = runs[t].runs[k].stop
+                code[k] = runs[t].runs[k].code
+            result.append((start, stop, code))
+        return result
+    finally:
+        for t in range(QC_SUITE_TESTS):
+            runs_free(&runs[t])
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def ntp_to_month(dat):
-    cdef int dat_shape = dat.shape[0]
-    cdef np.ndarray[double] idat = dat
+    '''
+    Month (0 to 11) of each NTP time, rounded to the nearest second
+    '''
+    cdef np.ndarray[double] idat = np.ascontiguousarray(dat, dtype=np.float64)
+    cdef int dat_shape = idat.shape[0]
     cdef np.ndarray[short int] out = np.zeros([dat_shape], dtype=np.int16)
+    if dat_shape == 0:
+        return out
     
-    ntp_month_vector(&out[0], &idat[0], dat_shape)
+    with nogil:
+        ntp_month_vector(&out[0], &idat[0], dat_shape)
     return out
 
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def ntp_to_civil(dat):
+    '''
+    UTC calendar fields of NTP times (seconds since 1900-01-01), computed in
+    one pass without gmtime.
+
+        year, month, day, yday, sod = ntp_to_civil(t)
+
+    month is 1 to 12, day 1 to 31, yday (day of year) 1 to 366, as in
+    time.gmtime, and sod is the seconds since midnight including the
+    fraction. Times that are not finite give 0 and NaN.
+    '''
+    cdef np.ndarray[double] idat = np.ascontiguousarray(np.ravel(dat), dtype=np.float64)
+    cdef size_t dat_shape = idat.shape[0]
+    cdef np.ndarray[int] year = np.zeros([dat_shape], dtype=np.intc)
+    cdef np.ndarray[short int] month = np.zeros([dat_shape], dtype=np.int16)
+    cdef np.ndarray[short int] day = np.zeros([dat_shape], dtype=np.int16)
+    cdef np.ndarray[short int] yday = np.zeros([dat_shape], dtype=np.int16)
+    cdef np.ndarray[double] sod = np.zeros([dat_shape], dtype=np.float64)
+    if dat_shape > 0:
+        with nogil:
+            ntp_civil_vector(&idat[0], dat_shape, &year[0], &month[0], &day[0], &yday[0], &sod[0])
+    return year, month, day, yday, sod
+
@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_flags
+@file ion_functions/qc/qc_flags.py
+@brief Bit-packed store of the QC flags of a data product
+"""
+
+import numpy as np
+
+# The DPS names of the QC tests, in bit order
+QC_TESTS = ('glblrng', 'loclrng', 'spketst', 'trndtst', 'stuckvl', 'gradtst',
+            'cmbnflg')
+
+
+class QCFlags(object):
+    '''
+    The results of up to 32 QC tests of one data product, one bit per test
+    and one word per sample: uint16 for up to 16 tests, else uint32. A set
+    bit is a pass. Tests not yet set count as passed, the same way
+    dataqc_propagateflags treats any nonzero int8 flag, including -99, as
+    good.
+
+    The int8 flag arrays of the seven tests take seven bytes per sample,
+    the store two.
+
+        flags = QCFlags(dat.size)
+        flags.set('spketst', dataqc_spiketest(dat, acc))
+        flags.set('stuckvl', dataqc_stuckvaluetest(dat, reso))
+        qcflag = flags.passed()
+        spike = flags.get('spketst')
+    '''
+    def __init__(self, size, tests=QC_TESTS, dtype=None):
+        tests = tuple(tests)
+        if len(set(tests)) != len(tests):
+            raise ValueError('Test names must be unique')
+        if dtype is None:
+            dtype = np.uint16 if len(tests) <= 16 else np.uint32
+        dtype = np.dtype(dtype)
+        if dtype.kind != 'u' or len(tests) > dtype.itemsize * 8:
+            raise ValueError('%d tests do not fit in %s' % (len(tests), dtype))
+        self.tests = tests
+        self.mask = dtype.type((1 << len(tests)) - 1)
+        self.bits = np.empty(size, dtype=dtype)
+        self.bits.fill(self.mask)
+
+    @classmethod
+    def from_int8(cls, flags, tests=QC_TESTS, dtype=None):
+        '''
+        Packs int8 flag arrays into a new store. flags is a dict of test name
+        to flag array, or an M by N array with a row per test, in the order
+        of tests.
+        '''
+        if isinstance(flags, dict):
+            items = flags.items()
+        else:
+            flags = np.atleast_2d(flags)
+            if flags.shape[0] > len(tests):
+                raise ValueError('More rows of flags than tests')
+            items = zip(tests, flags)
+        if not items:
+            raise ValueError('No flags to pack')
+        out = cls(np.size(items[0][1]), tests, dtype)
+        for test, flag in items:
+            out.set(test, flag)
+        return out
+
+    def __len__(self):
+        return self.bits.size
+
+    def bit(self, test):
+        '''
+        Returns the bit of a test
+        '''
+        try:
+            return self.bits.dtype.type(1 << self.tests.index(test))
+        except ValueError:
+            raise KeyError('Unknown test %r' % (test,))
+
+    def set(self, test, flags, index=slice(None)):
+        '''
+        Stores the int8 flags of a test, in place. index selects the samples
+        flags are for, all of them by default.
+        '''
+        bit = self.bit(test)
+        good = np.asanyarray(flags) != 0
+        words = self.bits[index]
+        words &= ~bit
+        words |= good.astype(self.bits.dtype) * bit
+        self.bits[index] = words
+
+    def merge(self, other):
+        '''
+        ANDs the flags of other into this store, in place. other is a store
+        of the same size. Tests are matched by name and tests this store does
+        not have are ignored.
+        '''
+        if len(other) != len(self):
+            raise ValueError('Flag stores are not the same size')
+        if other.tests == self.tests:
+            self.bits &= other.bits
+            return self
+        for test in other.tests:
+            if test in self.tests:
+                failed = (other.bits & other.bit(test)) == 0
+                self.bits[failed] &= ~self.bit(test)
+        return self
+
+    def get(self, test):
+        '''
+        Returns the int8 flags of a test
+        '''
+        return ((self.bits & self.bit(test)) != 0).astype(np.int8)
+
+    def to_int8(self):
+        '''
+        Returns the flags as an M by N int8 array, one row per test
+        '''
+        return np.array([self.get(test) for test in self.tests], dtype=np.int8)
+
+    def passed(self, tests=None):
+        '''
+        Returns int8 flags of 1 where every test, or every one of tests,
+        passed and 0 elsewhere
+        '''
+        if tests is None:
+            mask = self.mask
+        else:
+            mask = self.bits.dtype.type(0)
+            for test in tests:
+                mask |= self.bit(test)
+        return ((self.bits & mask) == mask).astype(np.int8)
+
+    def copy(self):
+        out = QCFlags.__new__(QCFlags)
+        out.tests = self.tests
+        out.mask = self.mask
+        out.bits = self.bits.copy()
+        return out
+
+
+def propagate(stores):
+    '''
+    Combines the flags of the parameters a product is derived from: a test
+    of the result is a pass where that test passed on every parameter. The
+    stores are reduced with a bitwise AND, so passed() of the result is
+    dataqc_propagateflags of all their flags.
+
+        flags = propagate([cond_flags, temp_flags, pres_flags])
+        salinity_flag = flags.passed()
+    '''
+    stores = list(stores)
+    if not stores:
+        raise ValueError('No flag stores to propagate')
+    out = stores[0].copy()
+    for store in stores[1:]:
+        out.merge(store)
+    return out
+
+
+class QCRuns(object):
+    '''
+    The flags of one QC test of a vector of size samples as runs: each run is
+    the samples start to stop, exclusive, sharing a flag code other than 1,
+    in increasing order. Every other sample passed. When failures are sparse
+    this takes a few bytes per run instead of one per sample.
+
+        runs = dataqc_globalrangetest(dat, datlim, runs=True)
+        for start, stop, code in runs:
+            ...
+        qcflag = runs.expand()
+    '''
+    def __init__(self, size, start=(), stop=(), code=()):
+        self.size = int(size)
+        self.start = np.asarray(start, dtype=np.intp)
+        self.stop = np.asarray(stop, dtype=np.intp)
+        self.code = np.asarray(code, dtype=np.int8)
+        if not self.start.shape == self.stop.shape == self.code.shape:
+            raise ValueError("'start', 'stop' and 'code' must be of equal len")
+
+    @classmethod
+    def from_flags(cls, flags):
+        '''
+        Runs of the int8 flag array of a test
+        '''
+        flags = np.asarray(flags, dtype=np.int8).ravel()
+        if not flags.size:
+            return cls(0)
+        edges = np.flatnonzero(flags[1:] != flags[:-1]) + 1
+        start = np.r_[0, edges]
+        stop = np.r_[edges, flags.size]
+        code = flags[start]
+        keep = code != 1
+        return cls(flags.size, start[keep], stop[keep], code[keep])
+
+    def __len__(self):
+        return self.start.size
+
+    def __iter__(self):
+        return iter(zip(self.start, self.stop, self.code))
+
+    def __eq__(self, other):
+        return (isinstance(other, QCRuns) and self.size == other.size and
+                np.array_equal(self.start, other.start) and
+                np.array_equal(self.stop, other.stop) and
+                np.array_equal(self.code, other.code))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'QCRuns(size=%d, runs=%d)' % (self.size, len(self))
+
+    def failed(self):
+        '''
+        Number of samples that did not pass
+        '''
+        return int(np.sum(self.stop - self.start))
+
+    def expand(self, out=None):
+        '''
+        The int8 flag array the runs stand for. Only the samples in runs are
+        written after the array is filled with ones, by a single fancy index
+        of their positions.
+        '''
+        if out is None:
+            out = np.ones(self.size, dtype=np.int8)
+        elif out.shape != (self.size,):
+            raise ValueError("'out' must be of the size of the runs")
+        else:
+            out.fill(1)
+        if len(self):
+            lengths = self.stop - self.start
+            # Position of every sample in a run: its run's start plus its
+            # offset into the run
+            offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+            out[np.repeat(self.start, lengths) + offsets] = np.repeat(self.code, lengths)
+        return out
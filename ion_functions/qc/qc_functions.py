@@ -6,12 +6,15 @@
 @author Christopher Mueller
 @brief Module containing QC functions ported from matlab samples in DPS documents
 """
-from ion_functions.qc.qc_extensions import stuckvalues, spikevalues, gradientvalues, ntp_to_month 
+from ion_functions.qc.qc_extensions import stuckvalues, spikevalues, gradientvalues, rangevalues, runvalues, ntp_to_month, ntp_to_civil
+from ion_functions.qc.qc_interpolation import interpolate_limits
+from ion_functions.qc.qc_ephemeris import solar_time, solar_ephemeris, solar_ephemeris_table
+from ion_functions.qc.qc_trend import windowed_polytrend
+from ion_functions.qc.qc_flags import QCFlags, QCRuns, propagate
+from ion_functions.qc.qc_dimensions import DimensionCache
 
-import time
 import numpy as np
 import numexpr as ne
-from scipy.interpolate import LinearNDInterpolator
 from ion_functions import utils
 from ion_functions.utils import fill_value
 
@@ -28,6 +31,19 @@ def is_fill(arr):
 def is_none(arr):
     return arr is None or (np.atleast_1d(arr)[-1] == None)
 
+def _qc_runs(dat, x=None, **test):
+    '''
+    Runs one test of the C QC suite over the vector dat, given like to
+    runvalues, e.g. _qc_runs(dat, spike=(1, L, N, acc)), and returns its
+    flags as QCRuns. The kernels hand their flags over a block at a time,
+    so no flag array as long as dat is made.
+    '''
+    dat = np.asanyarray(dat, dtype=np.float)
+    if dat.ndim != 1:
+        raise ValueError('Runs are only made for vectors')
+    result, = [r for r in runvalues(dat, x, **test) if r is not None]
+    return QCRuns(dat.size, *result)
+
 def dataqc_globalrangetest_minmax(dat, dat_min, dat_max, strict_validation=False):
     '''
     Python wrapper for dataqc_globalrangetest
@@ -40,7 +56,7 @@ def dataqc_globalrangetest_minmax(dat, dat_min, dat_max, strict_validation=False
     return dataqc_globalrangetest(dat, [np.atleast_1d(dat_min)[-1], np.atleast_1d(dat_max)[-1]], strict_validation=strict_validation)
 
 
-def dataqc_globalrangetest(dat, datlim, strict_validation=False):
+def dataqc_globalrangetest(dat, datlim, strict_validation=False, runs=False):
     """
     Description:
 
@@ -58,17 +74,20 @@ def dataqc_globalrangetest(dat, datlim, strict_validation=False):
 
     Usage:
 
-        qcflag = dataqc_globalrangetest(dat, datlim, strict_validation)
+        qcflag = dataqc_globalrangetest(dat, datlim, strict_validation, runs)
 
             where
 
-        qcflag = Boolean, 0 if value is outside range, else = 1.
+        qcflag = Boolean, 0 if value is outside range, else = 1. With runs,
+            a QCRuns of the values outside the range.
 
         dat = Input dataset, any scalar or vector. Must be numeric and real.
         datlim = Two-element vector with the minimum and maximum values
             considered to be valid.
         strict_validation = Flag (default is False) to assert testing of input
             types (e.g. isreal, isnumeric)
+        runs = Flag (default is False) to return the failures of a vector dat
+            as runs, for when they are sparse.
 
     References:
 
@@ -81,24 +100,100 @@ def dataqc_globalrangetest(dat, datlim, strict_validation=False):
     datlim = np.atleast_1d(datlim)
 
     if strict_validation:
-        if not utils.isnumeric(dat).all():
+        if not utils.allnumeric(dat):
             raise ValueError('\'dat\' must be numeric')
 
-        if not utils.isreal(dat).all():
+        if not utils.allreal(dat):
             raise ValueError('\'dat\' must be real')
 
-        if not utils.isnumeric(datlim).all():
+        if not utils.allnumeric(datlim):
             raise ValueError('\'datlim\' must be numeric')
 
-        if not utils.isreal(datlim).all():
+        if not utils.allreal(datlim):
             raise ValueError('\'datlim\' must be real')
 
         if len(datlim) < 2:  # Must have at least 2 elements
             raise ValueError('\'datlim\' must have at least 2 elements')
 
+    if runs:
+        return _qc_runs(dat, ranges=(1, datlim.min(), datlim.max()))
+    if dat.ndim <= 2 and dat.dtype.kind in 'biuf':
+        # One pass over dat, no temporaries
+        return rangevalues(dat, datlim.min(), datlim.max())
     return (datlim.min() <= dat) & (dat <= datlim.max()).astype('int8')
 
+
+def globalrange_limits(dat_min, dat_max):
+    '''
+    The limits table of dataqc_globalrangetest_batch from the minimum and
+    maximum of each parameter, parsed once for every block tested against
+    them. Parameters without either limit, None or fill, get NaN limits.
+    '''
+    def limit(v):
+        if is_none(v) or is_fill(v):
+            return np.nan
+        return np.atleast_1d(v)[-1]
+    if np.ndim(dat_min) == 0 and np.ndim(dat_max) == 0:
+        dat_min, dat_max = [dat_min], [dat_max]
+    if len(dat_min) != len(dat_max):
+        raise ValueError('\'dat_min\' and \'dat_max\' must be of equal len')
+    table = np.empty((len(dat_min), 2), dtype=np.float64)
+    table[:, 0] = [limit(v) for v in dat_min]
+    table[:, 1] = [limit(v) for v in dat_max]
+    # As in dataqc_globalrangetest_minmax, either limit missing is no test
+    table[np.isnan(table).any(axis=1)] = np.nan
+    return table
+
+
+def dataqc_globalrangetest_batch(dat, datlim, out=None, axis=0):
+    """
+    Description:
+
+        The global range test of a block of several parameters, each against
+        its own limits, in a single pass over the block. Returns 1 for
+        presumably good data and 0 for data presumed bad, NaN included, and
+        -99 for the parameters without limits.
+
+    Usage:
+
+        qcflag = dataqc_globalrangetest_batch(dat, datlim, out, axis)
+
+            where
+
+        qcflag = int8 array of the shape of dat, out if given.
+
+        dat = 2-D array of the samples of each parameter along axis, by
+            default samples x parameters. A vector is a single parameter.
+            int16, int32, float32 and float64 blocks are read in place.
+        datlim = Limits table, one (minimum, maximum) row per parameter, as
+            made by globalrange_limits, or a single row for all of them. A
+            row of NaN marks a parameter without limits.
+        out = int8 array of the shape of dat the flags are written to.
+        axis = Axis of dat along which the samples of a parameter lie.
+    """
+    datlim = np.asanyarray(datlim, dtype=np.float64)
+    if datlim.ndim == 1:
+        datlim = datlim[np.newaxis]
+    if datlim.ndim != 2 or datlim.shape[1] < 2:
+        raise ValueError('\'datlim\' must hold a (minimum, maximum) row per parameter')
+    missing = np.isnan(datlim).any(axis=1)
+    lo = np.where(missing, 0, datlim.min(axis=1))
+    hi = np.where(missing, 0, datlim.max(axis=1))
+    out = rangevalues(dat, lo, hi, axis=axis, out=out)
+    if missing.any():
+        if out.ndim == 1:
+            out.fill(-99)
+        else:
+            np.moveaxis(out, axis, 0)[:, np.broadcast_to(missing, (out.shape[1 - axis % 2],))] = -99
+    return out
+
 def dataqc_localrangetest_wrapper(dat, datlim, datlimz, dims, pval_callback):
+    '''
+    Python wrapper for dataqc_localrangetest
+    Fetches z from pval_callback, or from a DimensionCache handed in its
+    place, which fetches each dimension of the dataset once for all the
+    tests run on it.
+    '''
     if is_none(datlim) or np.all(np.atleast_1d(datlim).flatten() == -9999):
         out = np.empty(dat.shape, dtype=np.int8)
         out.fill(-99)
@@ -116,6 +211,12 @@ def dataqc_localrangetest_wrapper(dat, datlim, datlimz, dims, pval_callback):
         out.fill(-99)
         return out
 
+    if isinstance(pval_callback, DimensionCache):
+        z = pval_callback.stack(dims)
+        if len(dims) == 1:
+            datlimz = datlimz[:,0]
+        return dataqc_localrangetest(dat, z, datlim, datlimz)
+
     z = []
     for dim in dims:
         if dim == 'month':
@@ -185,10 +286,10 @@ def dataqc_localrangetest(dat, z, datlim, datlimz, strict_validation=False):
         # check if all inputs are numeric and real
         for k, arg in {'dat': dat, 'z': z, 'datlim': datlim,
                        'datlimz': datlimz}.iteritems():
-            if not utils.isnumeric(arg).all():
+            if not utils.allnumeric(arg):
                 raise ValueError('\'{0}\' must be numeric'.format(k))
 
-            if not utils.isreal(arg).all():
+            if not utils.allreal(arg):
                 raise ValueError('\'{0}\' must be real'.format(k))
 
     if len(datlim.shape) == 3 and datlim.shape[0] == 1:
@@ -236,7 +337,7 @@ def dataqc_localrangetest(dat, z, datlim, datlimz, strict_validation=False):
                          'rows in \'z\'')
 
     # test datlim, values in column 2 must be greater than those in column 1
-    if not all(datlim[:, 1] > datlim[:, 0]):
+    if not (datlim[:, 1] > datlim[:, 0]).all():
         raise ValueError('Second column values of \'datlim\' should be '
                          'greater than first column values.')
 
@@ -247,15 +348,9 @@ def dataqc_localrangetest(dat, z, datlim, datlimz, strict_validation=False):
         # determine the upper limits using linear interpolation
         lim2 = np.interp(z, datlimz, datlim[:, 1], left=np.nan, right=np.nan)
     else:
-        # Compute Delaunay Triangulation and use linear interpolation to
-        # determine the N-dimensional lower limits
-        F = LinearNDInterpolator(datlimz, datlim[:, 0].reshape(numlim, 1))
-        lim1 = F(z).reshape(dat.size)
-
-        # Compute Delaunay Triangulation and use linear interpolation to
-        # determine the N-dimensional upper limits
-        F = LinearNDInterpolator(datlimz, datlim[:, 1].reshape(numlim, 1))
-        lim2 = F(z).reshape(dat.size)
+        # Use linear interpolation over the (cached) Delaunay Triangulation
+        # of datlimz to determine the N-dimensional lower and upper limits
+        lim1, lim2 = interpolate_limits(z, datlim, datlimz)
 
     # replace NaNs from above interpolations
     ff = (np.isnan(lim1)) | (np.isnan(lim2))
@@ -274,7 +369,7 @@ def dataqc_spiketest_wrapper(dat, acc, N, L, strict_validation=False):
         return out
     return dataqc_spiketest(dat, np.atleast_1d(acc)[-1], np.atleast_1d(N)[-1], np.atleast_1d(L)[-1], strict_validation=strict_validation)
 
-def dataqc_spiketest(dat, acc, N=5, L=5, strict_validation=False):
+def dataqc_spiketest(dat, acc, N=5, L=5, strict_validation=False, axis=0, runs=False):
     """
     Description:
 
@@ -313,10 +408,15 @@ def dataqc_spiketest(dat, acc, N=5, L=5, strict_validation=False):
 
         qcflag = Boolean, 0 if value is outside range, else = 1.
 
-        dat = input data set, a numeric, real vector.
+        dat = input data set, a numeric, real vector. A 2-D array is tested
+            column by column along axis.
         acc = Accuracy of any input measurement.
         N = (optional, defaults to 5) Range multiplier, cf. above
         L = (optional, defaults to 5) Window len, cf. above
+        axis = (optional, defaults to 0) axis of a 2-D dat along which the
+            series run. acc, N and L may then hold one value per series.
+        runs = (optional, defaults to False) return the spikes of a vector
+            dat as a QCRuns instead of qcflag.
 
     References:
 
@@ -328,24 +428,28 @@ def dataqc_spiketest(dat, acc, N=5, L=5, strict_validation=False):
     dat = np.atleast_1d(dat)
 
     if strict_validation:
-        if not utils.isnumeric(dat).all():
+        if not utils.allnumeric(dat):
             raise ValueError('\'dat\' must be numeric')
 
-        if not utils.isreal(dat).all():
+        if not utils.allreal(dat):
             raise ValueError('\'dat\' must be real')
 
-        if not utils.isvector(dat):
+        if dat.ndim != 2 and not utils.isvector(dat):
             raise ValueError('\'dat\' must be a vector')
 
         for k, arg in {'acc': acc, 'N': N, 'L': L}.iteritems():
-            if not utils.isnumeric(arg).all():
+            if not utils.allnumeric(arg):
                 raise ValueError('\'{0}\' must be numeric'.format(k))
 
-            if not utils.isreal(arg).all():
+            if not utils.allreal(arg):
                 raise ValueError('\'{0}\' must be real'.format(k))
-    dat = np.asanyarray(dat, dtype=np.float)
-    
-    out = spikevalues(dat, L, N, acc)
+    # Kept in its own type, the kernels read int16, int32, float32 and
+    # float64 in place
+    dat = np.asanyarray(dat)
+
+    if runs:
+        return _qc_runs(dat, spike=(1, L, N, acc))
+    out = spikevalues(dat, L, N, acc, axis=axis)
     return out
 
 
@@ -356,7 +460,8 @@ def dataqc_polytrendtest_wrapper(dat, t, ord_n, nstd, strict_validation=False):
         return out
     return dataqc_polytrendtest(dat, t, np.atleast_1d(ord_n)[-1], np.atleast_1d(nstd)[-1], strict_validation=strict_validation)
 
-def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
+def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False,
+                         window=None, step=None):
     """
     Description:
 
@@ -375,6 +480,12 @@ def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
         of dat by a factor of NSTD, the time series is assumed to contain a
         significant trend (output will be 0), else not (output will be 1).
 
+        With window set, the test is made over windows of that many samples,
+        step samples apart, and a sample is flagged 0 if any window it is in
+        has a trend. The fits of all windows come from running sums of t**k
+        and t**k * dat, so the series costs O(n * ord_n) rather than a least
+        squares fit per window.
+
     Implemented by:
 
         2012-10-29: DPS authored by Mathias Lankhorst. Example code provided
@@ -384,7 +495,8 @@ def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
 
     Usage:
 
-        qcflag = dataqc_polytrendtest(dat, t, ord_n, nstd, strict_validation)
+        qcflag = dataqc_polytrendtest(dat, t, ord_n, nstd, strict_validation,
+                                      window, step)
 
             where
 
@@ -396,6 +508,11 @@ def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
             deviation must be reduced before qcflag switches from 1 to 0
         strict_validation (optional, defaults to False) = Flag asserting
             testing of inputs.
+        window (optional, defaults to None) = Number of samples in each
+            window, None to test the whole record at once.
+        step (optional, defaults to window) = Number of samples between the
+            starts of consecutive windows. A last window ending on the last
+            sample is added when the steps do not reach it.
 
     References:
 
@@ -409,10 +526,10 @@ def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
 
     if strict_validation:
         for k, arg in {'dat': dat, 't': t, 'ord_n': ord_n, 'nstd': nstd}.iteritems():
-            if not utils.isnumeric(arg).all():
+            if not utils.allnumeric(arg):
                 raise ValueError('\'{0}\' must be numeric'.format(k))
 
-            if not utils.isreal(arg).all():
+            if not utils.allreal(arg):
                 raise ValueError('\'{0}\' must be real'.format(k))
 
         for k, arg in {'dat': dat, 't': t}.iteritems():
@@ -426,6 +543,9 @@ def dataqc_polytrendtest(dat, t, ord_n=1, nstd=3, strict_validation=False):
     ord_n = int(round(abs(ord_n)))
     nstd = int(abs(nstd))
 
+    if window is not None:
+        return windowed_polytrend(dat.ravel(), t.ravel(), ord_n, nstd, window, step).reshape(dat.shape)
+
     ll = len(dat)
     # Not needed because time is incorporated as 't'
     # t = range(ll)
@@ -451,7 +571,7 @@ def dataqc_stuckvaluetest_wrapper(x, reso, num, strict_validation=False):
         return out
     return  dataqc_stuckvaluetest(x, np.atleast_1d(reso)[-1], np.atleast_1d(num)[-1], strict_validation=strict_validation)
 
-def dataqc_stuckvaluetest(x, reso, num=10, strict_validation=False):
+def dataqc_stuckvaluetest(x, reso, num=10, strict_validation=False, axis=0, runs=False):
     """
     Description:
 
@@ -472,12 +592,17 @@ def dataqc_stuckvaluetest(x, reso, num=10, strict_validation=False):
             where
 
         qcflag = Boolean output: 0 where stuck values are found, 1 elsewhere.
-        x = Input time series (vector, numeric).
+        x = Input time series (vector, numeric). A 2-D array is tested
+            column by column along axis.
         reso = Resolution; repeat values less than reso apart will be
             considered "stuck values".
         num = Minimum number of successive values within reso of each other
             that will trigger the "stuck value". num is optional and defaults
             to 10 if omitted or empty.
+        axis = (optional, defaults to 0) axis of a 2-D x along which the
+            series run. reso and num may then hold one value per series.
+        runs = (optional, defaults to False) return the stuck values of a
+            vector x as a QCRuns instead of qcflag.
 
     References:
 
@@ -489,27 +614,35 @@ def dataqc_stuckvaluetest(x, reso, num=10, strict_validation=False):
     dat = np.atleast_1d(x)
 
     if strict_validation:
-        if not utils.isnumeric(dat).all():
+        if not utils.allnumeric(dat):
             raise ValueError('\'x\' must be numeric')
 
-        if not utils.isvector(dat):
+        if dat.ndim != 2 and not utils.isvector(dat):
             raise ValueError('\'x\' must be a vector')
 
-        if not utils.isreal(dat).all():
+        if not utils.allreal(dat):
             raise ValueError('\'x\' must be real')
 
         for k, arg in {'reso': reso, 'num': num}.iteritems():
-            if not utils.isnumeric(arg).all():
+            if not utils.allnumeric(arg):
                 raise ValueError('\'{0}\' must be numeric'.format(k))
 
-            if not utils.isscalar(arg):
+            if dat.ndim != 2 and not utils.isscalar(arg):
                 raise ValueError('\'{0}\' must be a scalar'.format(k))
 
-            if not utils.isreal(arg).all():
+            if not utils.allreal(arg):
                 raise ValueError('\'{0}\' must be real'.format(k))
 
     num = np.abs(num)
-    dat = np.asanyarray(dat, dtype=np.float)
+    dat = np.asanyarray(dat)
+    if runs:
+        return _qc_runs(dat, stuck=(1, reso, num))
+    if dat.ndim == 2:
+        out = stuckvalues(dat, reso, num, axis=axis)
+        # Warn - 'num' is greater than the series length, returning zeros
+        short = np.broadcast_to(num > dat.shape[axis], (dat.shape[1 - axis % 2],))
+        np.moveaxis(out, axis, 0)[:, short] = 0
+        return out
     ll = len(x)
     if ll < num:
         # Warn - 'num' is greater than len(x), returning zeros
@@ -528,7 +661,7 @@ def dataqc_gradienttest_wrapper(dat, x, ddatdx, mindx, startdat, toldat, strict_
     return outqc
 
 
-def dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat, strict_validation=False):
+def dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat, strict_validation=False, runs=False):
     """
     Description
 
@@ -581,6 +714,8 @@ def dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat, strict_validati
         toldat = tolerance value (scalar) for dat; threshold to within which
             dat must return to be counted as good, after exceeding a ddatdx
             threshold detected bad data.
+        runs = (optional, defaults to False) return outqc as a QCRuns of the
+            bad (0) and removed (-99) points.
 
     References:
 
@@ -598,11 +733,11 @@ def dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat, strict_validati
         if len(dat) != len(x):
             raise ValueError('\'dat\' and \'x\' must be of equal len')
 
-        if not all(np.diff(x) > 0):
+        if not (np.diff(x) > 0).all():
             raise ValueError('\'x\' must be montonically increasing')
 
-    dat = np.asanyarray(dat, dtype=np.float).flatten()
-    x = np.asanyarray(x, dtype=np.float).flatten()
+    dat = np.asanyarray(dat).reshape(-1)
+    x = np.asanyarray(x, dtype=np.float).reshape(-1)
 
     if np.isnan(mindx):
         mindx = 0
@@ -621,20 +756,24 @@ def dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat, strict_validati
 
     # Confirm that there are still data points left, else abort:
     if np.abs(x[0] - x[-1]) < mindx:
+        log.warn('Too few values to inspect')
+        if runs:
+            return QCRuns(x.size)
         out = np.zeros(x.shape)
         out.fill(1)
-        log.warn('Too few values to inspect')
         return out
 
 
     grad_min = ddatdx[0]
     grad_max = ddatdx[1]
+    if runs:
+        return _qc_runs(dat, x, gradient=(1, grad_min, grad_max, mindx, startdat, toldat))
     out = gradientvalues(dat, x, grad_min, grad_max, mindx, startdat, toldat)
 
     return out
 
 
-def dataqc_solarelevation(lon, lat, dt):
+def dataqc_solarelevation(lon, lat, dt, tabulated=False):
     """
     Description
 
@@ -664,7 +803,7 @@ def dataqc_solarelevation(lon, lat, dt):
 
     Usage:
 
-        z, sorad = dataqc_solarelevation(lon, lat, dt)
+        z, sorad = dataqc_solarelevation(lon, lat, dt, tabulated)
 
             where
 
@@ -674,6 +813,11 @@ def dataqc_solarelevation(lon, lat, dt):
         lon = longitude (east is positive) [decimal degress]
         lat = latitude [decimal degrees]
         dt = date and time stamp in UTC [seconds since 1970-01-01]
+        tabulated = (optional, defaults to False) interpolate the declination,
+            equation of time and sun distance from a table computed every 10
+            minutes (see qc_ephemeris.SolarEphemerisTable) instead of
+            evaluating the series for every time. Solar altitude is then
+            within 1e-6 degrees of the exact value.
 
     Examples
 
@@ -707,88 +851,23 @@ def dataqc_solarelevation(lon, lat, dt):
     #   (1995), Earth System Monitor, 6, 6-10.
     solar_const = 1368.0
 
-    # Create a time tuple in UTC from the Epoch time input, and then create
-    # scalars or numpy arrays of time elements for subsequent calculations.
-    ldt = len(dt)
-    yy = np.zeros(ldt, dtype=np.int)
-    mn = np.zeros(ldt, dtype=np.int)
-    dd = np.zeros(ldt, dtype=np.int)
-    hh = np.zeros(ldt, dtype=np.int)
-    mm = np.zeros(ldt, dtype=np.int)
-    ss = np.zeros(ldt, dtype=np.int)
-    for i in range(ldt):
-        # create time tuple in UTC
-        gtime = time.gmtime(dt[i])
-        # create scalar elements
-        yy[i] = gtime[0]
-        mn[i] = gtime[1]
-        dd[i] = gtime[2]
-        hh[i] = gtime[3]
-        mm[i] = gtime[4]
-        ss[i] = gtime[5]
-
     #constants used in function
     deg2rad = np.pi / 180.0
     rad2deg = 1 / deg2rad
 
-    # compute Universal Time in hours
-    utime = hh + (mm + ss / 60.0) / 60.0
-
-    # compute Julian ephemeris date in days (Day 1 is 1 Jan 4713 B.C. which
-    # equals -4712 Jan 1)
-    jed = (367.0 * yy - np.fix(7.0*(yy+np.fix((mn+9)/12.0))/4.0)
-           + np.fix(275.0*mn/9.0) + dd + 1721013 + utime / 24.0)
-
-    # compute interval in Julian centuries since 1900
-    jc_int = (jed - 2415020.0) / 36525.0
-
-    # compute mean anomaly of the sun
-    ma_sun = 358.475833 + 35999.049750 * jc_int - 0.000150 * jc_int**2
-    ma_sun = (ma_sun - np.fix(ma_sun/360.0) * 360.0) * deg2rad
-
-    # compute mean longitude of sun
-    ml_sun = 279.696678 + 36000.768920 * jc_int + 0.000303 * jc_int**2
-    ml_sun = (ml_sun - np.fix(ml_sun/360.0) * 360.0) * deg2rad
-
-    # compute mean anomaly of Jupiter
-    ma_jup = 225.444651 + 2880.0 * jc_int + 154.906654 * jc_int
-    ma_jup = (ma_jup - np.fix(ma_jup/360.0) * 360.0) * deg2rad
-
-    # compute longitude of the ascending node of the moon's orbit
-    an_moon = (259.183275 - 1800 * jc_int - 134.142008 * jc_int
-               + 0.002078 * jc_int**2)
-    an_moon = (an_moon - np.fix(an_moon/360.0) * 360.0 + 360.0) * deg2rad
-
-    # compute mean anomaly of Venus
-    ma_ven = (212.603219 + 58320 * jc_int + 197.803875 * jc_int
-              + 0.001286 * jc_int**2)
-    ma_ven = (ma_ven - np.fix(ma_ven/360.0) * 360.0) * deg2rad
-
-    # compute sun theta
-    theta = (0.397930 * np.sin(ml_sun) + 0.009999 * np.sin(ma_sun-ml_sun)
-             + 0.003334 * np.sin(ma_sun+ml_sun) - 0.000208 * jc_int
-             * np.sin(ml_sun) + 0.000042 * np.sin(2*ma_sun+ml_sun) - 0.000040
-             * np.cos(ml_sun) - 0.000039 * np.sin(an_moon-ml_sun) - 0.000030
-             * jc_int * np.sin(ma_sun-ml_sun) - 0.000014
-             * np.sin(2*ma_sun-ml_sun) - 0.000010
-             * np.cos(ma_sun-ml_sun-ma_jup) - 0.000010 * jc_int
-             * np.sin(ma_sun+ml_sun))
-
-    # compute sun rho
-    rho = (1.000421 - 0.033503 * np.cos(ma_sun) - 0.000140 * np.cos(2*ma_sun)
-           + 0.000084 * jc_int * np.cos(ma_sun) - 0.000033
-           * np.sin(ma_sun-ma_jup) + 0.000027 * np.sin(2.*ma_sun-2.*ma_ven))
-
-    # compute declination
-    decln = np.arcsin(theta/np.sqrt(rho))
-
-    # compute equation of time (in seconds of time)
-    l = 276.697 + 0.98564734 * (jed-2415020.0)
-    l = (l - 360.0 * np.fix(l/360.0)) * deg2rad
-    eqt = (-97.8 * np.sin(l) - 431.3 * np.cos(l) + 596.6 * np.sin(2*l)
-           - 1.9 * np.cos(2*l) + 4.0 * np.sin(3*l) + 19.3 * np.cos(3*l)
-           - 12.7 * np.sin(4*l))
-    eqt = eqt / 60.0
+    # Universal Time in hours and Julian ephemeris date in days. Like
+    # time.gmtime, whole seconds are used, truncated towards zero.
+    dt = np.atleast_1d(np.asanyarray(dt, dtype=np.float))
+    if not np.isfinite(dt).all():
+        raise ValueError('\'dt\' must be finite')
+    dt = np.fix(dt)
+    utime, jed = solar_time(dt)
+
+    # compute declination, equation of time (in minutes of time) and rho
+    if tabulated:
+        decln, eqt, rho = solar_ephemeris_table(dt)
+    else:
+        decln, eqt, rho = solar_ephemeris(jed)
 
     # compute local hour angle from global hour angle
     gha = 15.0 * (utime-12) + 15.0 * eqt / 60.0
@@ -813,7 +892,10 @@ def dataqc_propagateflags_wrapper(strict_validation=False, *args):
     '''
     This is a function that wraps dataqc_propagateflags for use in ION
     It accepts a variable number of vector arguments (of the same shape) and calls dataqc_propagateflags
+    QCFlags stores are accepted in place of the vectors, and are reduced with a bitwise AND
     '''
+    if args and all(isinstance(i, QCFlags) for i in args):
+        return dataqc_propagateflags(args, strict_validation=strict_validation)
 
     if not strict_validation:
 
@@ -858,7 +940,9 @@ def dataqc_propagateflags(inflags, strict_validation=False):
 
         inflags = an M-by-N boolean matrix, where each of the M rows contains
             flags of an independent data set such that "0" means bad data and
-            "1" means good data.
+            "1" means good data. A QCFlags store, or a sequence of stores of
+            the data sets, is accepted as well, and all of its tests are
+            combined.
 
     References:
 
@@ -869,6 +953,11 @@ def dataqc_propagateflags(inflags, strict_validation=False):
             1341-10012_Data_Product_SPEC_CMBNFLG_OOI.pdf)
     """
 
+    if isinstance(inflags, QCFlags):
+        return inflags.passed()
+    if len(inflags) and all(isinstance(i, QCFlags) for i in inflags):
+        return propagate(inflags).passed()
+
     if strict_validation:
         if not utils.islogical(inflags):
             raise ValueError('\'inflags\' must be \'0\' or \'1\' '
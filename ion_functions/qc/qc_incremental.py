@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_incremental
+@file ion_functions/qc/qc_incremental.py
+@brief Recomputes QC flags over the modified parts of a record
+"""
+
+from ion_functions.qc.qc_extensions import GradientState
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_suite import SUITE_TESTS
+
+import numpy as np
+
+# Flags scanned at a time while looking for the gradient test to fall back
+# in step with the previous flags
+GRADIENT_CHUNK = 4096
+
+
+def dirty_ranges(dirty, size):
+    '''
+    The (start, stop) ranges of dirty sorted, checked against size and with
+    overlapping or adjacent ones merged. Empty ranges are dropped.
+    '''
+    ranges = []
+    for start, stop in sorted((int(a), int(b)) for a, b in dirty):
+        if not 0 <= start <= stop <= size:
+            raise ValueError('Range (%d, %d) is not within the %d samples' % (start, stop, size))
+        if start == stop:
+            continue
+        if ranges and start <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], stop)
+        else:
+            ranges.append([start, stop])
+    return [tuple(r) for r in ranges]
+
+
+def _widen(ranges, halo, size):
+    return dirty_ranges([(max(a - halo, 0), min(b + halo, size)) for a, b in ranges], size)
+
+
+def _recompute_window(func, dat, out, ranges, halo):
+    '''
+    Recomputes the flags of a test whose flag at i only depends on the
+    values within halo samples of it, or on the values at the ends of the
+    vector within halo of them. Each range is widened by halo to the flags
+    that can change, and these are evaluated with another halo of context,
+    cut at the ends of the vector, whose own flags are thrown away.
+    '''
+    size = dat.size
+    evaluated = 0
+    for a, b in _widen(ranges, halo, size):
+        lo = max(a - halo, 0)
+        hi = min(b + halo, size)
+        out[a:b] = func(dat[lo:hi])[a - lo:b - lo]
+        evaluated += hi - lo
+    return evaluated
+
+
+def _gradient_syncs(flags):
+    '''
+    Indices into flags, after the first, of the points the gradient scan
+    evaluated as a good gradient: flag 1 with the evaluated (not -99) point
+    before it 1 as well. The scan then holds that value as the last good
+    one, with no skipped points pending and not bad, whatever came before,
+    so two scans that agree there agree on everything after it that reads
+    the same data.
+    '''
+    ev = np.flatnonzero(flags != -99)
+    good = flags[ev] == 1
+    return ev[1:][good[1:] & good[:-1]]
+
+
+def _last_gradient_sync(out, stop):
+    '''
+    The last sync point of out before stop, or -1
+    '''
+    width = GRADIENT_CHUNK
+    while True:
+        lo = max(stop - width, 0)
+        syncs = _gradient_syncs(out[lo:stop])
+        if syncs.size:
+            return lo + syncs[-1]
+        if not lo:
+            return -1
+        width *= 2
+
+
+def _recompute_gradient(dat, x, out, ranges, grad_min, grad_max, mindx, startdat, toldat):
+    '''
+    The gradient scan carries its state from the start of the record, so a
+    change can alter any flag after it, but the scan usually falls back in
+    step within a few points. Each range is rescanned from the last sync
+    point before it, or from the start, a chunk at a time until the new flags
+    and the previous ones share a sync point past every modified sample the
+    scan went through. Every sample is scanned at most once.
+    '''
+    size = dat.size
+    evaluated = 0
+    done = 0
+    for i, (a, b) in enumerate(ranges):
+        if b <= done:
+            # Already rescanned with the new data
+            continue
+        base = _last_gradient_sync(out, a)
+        # Resuming from a sync point, the scan holds dat[base] as the last
+        # good value, the one a start value of 0 selects
+        state = GradientState(grad_min, grad_max, mindx, 0 if base >= 0 else startdat, toldat)
+        base = max(base, 0)
+        pos = base
+        buf = np.empty(0, dtype=np.int8)
+        chunk = GRADIENT_CHUNK
+        stop = b
+        while True:
+            hi = min(size, max(stop, pos) + chunk)
+            buf = np.concatenate([buf, np.ones(hi - pos, dtype=np.int8)])
+            state.resume(buf, dat[base:hi], x[base:hi], pos - base)
+            evaluated += hi - pos
+            pos = hi
+            if hi == size:
+                out[base:] = buf
+                done = size
+                break
+            # Modified samples the scan read must lie before the sync point
+            for c, d in ranges[i + 1:]:
+                if c >= hi:
+                    break
+                stop = max(stop, d)
+            new = _gradient_syncs(buf)
+            common = np.intersect1d(new, _gradient_syncs(out[base:hi]), assume_unique=True)
+            common = common[base + common >= stop]
+            if common.size:
+                j = base + common[0]
+                out[base:j] = buf[:j - base]
+                done = j
+                break
+            if new.size:
+                # Flags before the last sync point of the new scan are final
+                # and the scan no longer looks back past it
+                j = base + new[-1]
+                out[base:j] = buf[:j - base]
+                buf = buf[j - base:]
+                base = j
+            chunk *= 2
+    return evaluated
+
+
+def recompute_qc(dat, x, config, flags, dirty):
+    '''
+    Brings the QC flags of a record up to date after the samples in some
+    ranges were modified, e.g. reprocessed with a new calibration, by
+    re-evaluating only the flags that can change. The flags equal those of
+    running each test over the whole modified record.
+
+    The global range test only re-evaluates the modified samples. The spike
+    and stuck value tests re-evaluate the ranges widened by the L-1 and num-1
+    samples a flag depends on, with as much context on either side. The
+    gradient test rescans from the last point before a range where its state
+    is known from the flags, until the new scan falls back in step with the
+    previous flags after it.
+
+    Usage:
+
+        report = recompute_qc(dat, x, config, flags, dirty)
+
+            where
+
+        report = dict of the name of each test of config to the number of
+            samples it re-evaluated.
+
+        dat = the modified data vector.
+        x = axis of dat, only used by the gradient test, None without it.
+        config = dict of test name to the keyword arguments of the test
+            function without the data, as for run_qc_suite.
+        flags = dict of the name of each test of config to its int8 flags of
+            the record before the modification, as returned by
+            dataqc_globalrangetest, dataqc_spiketest, dataqc_stuckvaluetest
+            and dataqc_gradienttest. Updated in place.
+        dirty = sequence of (start, stop) ranges of the modified samples,
+            dat[start:stop]. Modified x values count as modified samples.
+    '''
+    unknown = set(config) - set(SUITE_TESTS)
+    if unknown:
+        raise ValueError('Unknown tests %s, expected some of %s' % (sorted(unknown), list(SUITE_TESTS)))
+    dat = np.asanyarray(dat, dtype=np.float).ravel()
+    for test in config:
+        if test not in flags:
+            raise ValueError("No previous flags of '%s'" % test)
+        if flags[test].shape != dat.shape:
+            raise ValueError("The flags of '%s' and 'dat' must be of equal len" % test)
+    ranges = dirty_ranges(dirty, dat.size)
+
+    report = {}
+    if 'glblrng' in config:
+        datlim = config['glblrng']['datlim']
+        func = lambda d: qcfunc.dataqc_globalrangetest(d, datlim)
+        report['glblrng'] = _recompute_window(func, dat, flags['glblrng'], ranges, 0)
+    if 'spketst' in config:
+        params = config['spketst']
+        L = int(params.get('L', 5))
+        func = lambda d: qcfunc.dataqc_spiketest(d, **params)
+        report['spketst'] = _recompute_window(func, dat, flags['spketst'], ranges, max(L - 1, 0))
+    if 'stuckvl' in config:
+        params = config['stuckvl']
+        num = int(np.abs(params.get('num', 10)))
+        func = lambda d: qcfunc.dataqc_stuckvaluetest(d, **params)
+        report['stuckvl'] = _recompute_window(func, dat, flags['stuckvl'], ranges, max(num - 1, 0))
+    if 'gradtst' in config:
+        params = config['gradtst']
+        if x is None:
+            raise ValueError("The gradient test needs 'x'")
+        x = np.asanyarray(x, dtype=np.float).ravel()
+        out = flags['gradtst']
+        mindx = params['mindx']
+        if np.isnan(mindx):
+            mindx = 0
+        mindx = mindx or 0
+        startdat = params['startdat']
+        if np.isnan(startdat):
+            startdat = 0
+        startdat = startdat or 0
+        if not x.size:
+            report['gradtst'] = 0
+        elif np.abs(x[0] - x[-1]) < mindx:
+            # As in dataqc_gradienttest, too few values to inspect is a pass
+            out[:] = 1
+            report['gradtst'] = 0
+        else:
+            if ranges and (ranges[0][0] == 0 or ranges[-1][1] == dat.size) and (out == 1).all():
+                # The ends of x may have moved apart from too few values to
+                # inspect, which leaves no state to resume from
+                ranges = [(0, dat.size)]
+            ddatdx = params['ddatdx']
+            report['gradtst'] = _recompute_gradient(dat, x, out, ranges, ddatdx[0], ddatdx[1],
+                                                    mindx, startdat, params['toldat'])
+    return report
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_interpolation
+@file ion_functions/qc/qc_interpolation.py
+@brief Cached interpolation of the local range test limits
+"""
+
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import Delaunay
+from scipy.interpolate import LinearNDInterpolator
+
+
+class TriangulationCache(object):
+    '''
+    Bounded least recently used cache of Delaunay triangulations, keyed by the
+    content of the points they were built from.
+
+    The climatology tables of the local range test are fixed per deployment,
+    so the same datlimz points are triangulated for every granule. The key is
+    a hash of the point coordinates, not the identity of the array, so equal
+    tables loaded separately share one triangulation.
+
+        cache = TriangulationCache(maxsize=16)
+        tri = cache.triangulate(datlimz)
+        cache.hits, cache.misses
+    '''
+    def __init__(self, maxsize=16):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(points):
+        '''
+        Content hash of a float64 point array, including its shape
+        '''
+        points = np.ascontiguousarray(points, dtype=np.float64)
+        digest = hashlib.sha1(points.view(np.uint8)).hexdigest()
+        return points.shape, digest
+
+    def triangulate(self, points):
+        '''
+        Returns the Delaunay triangulation of points, building it on a miss
+        '''
+        key = self.key(points)
+        with self._lock:
+            tri = self._entries.pop(key, None)
+            if tri is not None:
+                self.hits += 1
+                self._entries[key] = tri
+                return tri
+            self.misses += 1
+
+        # The points are copied so later changes to the caller's array can not
+        # reach the cached triangulation
+        tri = Delaunay(np.array(points, dtype=np.float64))
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = tri
+            while len(self._entries) > max(self.maxsize, 0):
+                self._entries.popitem(last=False)
+        return tri
+
+    def info(self):
+        '''
+        Returns the hits, misses, current size and bound of the cache
+        '''
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'size': len(self._entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        '''
+        Drops every triangulation and resets the counters
+        '''
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by all calls to dataqc_localrangetest
+triangulation_cache = TriangulationCache()
+
+
+class RectilinearGrid(object):
+    '''
+    The points of datlimz when they form a full tensor-product grid, one
+    sorted axis per column, with the datlim rows placed in grid order.
+
+    Locations are looked up with a binary search per axis and the limits are
+    interpolated multilinearly between the 2**N surrounding nodes, which is
+    O(n log k) with no triangulation. At the nodes and along the cell edges
+    this is the same linear interpolation the Delaunay path does. An axis of
+    consecutive integers, e.g. months, is indexed directly when the locations
+    on it are whole numbers.
+    '''
+    def __init__(self, axes, order):
+        self.axes = axes
+        self.order = order
+        self.shape = tuple(a.size for a in axes)
+
+    @classmethod
+    def detect(cls, points):
+        '''
+        Returns the grid of points, or None if they are not a complete grid
+        without repeats
+        '''
+        points = np.asanyarray(points, dtype=np.float64)
+        if points.ndim != 2 or not points.size or not np.isfinite(points).all():
+            return None
+        axes = []
+        index = []
+        for col in points.T:
+            axis, inverse = np.unique(col, return_inverse=True)
+            axes.append(axis)
+            index.append(inverse)
+        size = np.prod([a.size for a in axes])
+        if size != points.shape[0]:
+            return None
+        flat = np.ravel_multi_index(index, [a.size for a in axes])
+        order = np.empty(size, dtype=np.intp)
+        order.fill(-1)
+        order[flat] = np.arange(size)
+        if (order < 0).any():
+            return None
+        return cls(axes, order)
+
+    def _locate(self, axis, zi):
+        '''
+        Returns the index of the node below each location, the distance from
+        it (None when every location is on a node), the width of the cell and
+        where the location is off the axis
+        '''
+        n = axis.size
+        outside = ~((zi >= axis[0]) & (zi <= axis[-1]))
+        if n > 1 and axis[-1] - axis[0] == n - 1 and (np.diff(axis) == 1).all():
+            whole = np.where(outside, axis[0], zi)
+            if (np.floor(whole) == whole).all():
+                # Consecutive integers: the location is the index
+                return (whole - axis[0]).astype(np.intp), None, None, outside
+        # A location on the last node is that node, as in np.interp
+        idx = np.searchsorted(axis, zi, side='right') - 1
+        idx = np.clip(idx, 0, n - 1)
+        lo = axis[idx]
+        dz = zi - lo
+        dz[outside] = 0
+        width = axis[np.minimum(idx + 1, n - 1)] - lo
+        width[idx == n - 1] = 1
+        return idx, dz, width, outside
+
+    def interpolate(self, z, datlim):
+        '''
+        Interpolates the two columns of datlim to the rows of z, NaN outside
+        the grid
+        '''
+        z = np.asanyarray(z, dtype=np.float64).reshape(-1, len(self.axes))
+        values = np.asanyarray(datlim, dtype=np.float64)[self.order]
+        strides = np.cumprod((self.shape + (1,))[:0:-1])[::-1]
+
+        # Flat index of the node below each location, and the step to the
+        # next node along every axis that needs interpolating. On the last
+        # node of an axis the step is 0, so the node is used twice.
+        base = np.zeros(z.shape[0], dtype=np.intp)
+        outside = np.zeros(z.shape[0], dtype=np.bool)
+        steps = []
+        for d, axis in enumerate(self.axes):
+            idx, dz, width, off = self._locate(axis, z[:, d])
+            base += idx * strides[d]
+            outside |= off
+            if dz is not None:
+                step = np.where(idx < axis.size - 1, strides[d], 0)
+                steps.append((step, dz, width))
+
+        # Values at the corners of each cell, the last axis varying fastest,
+        # then interpolate along one axis at a time, last first, in the form
+        # of np.interp: lower + slope * (z - node)
+        corners = []
+        for corner in itertools.product((0, 1), repeat=len(steps)):
+            node = base.copy()
+            for c, (step, dz, width) in zip(corner, steps):
+                if c:
+                    node += step
+            corners.append(values.take(node, axis=0))
+        while len(corners) > 1:
+            step, dz, width = steps.pop()
+            dz = dz[:, None]
+            width = width[:, None]
+            reduced = []
+            for lower, upper in zip(corners[0::2], corners[1::2]):
+                upper -= lower
+                upper /= width
+                upper *= dz
+                upper += lower
+                reduced.append(upper)
+            corners = reduced
+        lims = corners[0]
+        lims[outside] = np.nan
+        return lims
+
+
+def interpolate_limits(z, datlim, datlimz, cache=triangulation_cache, grid=True):
+    '''
+    Linearly interpolates the lower and upper limits of datlim, given at the
+    N-dimensional points datlimz, to the locations z. When datlimz is a full
+    rectilinear grid (e.g. month x depth bins) the limits are interpolated
+    multilinearly on the grid, otherwise both columns are interpolated
+    together over a single Delaunay triangulation. Locations outside the
+    convex hull of datlimz are NaN.
+
+    Usage:
+
+        lim1, lim2 = interpolate_limits(z, datlim, datlimz)
+
+            where
+
+        lim1, lim2 = lower and upper limits at each row of z.
+
+        z = locations, one row per point and one column per dimension.
+        datlim = two column array of minimum and maximum values.
+        datlimz = locations of the rows of datlim.
+        cache = (optional) TriangulationCache the triangulation is kept in,
+            None to triangulate without caching.
+        grid = (optional, defaults to True) use the rectilinear grid path when
+            datlimz is a grid.
+    '''
+    if grid:
+        rect = RectilinearGrid.detect(datlimz)
+        if rect is not None:
+            lims = rect.interpolate(z, datlim)
+            return lims[:, 0], lims[:, 1]
+    if cache is None:
+        tri = Delaunay(datlimz)
+    else:
+        tri = cache.triangulate(datlimz)
+    F = LinearNDInterpolator(tri, np.asanyarray(datlim, dtype=np.float64))
+    lims = F(z).reshape(-1, 2)
+    return lims[:, 0], lims[:, 1]
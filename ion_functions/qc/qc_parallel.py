@@ -0,0 +1,209 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_parallel
+@file ion_functions/qc/qc_parallel.py
+@brief Parallel drivers for the QC tests
+"""
+
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_trend import window_starts, window_scale, window_flags, window_samples
+
+from multiprocessing import cpu_count
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+# The tests whose C kernels run without the GIL
+BATCH_TESTS = {
+    'spike': qcfunc.dataqc_spiketest,
+    'stuck': qcfunc.dataqc_stuckvaluetest,
+    'gradient': qcfunc.dataqc_gradienttest,
+}
+
+
+def run_qc_batch(series, test, params, workers=None):
+    '''
+    Runs one QC test over many independent series on a pool of threads.
+
+    The spike, stuck value and gradient kernels release the GIL, so the
+    series are evaluated in parallel.
+
+    Usage:
+
+        flags = run_qc_batch(series, test, params, workers)
+
+            where
+
+        flags = list of int8 flag arrays, in the order of series.
+
+        series = list of data vectors. For 'gradient' each entry is a
+            (dat, x) pair.
+        test = 'spike', 'stuck' or 'gradient'.
+        params = keyword arguments of the test function (dataqc_spiketest,
+            dataqc_stuckvaluetest or dataqc_gradienttest) without the data,
+            e.g. {'acc': 0.1, 'N': 5, 'L': 5}. A list with one dict per series
+            is accepted as well.
+        workers = (optional, defaults to the number of CPUs) number of
+            threads.
+    '''
+    if test not in BATCH_TESTS:
+        raise ValueError('Unknown test %r, expected one of %s' % (test, sorted(BATCH_TESTS)))
+    func = BATCH_TESTS[test]
+    series = list(series)
+    if isinstance(params, dict):
+        params = [params] * len(series)
+    elif len(params) != len(series):
+        raise ValueError('Need one set of params per series')
+
+    if test == 'gradient':
+        def run(args):
+            (dat, x), kwargs = args
+            return func(dat, x, **kwargs)
+    else:
+        def run(args):
+            dat, kwargs = args
+            return func(dat, **kwargs)
+
+    jobs = zip(series, params)
+    workers = workers or cpu_count()
+    if workers == 1 or len(jobs) < 2:
+        return map(run, jobs)
+    pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        return pool.map(run, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+# Fewest samples a shard is given, so the halo stays a small part of it
+SHARD_MIN = 65536
+
+# The tests run_qc_sharded splits, all of them local
+SHARD_TESTS = ('spike', 'stuck', 'trend')
+
+
+def _run_shard(job):
+    '''
+    Evaluates one shard. A module function, so process pools can pickle it.
+    '''
+    test, args, kwargs = job
+    if test == 'spike':
+        return qcfunc.dataqc_spiketest(*args, **kwargs)
+    if test == 'stuck':
+        return qcfunc.dataqc_stuckvaluetest(*args, **kwargs)
+    return window_flags(*args, **kwargs)
+
+
+def _bounds(n, shards, least):
+    '''
+    Splits range(n) into at most shards ranges of at least least samples
+    '''
+    shards = max(min(shards, n // max(least, 1)), 1)
+    edges = np.linspace(0, n, shards + 1).astype(np.intp)
+    return zip(edges[:-1], edges[1:])
+
+
+def run_qc_sharded(dat, test, params, t=None, shards=None, workers=None, pool=None):
+    '''
+    Runs one local QC test over a long series split into shards, in parallel.
+
+    Each shard is evaluated with the halo of samples on either side its
+    flags depend on, L/2 for the spike test and num-1 for the stuck value
+    test, cut at the ends of the series, and only its own flags are kept.
+    The windowed trend test is split between windows: a shard evaluates the
+    windows that start in it, from the blocks of one window they read, with
+    the time scale of the whole series. The flags are identical to those of
+    the serial function.
+
+    Usage:
+
+        qcflag = run_qc_sharded(dat, test, params, t, shards, workers, pool)
+
+            where
+
+        qcflag = int8 flags of dat, as the serial test function returns.
+
+        dat = data vector.
+        test = 'spike', 'stuck' or 'trend'.
+        params = keyword arguments of the test function (dataqc_spiketest,
+            dataqc_stuckvaluetest or dataqc_polytrendtest) without the data,
+            e.g. {'acc': 0.1, 'N': 5, 'L': 5}. The trend test must be given a
+            window, a fit of the whole series is not local.
+        t = time record of dat, only used by the trend test.
+        shards = (optional, defaults to the number of workers) number of
+            shards, fewer if they would be shorter than SHARD_MIN samples.
+        workers = (optional, defaults to the number of CPUs) number of
+            threads of the pool made for the call.
+        pool = (optional) a multiprocessing Pool or ThreadPool to run the
+            shards on instead. The C kernels release the GIL, so threads
+            scale without copying the shards to other processes.
+    '''
+    if test not in SHARD_TESTS:
+        raise ValueError('Unknown test %r, expected one of %s' % (test, list(SHARD_TESTS)))
+    dat = np.asanyarray(dat, dtype=np.float).ravel()
+    n = dat.size
+    workers = workers or cpu_count()
+    shards = shards or workers
+
+    if test == 'trend':
+        if t is None:
+            raise ValueError("The trend test needs 't'")
+        if params.get('window') is None:
+            raise ValueError('The sharded trend test needs a window')
+        t = np.asanyarray(t, dtype=np.float).ravel()
+        ord_n = int(round(abs(params.get('ord_n', 1))))
+        nstd = int(abs(params.get('nstd', 3)))
+        window = int(params['window'])
+        step = window if params.get('step') is None else int(params['step'])
+        if window < 1 or step < 1:
+            raise ValueError("'window' and 'step' must be positive")
+        window = min(window, n)
+        starts = window_starts(n, window, step)
+        scale = window_scale(t, window)
+        jobs = []
+        for a, b in _bounds(starts.size, shards, max(SHARD_MIN // step, 1)):
+            # The windows read the blocks of one window they start in and the
+            # next one, from a block boundary
+            lo = starts[a] // window * window
+            hi = min(n, (starts[b - 1] // window + 2) * window)
+            jobs.append(('trend', (dat[lo:hi], t[lo:hi], ord_n, nstd, window, starts[a:b] - lo),
+                         {'scale': scale}))
+        flags = _map(jobs, workers, pool)
+        return window_samples(np.concatenate(flags), starts, window, n)
+
+    if test == 'spike':
+        L = int(params.get('L', 5))
+        # A window of L samples covers L/2 before its middle sample
+        before, after = L // 2, L - L // 2 - 1
+        serial = n < L
+    else:
+        num = int(np.abs(params.get('num', 10)))
+        before = after = max(num - 1, 0)
+        serial = n < num
+    bounds = _bounds(n, 1 if serial else shards, max(SHARD_MIN, 4 * (before + after) + 1))
+    jobs = []
+    cuts = []
+    for a, b in bounds:
+        lo = max(a - before, 0)
+        hi = min(b + after, n)
+        jobs.append((test, (dat[lo:hi],), params))
+        cuts.append((a, b, a - lo))
+    out = np.empty(n, dtype=np.int8)
+    for (a, b, offset), flags in zip(cuts, _map(jobs, workers, pool)):
+        out[a:b] = flags[offset:offset + b - a]
+    return out
+
+
+def _map(jobs, workers, pool):
+    if pool is not None:
+        return pool.map(_run_shard, jobs, chunksize=1)
+    if workers == 1 or len(jobs) < 2:
+        return map(_run_shard, jobs)
+    pool = ThreadPool(min(workers, len(jobs)))
+    try:
+        return pool.map(_run_shard, jobs, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_streams
+@file ion_functions/qc/qc_streams.py
+@brief Resumable QC tests for data that arrives in granules
+"""
+
+from ion_functions.qc.qc_extensions import stuckvalues, spikevalues, GradientState
+
+import numpy as np
+from ion_functions import utils
+
+_no_flags = np.empty(0, dtype=np.int8)
+
+
+class SpikeStream(object):
+    '''
+    Streaming form of dataqc_spiketest.
+
+    Granules are passed to push, which returns the flags of every sample whose
+    window is complete, in order. The samples the next windows still need are
+    kept between calls. flush ends the stream and returns the remaining flags,
+    evaluated against the last L samples as dataqc_spiketest does at the end
+    of an array. The concatenated output equals
+    dataqc_spiketest(concatenated granules, acc, N, L).
+
+        stream = SpikeStream(acc, N, L)
+        for granule in granules:
+            qcflag = stream.push(granule)
+        qcflag = stream.flush()
+    '''
+    def __init__(self, acc, N=5, L=5):
+        self.acc = acc
+        self.N = N
+        self.L = int(L)
+        self._dat = np.empty(0, dtype=np.float)
+        self._offset = 0    # Index of self._dat[0] in the stream
+        self._emitted = 0   # Number of flags returned so far
+
+    def push(self, dat):
+        dat = np.asanyarray(np.atleast_1d(dat), dtype=np.float).flatten()
+        self._dat = np.concatenate([self._dat, dat])
+        return self._emit(False)
+
+    def flush(self):
+        return self._emit(True)
+
+    def _emit(self, final):
+        L = self.L
+        n = self._offset + self._dat.size
+        if final:
+            ready = n
+        elif n < L:
+            # Whether these samples get a window depends on the final length
+            ready = 0
+        else:
+            ready = n - (L - L / 2 - 1)
+        if ready <= self._emitted:
+            return _no_flags
+
+        out = spikevalues(self._dat, L, self.N, self.acc)
+        out = out[self._emitted - self._offset:ready - self._offset]
+        self._emitted = ready
+
+        # Keep the samples the windows of the pending ones overlap
+        start = max(0, ready - (L - 1))
+        self._dat = self._dat[start - self._offset:].copy()
+        self._offset = start
+        return out
+
+
+class StuckStream(object):
+    '''
+    Streaming form of dataqc_stuckvaluetest.
+
+    push returns the flags of every sample that no later run can include,
+    which is each sample followed by at least num-1 others. The open run is
+    kept as the last num-1 samples. flush returns the rest. The concatenated
+    output equals dataqc_stuckvaluetest(concatenated granules, reso, num),
+    including the all zero result for a stream shorter than num.
+    '''
+    def __init__(self, reso, num=10):
+        self.reso = reso
+        self.num = np.abs(num)
+        self._dat = np.empty(0, dtype=np.float)
+        self._offset = 0
+        self._emitted = 0
+
+    def push(self, x):
+        x = np.asanyarray(np.atleast_1d(x), dtype=np.float).flatten()
+        self._dat = np.concatenate([self._dat, x])
+        return self._emit(False)
+
+    def flush(self):
+        return self._emit(True)
+
+    def _emit(self, final):
+        num = self.num
+        n = self._offset + self._dat.size
+        if n < num:
+            if not final:
+                return _no_flags
+            out = np.zeros(n - self._emitted, dtype='int8')
+            self._emitted = n
+            return out
+        ready = n if final else n - num + 1
+        if ready <= self._emitted:
+            return _no_flags
+
+        out = stuckvalues(self._dat, self.reso, num)
+        out = out[self._emitted - self._offset:ready - self._offset]
+        self._emitted = ready
+
+        start = max(0, ready - (int(num) - 1))
+        self._dat = self._dat[start - self._offset:].copy()
+        self._offset = start
+        return out
+
+
+class GradientStream(object):
+    '''
+    Streaming form of dataqc_gradienttest.
+
+    The last good value, the bad state and the count of points skipped for
+    mindx are carried between calls to push(dat, x) by the gradient kernel.
+    Points skipped since the last evaluated point are held back, because a
+    later bad gradient also marks them bad; everything before them is
+    returned. x must be increasing across granules. As long as all of x is
+    within mindx of the first point, dataqc_gradienttest would return all
+    ones, so no flags are returned until x leaves that range (or at flush).
+    '''
+    def __init__(self, ddatdx, mindx, startdat, toldat):
+        if np.isnan(mindx):
+            mindx = 0
+        mindx = mindx or 0
+        if np.isnan(startdat):
+            startdat = 0
+        startdat = startdat or 0
+
+        if not utils.isscalar(mindx):
+            raise ValueError("'mindx' must be scalar, NaN, or empty.")
+        if not utils.isscalar(startdat):
+            raise ValueError("'startdat' must be scalar, NaN, or empty.")
+
+        self.mindx = mindx
+        self._state = GradientState(ddatdx[0], ddatdx[1], mindx, startdat, toldat)
+        self._dat = np.empty(0, dtype=np.float)
+        self._x = np.empty(0, dtype=np.float)
+        self._out = np.empty(0, dtype=np.int8)
+        self._x0 = None         # First x of the stream
+        self._armed = False     # x has moved at least mindx from x0
+        self._offset = 0
+        self._evaluated = 0     # Points the kernel has scanned
+        self._emitted = 0
+
+    def push(self, dat, x):
+        dat = np.asanyarray(dat, dtype=np.float).flatten()
+        x = np.asanyarray(x, dtype=np.float).flatten()
+        if dat.size != x.size:
+            raise ValueError("'dat' and 'x' must be of equal len")
+        if self._x0 is None and x.size:
+            self._x0 = x[0]
+        self._dat = np.concatenate([self._dat, dat])
+        self._x = np.concatenate([self._x, x])
+        self._out = np.concatenate([self._out, np.ones(dat.size, dtype=np.int8)])
+        return self._emit(False)
+
+    def flush(self):
+        return self._emit(True)
+
+    def _emit(self, final):
+        n = self._offset + self._dat.size
+        if not self._armed:
+            if self._x0 is None:
+                return _no_flags
+            if np.abs(self._x0 - self._x[-1]) < self.mindx:
+                if not final:
+                    return _no_flags
+                # Too few values to inspect
+                out = np.ones(n - self._emitted, dtype=np.int8)
+                self._emitted = n
+                return out
+            self._armed = True
+
+        self._state.resume(self._out, self._dat, self._x, self._evaluated - self._offset)
+        self._evaluated = n
+        ready = n if final else n - self._state.skipped
+        if ready <= self._emitted:
+            return _no_flags
+
+        out = self._out[self._emitted - self._offset:ready - self._offset].copy()
+        self._emitted = ready
+
+        # The kernel looks back to the last evaluated point
+        start = ready - 1
+        self._dat = self._dat[start - self._offset:].copy()
+        self._x = self._x[start - self._offset:].copy()
+        self._out = self._out[start - self._offset:].copy()
+        self._offset = start
+        return out
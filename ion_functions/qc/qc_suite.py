@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_suite
+@file ion_functions/qc/qc_suite.py
+@brief Runs several QC tests over a data vector in a single pass
+"""
+
+from ion_functions.qc.qc_extensions import suitevalues, runvalues
+from ion_functions.qc.qc_flags import QCFlags, QCRuns
+
+import numpy as np
+
+# Tests run_qc_suite runs, by their QCFlags name
+SUITE_TESTS = ('glblrng', 'spketst', 'stuckvl', 'gradtst')
+
+
+def run_qc_suite(dat, x, config, flags=None, block=0, runs=False):
+    '''
+    Runs the global range, spike, stuck value and gradient tests over dat in
+    one C loop. The data is converted to float64 once and read in blocks
+    that stay in cache while every test evaluates them, and the results are
+    written as bits of a QCFlags store instead of an int8 array per test.
+    The flags are those of dataqc_globalrangetest, dataqc_spiketest,
+    dataqc_stuckvaluetest and dataqc_gradienttest, with the points the
+    gradient test skips (-99) counting as a pass.
+
+    Usage:
+
+        flags = run_qc_suite(dat, x, config, flags, block, runs)
+
+            where
+
+        flags = QCFlags store with the tests of config set, or with runs a
+            dict of the name of each test of config to its QCRuns.
+
+        dat = data vector.
+        x = axis of dat, only used by the gradient test, None without it.
+        config = dict of test name to the keyword arguments of the test
+            function without the data, e.g.
+
+            {'glblrng': {'datlim': [0, 35]},
+             'spketst': {'acc': 0.1, 'N': 5, 'L': 5},
+             'stuckvl': {'reso': 0.01, 'num': 10},
+             'gradtst': {'ddatdx': [-5, 5], 'mindx': 0, 'startdat': np.nan,
+                         'toldat': 1.0}}
+
+            Tests left out of config are not run.
+        flags = (optional) QCFlags store of len(dat) to write the results
+            into, a new one by default.
+        block = (optional) samples per block, 0 for the default of the C
+            loop.
+        runs = (optional) return the flags of each test as runs instead of
+            a store, with the gradient test's skipped points as -99. No
+            array as long as dat is made, for when failures are sparse.
+    '''
+    unknown = set(config) - set(SUITE_TESTS)
+    if unknown:
+        raise ValueError('Unknown tests %s, expected some of %s' % (sorted(unknown), list(SUITE_TESTS)))
+    dat = np.ascontiguousarray(np.ravel(dat), dtype=np.float64)
+    if runs:
+        # Any nonzero bit selects a test
+        flags = QCFlags(0, SUITE_TESTS)
+    elif flags is None:
+        flags = QCFlags(dat.size)
+    elif len(flags) != dat.size:
+        raise ValueError("'flags' and 'dat' must be of equal len")
+    if flags.bits.dtype != np.uint16:
+        raise ValueError('run_qc_suite writes uint16 flag words')
+    if not runs:
+        # The tests run start from a pass and clear their bit where they fail
+        for test in config:
+            flags.bits |= flags.bit(test)
+
+    kwargs = {}
+    if 'glblrng' in config:
+        datlim = np.atleast_1d(config['glblrng']['datlim'])
+        kwargs['ranges'] = (flags.bit('glblrng'), datlim.min(), datlim.max())
+    if 'spketst' in config:
+        params = config['spketst']
+        kwargs['spike'] = (flags.bit('spketst'), params.get('L', 5), params.get('N', 5), params['acc'])
+    if 'stuckvl' in config:
+        params = config['stuckvl']
+        kwargs['stuck'] = (flags.bit('stuckvl'), params['reso'], np.abs(params.get('num', 10)))
+    if 'gradtst' in config:
+        params = config['gradtst']
+        if x is None:
+            raise ValueError("The gradient test needs 'x'")
+        x = np.ascontiguousarray(np.ravel(x), dtype=np.float64)
+        mindx = params['mindx']
+        if np.isnan(mindx):
+            mindx = 0
+        mindx = mindx or 0
+        startdat = params['startdat']
+        if np.isnan(startdat):
+            startdat = 0
+        startdat = startdat or 0
+        # As in dataqc_gradienttest, too few values to inspect is a pass
+        if x.size and not np.abs(x[0] - x[-1]) < mindx:
+            ddatdx = params['ddatdx']
+            kwargs['gradient'] = (flags.bit('gradtst'), ddatdx[0], ddatdx[1], mindx,
+                                  startdat, params['toldat'])
+
+    if runs:
+        # A gradient test left out for too few values passed everywhere
+        out = dict((test, QCRuns(dat.size)) for test in config)
+        for test, result in zip(SUITE_TESTS, runvalues(dat, x, block=block, **kwargs)):
+            if result is not None:
+                out[test] = QCRuns(dat.size, *result)
+        return out
+    suitevalues(flags.bits, dat, x, block=block, **kwargs)
+    return flags
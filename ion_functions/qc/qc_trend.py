@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.qc_trend
+@file ion_functions/qc/qc_trend.py
+@brief Trend test over sliding windows from running sums
+"""
+
+import numpy as np
+from scipy.special import comb
+
+
+def window_starts(n, window, step):
+    '''
+    Returns the first sample of every window of the given length, step samples
+    apart. A last window ending on the last sample is added when the steps do
+    not reach it, so every sample is in at least one window.
+    '''
+    window = min(window, n)
+    starts = np.arange(0, n - window + 1, step, dtype=np.intp)
+    if starts[-1] + window < n:
+        starts = np.append(starts, n - window)
+    return starts
+
+
+def _shift(sums, d):
+    '''
+    Moves rows of power sums sum(u**k), k = 0..K, to the origin -d of each
+    row: sum((u + d)**k)
+    '''
+    out = np.zeros_like(sums)
+    for k in range(sums.shape[1]):
+        for j in range(k + 1):
+            out[:, k] += comb(k, j, exact=True) * d ** (k - j) * sums[:, j]
+    return out
+
+
+def window_scale(t, window):
+    '''
+    The mean duration of a window of the times t, the unit window_moments
+    measures time in
+    '''
+    scale = (t[-1] - t[0]) * window / t.size
+    if not scale > 0:
+        scale = 1.0
+    return scale
+
+
+def window_moments(dat, t, ord_n, window, starts, scale=None):
+    '''
+    Sums of u**k (k = 0..2*ord_n), u**k * v (k = 0..ord_n) and v**2 over each
+    window, where u is t and v is dat, both taken from the first sample of the
+    block the window starts in, and u scaled by the mean window duration.
+
+    The series is cut into blocks of one window. Running sums are kept within
+    each block from its own origin, so a window, which covers the tail of one
+    block and the head of the next, is the difference of two running sums of
+    one block plus a running sum of the next moved to the first origin. The
+    sums are never taken over more than a window from the origin, so they
+    keep their precision on long records of large times such as NTP seconds.
+
+    The sums of a window only read the blocks it touches, so the windows of
+    a part of the series that starts on a block boundary get the same sums
+    from that part alone, given the scale of the whole series.
+    '''
+    n = dat.size
+    nb = -(-n // window)
+    pad = nb * window - n
+
+    blocks = np.arange(nb) * window
+    t0 = t[blocks]
+    y0 = dat[blocks]
+    if scale is None:
+        scale = window_scale(t, window)
+
+    u = (t - np.repeat(t0, window)[:n]) / scale
+    v = dat - np.repeat(y0, window)[:n]
+    u = np.concatenate([u, np.zeros(pad)]).reshape(nb, window)
+    v = np.concatenate([v, np.zeros(pad)]).reshape(nb, window)
+
+    # Running sums within each block, with a leading zero column
+    uk = np.ones_like(u)
+    S = np.zeros((nb, window + 1, 2 * ord_n + 1))
+    Q = np.zeros((nb, window + 1, ord_n + 1))
+    for k in range(2 * ord_n + 1):
+        if k:
+            uk = uk * u
+        np.cumsum(uk, axis=1, out=S[:, 1:, k])
+        if k <= ord_n:
+            np.cumsum(uk * v, axis=1, out=Q[:, 1:, k])
+    R = np.zeros((nb, window + 1))
+    np.cumsum(v * v, axis=1, out=R[:, 1:])
+
+    # Tail of the block the window starts in, from its origin
+    b = starts // window
+    off = starts - b * window
+    Sw = S[b, -1] - S[b, off]
+    Qw = Q[b, -1] - Q[b, off]
+    Rw = R[b, -1] - R[b, off]
+
+    # Head of the next block, moved to the same origin
+    head = np.nonzero(off)[0]
+    if head.size:
+        bh = b[head] + 1
+        oh = off[head]
+        d = (t0[bh] - t0[bh - 1]) / scale
+        g = y0[bh] - y0[bh - 1]
+        Sh = S[bh, oh]
+        Qh = Q[bh, oh]
+        Rh = R[bh, oh]
+        Sw[head] += _shift(Sh, d)
+        Qw[head] += _shift(Qh + g[:, None] * Sh[:, :ord_n + 1], d)
+        Rw[head] += Rh + 2 * g * Qh[:, 0] + g ** 2 * Sh[:, 0]
+    return Sw, Qw, Rw
+
+
+def window_trend(dat, t, ord_n, nstd, window, step):
+    '''
+    Returns the trend test result, 0 for a trend and 1 for none, of each
+    window and the window starts. The test is the one of
+    dataqc_polytrendtest: a window has a trend if the standard deviation of
+    its residual from a least squares polynomial of order ord_n, times nstd,
+    is less than the standard deviation of its data.
+
+    The normal equations of every window are built from running sums, so
+    the whole series is O(n * ord_n) with one small solve per window. A
+    window whose equations are singular, e.g. repeated times, is fit with
+    np.polyfit instead.
+    '''
+    dat = np.asanyarray(dat, dtype=np.float64)
+    t = np.asanyarray(t, dtype=np.float64)
+    n = dat.size
+    window = min(window, n)
+    starts = window_starts(n, window, step)
+    return window_flags(dat, t, ord_n, nstd, window, starts), starts
+
+
+def window_flags(dat, t, ord_n, nstd, window, starts, scale=None):
+    '''
+    The trend test result of the windows of window_trend starting at starts,
+    with the times measured in scale as by window_moments.
+    '''
+    Sw, Qw, Rw = window_moments(dat, t, ord_n, window, starts, scale)
+
+    # Normal equations A p = Q with A[i, j] = sum(u**(i + j))
+    m = ord_n + 1
+    idx = np.add.outer(np.arange(m), np.arange(m))
+    A = Sw[:, idx]
+    try:
+        p = np.linalg.solve(A, Qw[..., None])[..., 0]
+        singular = np.zeros(starts.size, dtype=np.bool)
+    except np.linalg.LinAlgError:
+        p = np.zeros_like(Qw)
+        singular = np.ones(starts.size, dtype=np.bool)
+        for w in range(starts.size):
+            try:
+                p[w] = np.linalg.solve(A[w], Qw[w])
+                singular[w] = False
+            except np.linalg.LinAlgError:
+                pass
+
+    # Squared residual and spread about the mean, both times the window
+    # length, so std(residual) * nstd < std(dat) is rss * nstd**2 < sst
+    rss = np.maximum(Rw - (p * Qw).sum(axis=1), 0)
+    sst = np.maximum(Rw - Qw[:, 0] ** 2 / window, 0)
+    trend = rss * nstd ** 2 < sst
+
+    for w in np.nonzero(singular)[0]:
+        sl = slice(starts[w], starts[w] + window)
+        pp = np.polyfit(t[sl], dat[sl], ord_n)
+        trend[w] = np.std(dat[sl] - np.polyval(pp, t[sl])) * nstd < np.std(dat[sl])
+
+    return np.where(trend, 0, 1).astype(np.int8)
+
+
+def windowed_polytrend(dat, t, ord_n, nstd, window, step=None):
+    '''
+    Runs the trend test over windows of window samples, step samples apart
+    (defaults to window, i.e. no overlap), and maps the result back to the
+    samples: a sample is flagged 0 if any window it is in has a trend, else 1.
+    '''
+    window = int(window)
+    step = window if step is None else int(step)
+    if window < 1 or step < 1:
+        raise ValueError("'window' and 'step' must be positive")
+    n = dat.size
+    flags, starts = window_trend(dat, t, ord_n, nstd, window, step)
+    return window_samples(flags, starts, min(window, n), n)
+
+
+def window_samples(flags, starts, window, n):
+    '''
+    Maps the trend test result of the windows starting at starts to the n
+    samples, 0 where any window has a trend
+    '''
+    # Count the windows with a trend over each sample
+    bad = starts[flags == 0]
+    count = np.zeros(n + 1, dtype=np.intp)
+    np.add.at(count, bad, 1)
+    np.add.at(count, bad + window, -1)
+    qcflag = np.ones(n, dtype=np.int8)
+    qcflag[np.cumsum(count[:-1]) > 0] = 0
+    return qcflag
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_dimensions
+@file ion_functions/qc/test/test_qc_dimensions.py
+@brief Unit tests for the dimension cache of the local range test
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_dimensions import DimensionCache
+from ion_functions.qc.qc_extensions import ntp_to_month
+
+
+@attr('UNIT', group='func')
+class TestDimensionCacheUnit(BaseUnitTestCase):
+
+    def setUp(self):
+        self.t = np.array([3580144703.7555027, 3580144704.7555027, 3580144705.7555027,
+                           3580144706.7555027, 3580144707.7555027, 3580144708.7555027,
+                           3580144709.7555027, 3580144710.7555027, 3580144711.7555027,
+                           3580144712.7555027])
+        self.pressure = np.random.rand(10) * 2 + 33.0
+        self.fetched = []
+
+    def callback(self, dim):
+        self.fetched.append(dim)
+        return {'time': self.t, 'pressure': self.pressure}[dim]
+
+    def test_wrapper(self):
+        dat = ntp_to_month(self.t) + self.pressure + np.arange(16, 26)
+        pressure_grid, month_grid = np.meshgrid(np.arange(0, 150, 10), np.arange(11))
+        points = np.column_stack([pressure_grid.flatten(), month_grid.flatten()])
+        datlim = np.column_stack([points[:, 0] + points[:, 1] + 10, points[:, 0] + points[:, 1] + 20])
+
+        dims = DimensionCache(self.callback, dataset='a')
+        expected = qcfunc.dataqc_localrangetest_wrapper(dat, datlim, points, ['pressure', 'month'], self.callback)
+        self.fetched = []
+        for i in xrange(5):
+            out = qcfunc.dataqc_localrangetest_wrapper(dat, datlim, points, ['pressure', 'month'], dims)
+            np.testing.assert_array_equal(out, expected)
+        np.testing.assert_array_equal(out, [1, 1, 1, 1, 1, 0, 0, 0, 0, 0])
+        self.assertEqual(sorted(self.fetched), ['pressure', 'time'])
+
+        # A single dimension
+        datlim = np.array([[0, 30], [0, 40]])
+        datlimz = np.array([[30], [40]])
+        out = qcfunc.dataqc_localrangetest_wrapper(self.pressure, datlim, datlimz, ['pressure'], dims)
+        expected = qcfunc.dataqc_localrangetest_wrapper(self.pressure, datlim, datlimz, ['pressure'], self.callback)
+        np.testing.assert_array_equal(out, expected)
+
+    def test_cache(self):
+        dims = DimensionCache(self.callback, dataset='a')
+        np.testing.assert_array_equal(dims.get('month'), ntp_to_month(self.t))
+        self.assertTrue(dims.get('month') is dims.get('month'))
+        self.assertTrue(dims.get('time') is self.t)
+        self.assertEqual(self.fetched, ['time'])
+        self.assertEqual(dims.stack(['pressure', 'month']).shape, (10, 2))
+        self.assertTrue(dims.stack(['pressure', 'month']) is dims.stack(('pressure', 'month')))
+        self.assertEqual(dims.info()['misses'], 4)
+
+        # The same dataset keeps the vectors, another one drops them
+        dims.bind(self.callback, dataset='a')
+        dims.get('time')
+        self.assertEqual(self.fetched, ['time', 'pressure'])
+        dims.bind(self.callback, dataset='b')
+        self.assertEqual(len(dims), 0)
+        dims.get('month')
+        self.assertEqual(self.fetched, ['time', 'pressure', 'time'])
+
+        dims.clear()
+        self.assertEqual(dims.info(), {'hits': 0, 'misses': 0, 'size': 0})
+        self.assertRaises(ValueError, DimensionCache().get, 'pressure')
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_ephemeris
+@file ion_functions/qc/test/test_qc_ephemeris.py
+@brief Unit tests for the tabulated solar ephemeris
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_ephemeris import SolarEphemerisTable, solar_time, solar_ephemeris
+
+
+@attr('UNIT', group='func')
+class TestQCEphemerisUnit(BaseUnitTestCase):
+
+    def test_table_error_bound(self):
+        rs = np.random.RandomState(11)
+        table = SolarEphemerisTable(block_size=4096)
+        # A few blocks, the last node of a block and times outside the table
+        dt = np.fix(rs.uniform(1356998400, 1356998400 + 200 * 86400., 20000))
+        dt = np.concatenate([dt, [table.start, table.start + 4096 * 600, table.stop - 1,
+                                  table.start - 1, table.stop]])
+        decln, eqt, rho = table(dt)
+        exact = solar_ephemeris(solar_time(dt)[1])
+        self.assertLess(np.abs(np.degrees(decln - exact[0])).max(), 1e-7)
+        self.assertLess(np.abs(eqt - exact[1]).max(), 1e-6)
+        self.assertLess(np.abs(rho - exact[2]).max(), 1e-9)
+
+        # Nodes are exact, outside the table the series is evaluated
+        exact_at = [-5, -4, -2, -1]
+        np.testing.assert_array_equal(decln[exact_at], exact[0][exact_at])
+        inside = dt[(dt >= table.start) & (dt < table.stop)]
+        self.assertEqual(len(table), np.unique((inside - table.start) // (4096 * 600)).size)
+        table.clear()
+        self.assertEqual(len(table), 0)
+
+    def test_solarelevation_tabulated(self):
+        rs = np.random.RandomState(12)
+        lon = rs.uniform(-180, 180, 5000)
+        lat = rs.uniform(-90, 90, 5000)
+        dt = rs.uniform(1356998400, 1356998400 + 2 * 365 * 86400., 5000)
+        z, sorad = qcfunc.dataqc_solarelevation(lon, lat, dt)
+        tz, tsorad = qcfunc.dataqc_solarelevation(lon, lat, dt, tabulated=True)
+        self.assertLess(np.abs(tz - z).max(), 1e-6)
+        self.assertLess(np.abs(tsorad - sorad).max(), 1e-5)
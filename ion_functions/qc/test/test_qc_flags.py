@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_flags
+@file ion_functions/qc/test/test_qc_flags.py
+@brief Unit tests for the bit-packed QC flag store
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_flags import QCFlags, QC_TESTS, propagate
+
+
+@attr('UNIT', group='func')
+class TestQCFlagsUnit(BaseUnitTestCase):
+
+    def test_round_trip(self):
+        rs = np.random.RandomState(1)
+        flags = rs.randint(0, 2, (len(QC_TESTS), 100)).astype(np.int8)
+        store = QCFlags.from_int8(flags)
+        self.assertEqual(store.bits.dtype, np.uint16)
+        self.assertEqual(len(store), 100)
+        np.testing.assert_array_equal(store.to_int8(), flags)
+        np.testing.assert_array_equal(store.get('spketst'), flags[2])
+        np.testing.assert_array_equal(store.passed(), flags.all(axis=0))
+        np.testing.assert_array_equal(store.passed(['glblrng', 'stuckvl']),
+                                      flags[[0, 4]].all(axis=0))
+
+        # Fill flags are good, as in dataqc_propagateflags
+        store = QCFlags.from_int8({'gradtst': np.array([1, -99, 0], dtype=np.int8)})
+        np.testing.assert_array_equal(store.get('gradtst'), [1, 1, 0])
+        np.testing.assert_array_equal(store.get('glblrng'), [1, 1, 1])
+
+        tests = ['t%d' % i for i in range(20)]
+        self.assertEqual(QCFlags(5, tests).bits.dtype, np.uint32)
+        self.assertRaises(ValueError, QCFlags, 5, ['t%d' % i for i in range(33)])
+        self.assertRaises(ValueError, QCFlags, 5, tests, np.uint16)
+        self.assertRaises(KeyError, store.get, 'nope')
+
+    def test_set_in_place(self):
+        store = QCFlags(6)
+        bits = store.bits
+        store.set('spketst', [1, 0, 1, 0, 1, 0])
+        store.set('spketst', [1, 1], index=slice(0, 2))
+        store.set('trndtst', [0, 0], index=np.array([False, False, False, True, True, False]))
+        self.assertTrue(store.bits is bits)
+        np.testing.assert_array_equal(store.get('spketst'), [1, 1, 1, 0, 1, 0])
+        np.testing.assert_array_equal(store.get('trndtst'), [1, 1, 1, 0, 0, 1])
+        np.testing.assert_array_equal(store.passed(), [1, 1, 1, 0, 0, 0])
+
+    def test_merge_and_propagate(self):
+        rs = np.random.RandomState(2)
+        flags = rs.randint(0, 2, (3, len(QC_TESTS), 50)).astype(np.int8)
+        stores = [QCFlags.from_int8(f) for f in flags]
+        first = stores[0].bits.copy()
+        out = propagate(stores)
+        np.testing.assert_array_equal(stores[0].bits, first)
+        np.testing.assert_array_equal(out.to_int8(), flags.all(axis=0))
+
+        # Same as dataqc_propagateflags of every flag array
+        expected = qcfunc.dataqc_propagateflags(flags.reshape(-1, 50))
+        np.testing.assert_array_equal(out.passed(), expected)
+        np.testing.assert_array_equal(qcfunc.dataqc_propagateflags(stores), expected)
+        np.testing.assert_array_equal(qcfunc.dataqc_propagateflags_wrapper(False, *stores), expected)
+        np.testing.assert_array_equal(qcfunc.dataqc_propagateflags(stores[1]), flags[1].all(axis=0))
+
+        # Stores of other tests are merged by name
+        other = QCFlags(50, ['spketst', 'extra'])
+        other.set('spketst', flags[1][0])
+        store = QCFlags.from_int8(flags[0])
+        store.merge(other)
+        np.testing.assert_array_equal(store.get('spketst'), flags[0][2] & flags[1][0])
+        np.testing.assert_array_equal(store.get('glblrng'), flags[0][0])
+        self.assertRaises(ValueError, store.merge, QCFlags(49))
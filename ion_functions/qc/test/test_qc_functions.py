@@ -12,7 +12,8 @@ from ion_functions.test.base_test import BaseUnitTestCase
 
 import numpy as np
 from ion_functions.qc import qc_functions as qcfunc
-from ion_functions.qc.qc_functions import ntp_to_month
+from ion_functions.qc.qc_functions import ntp_to_month, ntp_to_civil
+from ion_functions.qc.qc_extensions import gradientvalues
 import unittest
 import os
 
@@ -163,6 +164,35 @@ class TestQCFunctionsUnit(BaseUnitTestCase):
 
         self.assertTrue(np.array_equal(got, out))
 
+    def test_dataqc_globalrangetest_batch(self):
+        np.random.seed(31)
+        dat = np.random.random_sample((1000, 4)) * 40 - 10
+        dat[np.random.randint(0, 1000, 30), np.random.randint(0, 4, 30)] = np.nan
+        datlim = qcfunc.globalrange_limits([0, 5, -9999, -5], [[20], 15, 30, 25])
+        np.testing.assert_array_equal(datlim[2], [np.nan, np.nan])
+
+        got = qcfunc.dataqc_globalrangetest_batch(dat, datlim)
+        self.assertEqual(got.dtype, np.int8)
+        for c in (0, 1, 3):
+            expected = qcfunc.dataqc_globalrangetest(dat[:, c], datlim[c])
+            np.testing.assert_array_equal(got[:, c], expected)
+        # NaN fails, a parameter without limits is not tested
+        self.assertFalse(got[np.isnan(dat[:, 0]), 0].any())
+        self.assertTrue((got[:, 2] == -99).all())
+
+        # In place, parameters x samples and in the type of the block
+        out = np.empty((4, 1000), dtype=np.int8)
+        block = dat.T.astype(np.float32)
+        ret = qcfunc.dataqc_globalrangetest_batch(block, datlim, out=out, axis=1)
+        self.assertIs(ret, out)
+        np.testing.assert_array_equal(out, got.T)
+        counts = np.arange(-20, 20, dtype=np.int16).reshape(20, 2)
+        np.testing.assert_array_equal(qcfunc.dataqc_globalrangetest_batch(counts, [[0, 10], [-4, 4]]),
+                                      (counts >= [0, -4]) & (counts <= [10, 4]))
+        self.assertRaises(ValueError, qcfunc.dataqc_globalrangetest_batch, dat, datlim[:3])
+        self.assertRaises(ValueError, qcfunc.dataqc_globalrangetest_batch, dat, datlim,
+                          out=np.empty((1000, 4)))
+
     def test_dataqc_localrangetest(self):
         """
         Test of the dataqc_localrangetest function.
@@ -250,6 +280,26 @@ class TestQCFunctionsUnit(BaseUnitTestCase):
 
 
 
+    def test_ntp_to_civil(self):
+        # Against time.gmtime over two centuries, including leap days and the
+        # last fraction of a second before midnight
+        import time
+        np.random.seed(29)
+        t = np.random.uniform(2208988800 - 2e9, 2208988800 + 4e9, 5000)
+        t = np.concatenate([t, [3160771200 - 0.25, 3160771200, 3160857599.75, 2208988800]])
+        year, month, day, yday, sod = ntp_to_civil(t)
+        for i in xrange(t.size):
+            tm = time.gmtime(np.floor(t[i] - 2208988800))
+            self.assertEqual((year[i], month[i], day[i], yday[i]), tuple(tm[:3]) + (tm.tm_yday,))
+            self.assertAlmostEqual(sod[i], tm.tm_hour * 3600 + tm.tm_min * 60 + tm.tm_sec + t[i] % 1, delta=1e-5)
+
+        # ntp_to_month stays 0 based and rounded to the nearest second
+        np.testing.assert_array_equal(ntp_to_month(t), ntp_to_civil(np.floor(t + 0.5))[1] - 1)
+        self.assertEqual(ntp_to_month(t[-2:-1])[0], 2)  # rounds up to March 1st
+        year, month, day, yday, sod = ntp_to_civil([np.nan])
+        self.assertEqual((year[0], month[0], day[0], yday[0]), (0, 0, 0, 0))
+        self.assertTrue(np.isnan(sod[0]))
+
     def test_dataqc_spiketest(self):
         """
         Test of the Spike Test function.
@@ -323,6 +373,56 @@ class TestQCFunctionsUnit(BaseUnitTestCase):
         # Delete the indices and make sure everything that's left is 1
         self.assertTrue((np.delete(out, out_inds) == 1).all())
 
+    def test_dataqc_spiketest_long_window(self):
+        # Windows of SPIKE_RUNNING_MIN_L and longer go through the O(n)
+        # kernel, check it against a direct evaluation of the DPS windows
+        np.random.seed(13)
+        dat = np.random.randint(0, 10, 2000).astype(np.float)
+        dat[np.random.randint(0, 2000, 40)] = 60
+        dat[[0, 1999]] = -60  # spikes in the edge windows
+        acc = 0.1
+        N = 2
+        for L in (48, 101, 256, 2000):
+            L2 = L / 2
+            expected = np.ones(dat.size, dtype=np.int8)
+            for i in xrange(dat.size):
+                start = min(max(i - L2, 0), dat.size - L)
+                window = np.delete(dat[start:start + L], i - start)
+                R = max(window.max() - window.min(), acc)
+                if np.abs(dat[i] - window.mean()) > N * R:
+                    expected[i] = 0
+
+            got = qcfunc.dataqc_spiketest(dat, acc, N, L)
+            np.testing.assert_array_equal(got, expected)
+
+    def test_dataqc_spiketest_columns(self):
+        # A 2-D array is tested column by column along axis, in place, with
+        # per-column parameters
+        np.random.seed(17)
+        dat = np.random.random_sample((400, 6))
+        dat[np.random.randint(0, 400, 40), np.random.randint(0, 6, 40)] += 20
+        acc = np.array([0.1, 0.1, 0.5, 0.1, 0.01, 0.1])
+        L = np.array([5, 7, 11, 61, 5, 400])
+        # view, axis, original column of each series in the view
+        views = [
+            (dat, 0, range(6)),
+            (dat.T, 1, range(6)),
+            (np.asfortranarray(dat), 0, range(6)),
+            (dat[::-1, ::-2], 0, [5, 3, 1]),
+            (dat.T[::-1], 1, range(6)[::-1]),
+        ]
+        for view, axis, order in views:
+            got = qcfunc.dataqc_spiketest(view, acc[order], 3, L[order], axis=axis)
+            self.assertEqual(got.shape, view.shape)
+            self.assertEqual(got.dtype, np.int8)
+            got = np.moveaxis(got, axis, 0)
+            cols = np.moveaxis(view, axis, 0)
+            for c, k in enumerate(order):
+                expected = qcfunc.dataqc_spiketest(cols[:, c].copy(), acc[k], 3, L[k])
+                np.testing.assert_array_equal(got[:, c], expected)
+
+        self.assertRaises(ValueError, qcfunc.dataqc_spiketest, dat, 0.1, 3, [5, 7])
+
     def test_dataqc_polytrendtest(self):
         """
         Test of the Trend Test function.
@@ -426,6 +526,86 @@ class TestQCFunctionsUnit(BaseUnitTestCase):
 
 
 
+    def test_dataqc_stuckvaluetest_long_run(self):
+        # Overlapping and drifting runs with a large num, checked against a
+        # direct evaluation of every window
+        np.random.seed(7)
+        x = np.random.random_sample(3000) * 10
+        x[100:400] = 5.0
+        x[350:700] = 5.0 + np.linspace(0, 0.02, 350)
+        x[1500:1699] = 2.0  # one short of num
+        x[2000:2300] = 3.0
+        x[2150] = np.nan
+        reso = 0.01
+        num = 200
+
+        expected = np.ones(x.size, dtype=np.int8)
+        for i in xrange(x.size - num + 1):
+            window = x[i:i + num]
+            if (np.abs(window - window[-1]) < reso).all():
+                expected[i:i + num] = 0
+
+        got = qcfunc.dataqc_stuckvaluetest(x, reso, num)
+        np.testing.assert_array_equal(got, expected)
+
+    def test_dataqc_stuckvaluetest_columns(self):
+        np.random.seed(19)
+        x = np.random.random_sample((500, 5)) * 10
+        x[20:60, 0] = 2.0
+        x[100:112, 1] = 4.0
+        x[300:500, 3] = 1.0
+        num = np.array([10, 10, 20, 10, 600])
+        for view, axis in ((x, 0), (x.T, 1), (x[::2], 0)):
+            got = qcfunc.dataqc_stuckvaluetest(view, 0.01, num, axis=axis)
+            self.assertEqual(got.shape, view.shape)
+            got = np.moveaxis(got, axis, 0)
+            cols = np.moveaxis(view, axis, 0)
+            for c in xrange(cols.shape[1]):
+                expected = qcfunc.dataqc_stuckvaluetest(cols[:, c].copy(), 0.01, num[c])
+                np.testing.assert_array_equal(got[:, c], expected)
+        # num longer than the series gives zeros, as for a vector
+        self.assertFalse(qcfunc.dataqc_stuckvaluetest(x, 0.01, num)[:, 4].any())
+
+    def test_gradientvalues_columns(self):
+        np.random.seed(23)
+        dat = np.cumsum(np.random.random_sample((300, 4)) - 0.5, axis=0)
+        dat[np.random.randint(0, 300, 20), np.random.randint(0, 4, 20)] += 30
+        x = np.cumsum(np.random.random_sample(300))
+        mindx = [0, 0.3, 0.6, 0]
+        got = gradientvalues(dat.T, x, -5, 5, mindx, 0, 1.0, axis=1)
+        self.assertEqual(got.shape, (4, 300))
+        for c in xrange(4):
+            expected = gradientvalues(dat[:, c].copy(), x, -5, 5, mindx[c], 0, 1.0)
+            np.testing.assert_array_equal(got[c], expected)
+
+        # x of the same shape as dat
+        xx = np.repeat(x[:, None], 4, axis=1)
+        np.testing.assert_array_equal(gradientvalues(dat, xx, -5, 5, mindx, 0, 1.0), got.T)
+
+    def test_native_dtypes(self):
+        # int16, int32 and float32 are read in place and flagged as their
+        # float64 values, as are strided and byte swapped views
+        np.random.seed(29)
+        raw = np.cumsum(np.random.randint(-3, 4, (2000, 3)), axis=0)
+        raw[np.random.randint(0, 2000, 40), np.random.randint(0, 3, 40)] += 60
+        raw[500:530, 1] = raw[500, 1]
+        x = np.arange(2000, dtype=np.float64)
+        for dtype in (np.int16, np.int32, np.float32, np.float64, '>i4', np.int8, np.uint16):
+            arr = raw.astype(dtype)
+            for view in (arr, arr[::3], arr.T[1]):
+                ref = view.astype(np.float64)
+                np.testing.assert_array_equal(qcfunc.dataqc_spiketest(view, 2, 3, 7),
+                                              qcfunc.dataqc_spiketest(ref, 2, 3, 7))
+                np.testing.assert_array_equal(qcfunc.dataqc_spiketest(view, 2, 3, 41),
+                                              qcfunc.dataqc_spiketest(ref, 2, 3, 41))
+                np.testing.assert_array_equal(qcfunc.dataqc_stuckvaluetest(view, 0.5, 10),
+                                              qcfunc.dataqc_stuckvaluetest(ref, 0.5, 10))
+                n = len(view)
+                np.testing.assert_array_equal(gradientvalues(view, x[:n], -10, 10, 0, 0, 5),
+                                              gradientvalues(ref, x[:n], -10, 10, 0, 0, 5))
+            np.testing.assert_array_equal(qcfunc.dataqc_gradienttest(arr[:, 0], x, [-10, 10], 0, 0, 5),
+                                          qcfunc.dataqc_gradienttest(arr[:, 0].astype(np.float64), x, [-10, 10], 0, 0, 5))
+
     def test_dataqc_gradienttest(self):
         """
         Test of the dataqc_gradienttest (either spatial or temporal) function.
@@ -621,6 +801,11 @@ class TestQCFunctionsUnit(BaseUnitTestCase):
         self.assertTrue(np.allclose(got_z, z, rtol=1e-3, atol=0))
         self.assertTrue(np.allclose(got_sorad, sorad, rtol=1e-3, atol=0))
 
+        # Like time.gmtime, only whole seconds are used
+        frac_z, frac_sorad = qcfunc.dataqc_solarelevation(lon, lat, np.floor(dt) + 0.9)
+        np.testing.assert_array_equal(frac_z, qcfunc.dataqc_solarelevation(lon, lat, np.floor(dt))[0])
+        self.assertRaises(ValueError, qcfunc.dataqc_solarelevation, lon[:1], lat[:1], [np.nan])
+
     def test_dataqc_condcompress(self):
         """
         Test of the dataqc_condcompress function.
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_incremental
+@file ion_functions/qc/test/test_qc_incremental.py
+@brief Unit tests for the incremental QC recomputation
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_incremental import recompute_qc, dirty_ranges
+
+
+@attr('UNIT', group='func')
+class TestQCIncrementalUnit(BaseUnitTestCase):
+
+    def full(self, dat, x, config):
+        flags = {}
+        if 'glblrng' in config:
+            flags['glblrng'] = np.asarray(qcfunc.dataqc_globalrangetest(dat, **config['glblrng']), dtype=np.int8)
+        if 'spketst' in config:
+            flags['spketst'] = qcfunc.dataqc_spiketest(dat, **config['spketst'])
+        if 'stuckvl' in config:
+            flags['stuckvl'] = qcfunc.dataqc_stuckvaluetest(dat, **config['stuckvl'])
+        if 'gradtst' in config:
+            flags['gradtst'] = np.asarray(qcfunc.dataqc_gradienttest(dat, x, **config['gradtst']), dtype=np.int8)
+        return flags
+
+    def test_dirty_ranges(self):
+        self.assertEqual(dirty_ranges([(5, 9), (0, 2), (8, 12), (2, 2), (12, 13)], 20), [(0, 2), (5, 13)])
+        self.assertRaises(ValueError, dirty_ranges, [(5, 21)], 20)
+        self.assertRaises(ValueError, dirty_ranges, [(5, 4)], 20)
+
+    def test_matches_full(self):
+        rs = np.random.RandomState(3)
+        n = 50000
+        dat = np.round(rs.random_sample(n) * 3) * 0.5
+        dat[rs.randint(0, n, 500)] += 20
+        dat[rs.randint(0, n, 20)] = np.nan
+        dat[20000:20100] = 1.25
+        # Stretches of points closer than mindx
+        x = np.cumsum(np.where((np.arange(n) // 300) % 4 == 1, 0.1, 1.0))
+        for L, num, startdat in [(5, 10, np.nan), (101, 40, 1.0), (7, 3, 25.0)]:
+            config = {'glblrng': {'datlim': [0.2, 20]},
+                      'spketst': {'acc': 0.1, 'N': 2, 'L': L},
+                      'stuckvl': {'reso': 0.01, 'num': num},
+                      'gradtst': {'ddatdx': [-2, 2], 'mindx': 0.6, 'startdat': startdat, 'toldat': 1.0}}
+            for dirty in [[(100, 200)], [(0, 10), (30000, 30500), (30600, 31000)],
+                          [(n - 5, n)], [(1000, 1001), (40000, 40010)], []]:
+                flags = self.full(dat, x, config)
+                new = dat.copy()
+                for a, b in dirty:
+                    new[a:b] = new[a:b] * 1.5 + 3
+                    new[a:b:7] = 40
+                report = recompute_qc(new, x, config, flags, dirty)
+                for test, expected in self.full(new, x, config).iteritems():
+                    np.testing.assert_array_equal(flags[test], expected)
+                    self.assertTrue(report[test] <= n)
+                self.assertEqual(report['glblrng'], sum(b - a for a, b in dirty))
+                if not dirty:
+                    self.assertEqual(sum(report.values()), 0)
+
+    def test_gradient_resync(self):
+        # A modified sample near the start does not rescan the whole record
+        n = 100000
+        x = np.arange(n, dtype=np.float)
+        dat = np.sin(x / 50.)
+        config = {'gradtst': {'ddatdx': [-0.1, 0.1], 'mindx': 0, 'startdat': np.nan, 'toldat': 0.1}}
+        flags = self.full(dat, x, config)
+        dat[500:510] = 5
+        report = recompute_qc(dat, x, config, flags, [(500, 510)])
+        np.testing.assert_array_equal(flags['gradtst'], self.full(dat, x, config)['gradtst'])
+        self.assertTrue((flags['gradtst'][500:510] == 0).all())
+        self.assertTrue(report['gradtst'] < 10000)
+
+    def test_too_few_values(self):
+        x = np.array([0, 0.1, 0.2, 0.3, 0.4])
+        dat = np.array([1., 5, 1, 5, 1])
+        config = {'gradtst': {'ddatdx': [-1, 1], 'mindx': 2, 'startdat': np.nan, 'toldat': 0.1}}
+        flags = self.full(dat, x, config)
+        np.testing.assert_array_equal(flags['gradtst'], 1)
+        x[-1] = 3
+        recompute_qc(dat, x, config, flags, [(4, 5)])
+        np.testing.assert_array_equal(flags['gradtst'], self.full(dat, x, config)['gradtst'])
+        self.assertRaises(ValueError, recompute_qc, dat, None, config, flags, [])
+        self.assertRaises(ValueError, recompute_qc, dat, x, {'trndtst': {}}, flags, [])
+        self.assertRaises(ValueError, recompute_qc, dat, x, {'glblrng': {'datlim': [0, 1]}}, flags, [])
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_interpolation
+@file ion_functions/qc/test/test_qc_interpolation.py
+@brief Unit tests for the cached local range test interpolation
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from scipy.interpolate import LinearNDInterpolator
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_interpolation import TriangulationCache, RectilinearGrid, interpolate_limits, triangulation_cache
+
+
+@attr('UNIT', group='func')
+class TestQCInterpolationUnit(BaseUnitTestCase):
+
+    def setUp(self):
+        pressure, month = np.meshgrid(np.arange(0, 150, 10.), np.arange(1, 13.))
+        self.datlimz = np.column_stack([pressure.flatten(), month.flatten()])
+        self.datlim = np.column_stack([self.datlimz.sum(axis=1),
+                                       self.datlimz.sum(axis=1) * 2 + 5])
+        rs = np.random.RandomState(5)
+        self.z = np.column_stack([rs.uniform(-10, 150, 200), rs.uniform(0, 13, 200)])
+
+    def test_interpolate_limits(self):
+        # One triangulation for both columns gives the limits of two
+        # separate interpolators
+        lim1, lim2 = interpolate_limits(self.z, self.datlim, self.datlimz, cache=TriangulationCache(), grid=False)
+        for col, got in ((0, lim1), (1, lim2)):
+            F = LinearNDInterpolator(self.datlimz, self.datlim[:, col].reshape(-1, 1))
+            np.testing.assert_array_equal(got, F(self.z).reshape(-1))
+        self.assertTrue(np.isnan(lim1).any())
+
+    def test_cache(self):
+        cache = TriangulationCache(maxsize=2)
+        tri = cache.triangulate(self.datlimz)
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+        # Keyed by content, not identity
+        self.assertIs(cache.triangulate(self.datlimz.copy()), tri)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+        # Changing the caller's array neither changes the key nor the entry
+        datlimz = self.datlimz.copy()
+        cache.triangulate(datlimz)
+        datlimz[0] = -1
+        self.assertIsNot(cache.triangulate(datlimz), tri)
+        self.assertEqual(cache.triangulate(self.datlimz).points[0, 0], 0)
+        self.assertEqual((cache.hits, cache.misses), (3, 2))
+
+        # Least recently used is dropped first
+        cache.triangulate(self.datlimz + 1)
+        self.assertEqual(len(cache), 2)
+        self.assertIs(cache.triangulate(self.datlimz), tri)
+        cache.triangulate(datlimz)
+        self.assertEqual(cache.info(), {'hits': 4, 'misses': 4, 'size': 2, 'maxsize': 2})
+
+        cache.clear()
+        self.assertEqual(cache.info(), {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 2})
+
+    def test_localrangetest_uses_cache(self):
+        # Scattered points, a grid would not need a triangulation
+        datlimz = np.random.RandomState(6).uniform(0, 150, (40, 2))
+        datlim = np.column_stack([datlimz.sum(axis=1), datlimz.sum(axis=1) * 2 + 5])
+        dat = self.z.sum(axis=1) * 1.5
+        triangulation_cache.clear()
+        first = qcfunc.dataqc_localrangetest(dat, self.z, datlim, datlimz)
+        second = qcfunc.dataqc_localrangetest(dat, self.z, datlim, datlimz)
+        np.testing.assert_array_equal(first, second)
+        self.assertEqual((triangulation_cache.hits, triangulation_cache.misses), (1, 1))
+
+    def test_grid_detect(self):
+        rs = np.random.RandomState(7)
+        shuffled = self.datlimz[rs.permutation(self.datlimz.shape[0])]
+        grid = RectilinearGrid.detect(shuffled)
+        self.assertEqual(grid.shape, (15, 12))
+        np.testing.assert_array_equal(shuffled[grid.order].reshape(15, 12, 2)[:, 0, 1], 1)
+
+        self.assertIsNone(RectilinearGrid.detect(shuffled[1:]))                # hole
+        self.assertIsNone(RectilinearGrid.detect(np.vstack([shuffled[1:], shuffled[1:2]])))  # repeat
+        self.assertIsNone(RectilinearGrid.detect(rs.uniform(0, 1, (16, 2))))  # scattered
+
+    def test_grid_matches_delaunay(self):
+        # Irregular depth bins, months as the second axis
+        depth = np.array([0, 5, 10, 25, 50, 100, 200, 500.])
+        pressure, month = np.meshgrid(depth, np.arange(1, 13.))
+        datlimz = np.column_stack([pressure.flatten(), month.flatten()])
+        rs = np.random.RandomState(8)
+        lower = rs.uniform(0, 10, datlimz.shape[0])
+        datlim = np.column_stack([lower, lower + rs.uniform(1, 5, datlimz.shape[0])])
+
+        # Nodes, points along the depth edges at whole months, points along
+        # the month edges at the depth bins and points off the grid
+        z = np.vstack([
+            datlimz,
+            np.column_stack([rs.uniform(0, 500, 300), rs.randint(1, 13, 300)]),
+            np.column_stack([depth[rs.randint(0, 8, 300)], rs.uniform(1, 12, 300)]),
+            [[-1, 5], [501, 5], [20, 0], [20, 13], [np.nan, 5], [20, 12.5]],
+        ])
+        grid = interpolate_limits(z, datlim, datlimz)
+        delaunay = interpolate_limits(z, datlim, datlimz, cache=None, grid=False)
+        for got, expected in zip(grid, delaunay):
+            np.testing.assert_array_equal(np.isnan(got), np.isnan(expected))
+            np.testing.assert_allclose(got, expected, rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(grid[0][:datlimz.shape[0]], datlim[:, 0])
+        self.assertEqual(np.isnan(grid[0]).sum(), 6)
+
+    def test_grid_multilinear(self):
+        # A multilinear field is reproduced exactly inside the cells, also
+        # with a single valued axis and in three dimensions
+        axes = [np.array([0, 1, 3.]), np.array([2.]), np.array([1, 2, 3, 4.])]
+        points = np.column_stack([a.flatten() for a in np.meshgrid(*axes, indexing='ij')])
+        field = lambda p: 1 + p[:, 0] * p[:, 2] - 2 * p[:, 2] + p[:, 1]
+        datlim = np.column_stack([field(points), field(points) + 1])
+        rs = np.random.RandomState(9)
+        z = np.column_stack([rs.uniform(0, 3, 100), np.repeat(2., 100), rs.uniform(1, 4, 100)])
+        lim1, lim2 = interpolate_limits(z, datlim, points)
+        np.testing.assert_allclose(lim1, field(z), rtol=1e-12)
+        np.testing.assert_allclose(lim2, field(z) + 1, rtol=1e-12)
+        z[0, 1] = 2.5
+        self.assertTrue(np.isnan(interpolate_limits(z, datlim, points)[0][0]))
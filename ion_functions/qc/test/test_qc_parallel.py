@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_parallel
+@file ion_functions/qc/test/test_qc_parallel.py
+@brief Unit tests for the parallel QC drivers
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_parallel import run_qc_batch, run_qc_sharded
+
+from multiprocessing.pool import Pool
+
+
+@attr('UNIT', group='func')
+class TestQCParallelUnit(BaseUnitTestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(11)
+        self.series = []
+        for i in xrange(12):
+            dat = np.sin(np.arange(5000) / 30.) + rs.random_sample(5000)
+            dat[rs.randint(0, 5000, 10)] = 20
+            dat[1000:1050] = 0.5
+            self.series.append(dat)
+        self.x = np.arange(5000, dtype=np.float)
+
+    def test_batch_spike(self):
+        params = {'acc': 0.1, 'N': 5, 'L': 5}
+        got = run_qc_batch(self.series, 'spike', params, workers=4)
+        self.assertEqual(len(got), len(self.series))
+        for dat, flags in zip(self.series, got):
+            self.assertEqual(flags.dtype, np.int8)
+            np.testing.assert_array_equal(flags, qcfunc.dataqc_spiketest(dat, **params))
+
+    def test_batch_stuck_per_series_params(self):
+        params = [{'reso': 0.001, 'num': n} for n in xrange(2, 14)]
+        got = run_qc_batch(self.series, 'stuck', params, workers=3)
+        for dat, kwargs, flags in zip(self.series, params, got):
+            np.testing.assert_array_equal(flags, qcfunc.dataqc_stuckvaluetest(dat, **kwargs))
+
+    def test_batch_gradient(self):
+        params = {'ddatdx': [-0.5, 0.5], 'mindx': 0, 'startdat': np.nan, 'toldat': 0.2}
+        series = [(dat, self.x) for dat in self.series]
+        got = run_qc_batch(series, 'gradient', params, workers=2)
+        for dat, flags in zip(self.series, got):
+            np.testing.assert_array_equal(flags, qcfunc.dataqc_gradienttest(dat, self.x, **params))
+
+    def test_batch_errors(self):
+        with self.assertRaises(ValueError):
+            run_qc_batch(self.series, 'polytrend', {})
+        with self.assertRaises(ValueError):
+            run_qc_batch(self.series, 'spike', [{'acc': 0.1}])
+
+    def sharded_input(self):
+        rs = np.random.RandomState(7)
+        n = 300001
+        dat = np.round(rs.random_sample(n) * 3) * 0.5
+        dat[rs.randint(0, n, 3000)] += 20
+        dat[rs.randint(0, n, 50)] = np.nan
+        dat[65530:65600] = 1.25
+        t = 3.6e9 + np.arange(n, dtype=np.float)
+        return dat, t
+
+    def test_sharded_spike_stuck(self):
+        dat, t = self.sharded_input()
+        for test, func, params in [('spike', qcfunc.dataqc_spiketest, {'acc': 0.1, 'N': 2, 'L': 5}),
+                                   ('spike', qcfunc.dataqc_spiketest, {'acc': 0.1, 'N': 2, 'L': 8}),
+                                   ('spike', qcfunc.dataqc_spiketest, {'acc': 0.1, 'N': 2, 'L': 101}),
+                                   ('stuck', qcfunc.dataqc_stuckvaluetest, {'reso': 0.01, 'num': 3}),
+                                   ('stuck', qcfunc.dataqc_stuckvaluetest, {'reso': 0.01, 'num': 40})]:
+            expected = func(dat, **params)
+            for shards in (1, 3, 4):
+                np.testing.assert_array_equal(run_qc_sharded(dat, test, params, shards=shards, workers=4),
+                                              expected)
+        # Too short for a run of num
+        np.testing.assert_array_equal(run_qc_sharded(dat[:5], 'stuck', {'reso': 0.01, 'num': 10}), 0)
+
+    def test_sharded_trend(self):
+        dat, t = self.sharded_input()
+        # Ramps over the first 2000 samples of every 50000
+        ramp = np.arange(dat.size) % 50000
+        dat = np.nan_to_num(dat) + np.where(ramp < 2000, ramp * 0.05, 0)
+        for params in [{'ord_n': 1, 'nstd': 3, 'window': 1000}, {'ord_n': 2, 'nstd': 3, 'window': 999, 'step': 37}]:
+            expected = qcfunc.dataqc_polytrendtest(dat, t, **params)
+            self.assertTrue(0 < (expected == 0).sum() < dat.size)
+            np.testing.assert_array_equal(run_qc_sharded(dat, 'trend', params, t, shards=4), expected)
+        self.assertRaises(ValueError, run_qc_sharded, dat, 'trend', {'ord_n': 1}, t)
+        self.assertRaises(ValueError, run_qc_sharded, dat, 'gradient', {})
+
+    def test_sharded_process_pool(self):
+        dat, t = self.sharded_input()
+        params = {'acc': 0.1, 'N': 2, 'L': 5}
+        pool = Pool(2)
+        try:
+            got = run_qc_sharded(dat, 'spike', params, shards=4, pool=pool)
+        finally:
+            pool.close()
+            pool.join()
+        np.testing.assert_array_equal(got, qcfunc.dataqc_spiketest(dat, **params))
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_runs
+@file ion_functions/qc/test/test_qc_runs.py
+@brief Unit tests for the run-length encoded QC flags
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_flags import QCRuns
+from ion_functions.qc.qc_suite import run_qc_suite
+
+
+@attr('UNIT', group='func')
+class TestQCRunsUnit(BaseUnitTestCase):
+
+    def setUp(self):
+        rs = np.random.RandomState(11)
+        n = 20000
+        self.dat = np.round(rs.random_sample(n) * 3) * 0.5
+        self.dat[rs.randint(0, n, 300)] += 20
+        self.dat[rs.randint(0, n, 20)] = np.nan
+        self.dat[7000:7100] = 1.25
+        # Stretches of points closer than mindx
+        self.x = np.cumsum(np.where((np.arange(n) // 300) % 4 == 1, 0.1, 1.0))
+
+    def test_runs(self):
+        runs = QCRuns.from_flags([1, 0, 0, 1, -99, -99, 0, 1, 1, 0])
+        np.testing.assert_array_equal(runs.start, [1, 4, 6, 9])
+        np.testing.assert_array_equal(runs.stop, [3, 6, 7, 10])
+        np.testing.assert_array_equal(runs.code, [0, -99, 0, 0])
+        self.assertEqual(list(runs)[1], (4, 6, -99))
+        self.assertEqual(runs.failed(), 6)
+        np.testing.assert_array_equal(runs.expand(), [1, 0, 0, 1, -99, -99, 0, 1, 1, 0])
+
+        out = np.zeros(10, dtype=np.int8)
+        self.assertTrue(runs.expand(out) is out)
+        np.testing.assert_array_equal(out, [1, 0, 0, 1, -99, -99, 0, 1, 1, 0])
+
+        np.testing.assert_array_equal(QCRuns(3).expand(), [1, 1, 1])
+        self.assertEqual(len(QCRuns.from_flags([])), 0)
+        self.assertEqual(QCRuns.from_flags(np.ones(5)), QCRuns(5))
+        self.assertRaises(ValueError, QCRuns, 5, [0], [1, 2], [0])
+
+    def test_functions(self):
+        dat, x = self.dat, self.x
+        cases = [
+            (qcfunc.dataqc_globalrangetest, (dat, [0.2, 20])),
+            (qcfunc.dataqc_spiketest, (dat, 0.1, 2, 5)),
+            (qcfunc.dataqc_spiketest, (dat, 0.1, 2, 101)),
+            (qcfunc.dataqc_stuckvaluetest, (dat, 0.01, 10)),
+            (qcfunc.dataqc_stuckvaluetest, (dat, 0.01, dat.size + 1)),
+            (qcfunc.dataqc_gradienttest, (dat, x, [-2, 2], 0.6, np.nan, 1.0)),
+            (qcfunc.dataqc_gradienttest, (dat, x, [-2, 2], 0, 20, 1.0)),
+        ]
+        for func, args in cases:
+            expected = np.asarray(func(*args)).astype(np.int8)
+            runs = func(*args, runs=True)
+            self.assertEqual(runs, QCRuns.from_flags(expected))
+            np.testing.assert_array_equal(runs.expand(), expected)
+
+        # Too few values to inspect
+        runs = qcfunc.dataqc_gradienttest(dat, x, [-2, 2], 1e9, np.nan, 1.0, runs=True)
+        self.assertEqual(runs, QCRuns(dat.size))
+        self.assertRaises(ValueError, qcfunc.dataqc_spiketest, dat.reshape(-1, 2), 0.1, runs=True)
+
+    def test_suite(self):
+        config = {'glblrng': {'datlim': [0.2, 20]},
+                  'spketst': {'acc': 0.1, 'N': 2, 'L': 7},
+                  'stuckvl': {'reso': 0.01, 'num': 5},
+                  'gradtst': {'ddatdx': [-2, 2], 'mindx': 0.6, 'startdat': np.nan, 'toldat': 1.0}}
+        expected = run_qc_suite(self.dat, self.x, config, runs=True)
+        self.assertEqual(sorted(expected), sorted(config))
+        self.assertEqual(expected['gradtst'], qcfunc.dataqc_gradienttest(self.dat, self.x, runs=True,
+                                                                         **config['gradtst']))
+        # The runs do not depend on the blocks they were found in
+        for block in [1, 5, 64, 1000]:
+            runs = run_qc_suite(self.dat, self.x, config, block=block, runs=True)
+            for test in config:
+                self.assertEqual(runs[test], expected[test])
+        flags = run_qc_suite(self.dat, self.x, config)
+        for test in ('glblrng', 'spketst', 'stuckvl'):
+            np.testing.assert_array_equal(expected[test].expand() != 0, flags.get(test))
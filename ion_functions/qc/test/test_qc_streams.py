@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_streams
+@file ion_functions/qc/test/test_qc_streams.py
+@brief Unit tests for the streaming QC tests
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_streams import SpikeStream, StuckStream, GradientStream
+
+
+def granules(size, seed):
+    '''
+    Splits range(size) into random, sometimes empty, granules
+    '''
+    rs = np.random.RandomState(seed)
+    bounds = np.sort(rs.randint(0, size + 1, size / 7))
+    bounds = np.concatenate([[0], bounds, [size]])
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+@attr('UNIT', group='func')
+class TestQCStreamsUnit(BaseUnitTestCase):
+
+    def run_stream(self, stream, parts, *arrays):
+        flags = []
+        for sl in parts:
+            flags.append(stream.push(*[a[sl] for a in arrays]))
+        flags.append(stream.flush())
+        for f in flags:
+            self.assertEqual(f.dtype, np.int8)
+        return np.concatenate(flags)
+
+    def test_spike_stream(self):
+        rs = np.random.RandomState(1)
+        dat = np.sin(np.arange(600) / 20.) + rs.random_sample(600) * 0.1
+        dat[rs.randint(0, 600, 20)] += 5
+        dat[[0, 599]] = -4
+        for L in (3, 4, 7, 51, 600, 800):
+            expected = qcfunc.dataqc_spiketest(dat, 0.1, 3, L)
+            for seed in range(3):
+                got = self.run_stream(SpikeStream(0.1, 3, L), granules(dat.size, seed), dat)
+                np.testing.assert_array_equal(got, expected)
+
+    def test_spike_stream_granule_sizes(self):
+        dat = np.arange(50, dtype=np.float)
+        dat[[0, 25, 49]] = 100
+        expected = qcfunc.dataqc_spiketest(dat, 0.1, 5, 7)
+        for size in (1, 2, 6, 7, 8, 50):
+            parts = [slice(i, i + size) for i in range(0, dat.size, size)]
+            got = self.run_stream(SpikeStream(0.1, 5, 7), parts, dat)
+            np.testing.assert_array_equal(got, expected)
+
+        # Flags come out as soon as the window of a sample is complete
+        stream = SpikeStream(0.1, 5, 7)
+        self.assertEqual(stream.push(dat[:6]).size, 0)
+        self.assertEqual(stream.push(dat[6:7]).size, 4)
+        self.assertEqual(stream.push(dat[7:8]).size, 1)
+        self.assertEqual(stream.flush().size, 3)
+
+    def test_stuck_stream(self):
+        rs = np.random.RandomState(2)
+        x = rs.random_sample(700) * 10
+        x[50:80] = 3.33
+        x[300:310] = 1.5
+        x[400:409] = 2.5
+        x[650:700] = 7.0
+        x[655] = np.nan
+        for num in (1, 4, 10, 40, 700, 701):
+            expected = qcfunc.dataqc_stuckvaluetest(x, 0.01, num)
+            for seed in range(3):
+                got = self.run_stream(StuckStream(0.01, num), granules(x.size, seed), x)
+                np.testing.assert_array_equal(got, expected)
+
+    def test_gradient_stream(self):
+        rs = np.random.RandomState(3)
+        x = np.cumsum(rs.random_sample(500))
+        dat = np.cumsum(rs.random_sample(500) - 0.5)
+        dat[rs.randint(0, 500, 15)] += 40
+        cases = [
+            # ddatdx, mindx, startdat, toldat
+            ([-50, 50], 0, np.nan, 5.0),
+            ([-5, 5], 0.6, np.nan, 1.0),
+            ([-5, 5], 1.5, 100., 1.0),
+            ([-5, 5], 0.9, dat[3], 0.5),
+        ]
+        for ddatdx, mindx, startdat, toldat in cases:
+            expected = qcfunc.dataqc_gradienttest(dat, x, ddatdx, mindx, startdat, toldat)
+            for seed in range(3):
+                stream = GradientStream(ddatdx, mindx, startdat, toldat)
+                got = self.run_stream(stream, granules(x.size, seed), dat, x)
+                np.testing.assert_array_equal(got, expected)
+
+    def test_gradient_stream_too_few(self):
+        # Everything within mindx of the first point is left as good
+        x = np.array([1, 1.1, 1.2, 1.3])
+        dat = np.array([3, 50, 98, 99.])
+        stream = GradientStream([-50, 50], 0.5, np.nan, 5.0)
+        self.assertEqual(stream.push(dat[:2], x[:2]).size, 0)
+        self.assertEqual(stream.push(dat[2:], x[2:]).size, 0)
+        np.testing.assert_array_equal(stream.flush(), [1, 1, 1, 1])
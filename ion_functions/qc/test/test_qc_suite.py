@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_suite
+@file ion_functions/qc/test/test_qc_suite.py
+@brief Unit tests for the fused QC suite
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_flags import QCFlags
+from ion_functions.qc.qc_suite import run_qc_suite
+
+
+@attr('UNIT', group='func')
+class TestQCSuiteUnit(BaseUnitTestCase):
+
+    def separate(self, dat, x, config):
+        '''
+        The flags of each test of config from its own function
+        '''
+        expected = {}
+        if 'glblrng' in config:
+            expected['glblrng'] = qcfunc.dataqc_globalrangetest(dat, **config['glblrng'])
+        if 'spketst' in config:
+            expected['spketst'] = qcfunc.dataqc_spiketest(dat, **config['spketst'])
+        if 'stuckvl' in config:
+            expected['stuckvl'] = qcfunc.dataqc_stuckvaluetest(dat, **config['stuckvl'])
+        if 'gradtst' in config:
+            expected['gradtst'] = qcfunc.dataqc_gradienttest(dat, x, **config['gradtst'])
+        return expected
+
+    def test_suite_matches_tests(self):
+        rs = np.random.RandomState(5)
+        n = 20000
+        dat = np.round(rs.random_sample(n) * 3) * 0.5
+        dat[rs.randint(0, n, 400)] += 20
+        dat[rs.randint(0, n, 20)] = np.nan
+        dat[5000:5100] = 1.25
+        # Stretches of points closer than mindx
+        x = np.cumsum(np.where((np.arange(n) // 300) % 4 == 1, 0.1, 1.0))
+        for L, num, block in [(5, 10, 0), (7, 3, 100), (101, 40, 1), (5, 30000, 4097)]:
+            config = {'glblrng': {'datlim': [0.2, 20]},
+                      'spketst': {'acc': 0.1, 'N': 2, 'L': L},
+                      'stuckvl': {'reso': 0.01, 'num': num},
+                      'gradtst': {'ddatdx': [-2, 2], 'mindx': 0.6, 'startdat': np.nan, 'toldat': 1.0}}
+            flags = run_qc_suite(dat, x, config, block=block)
+            for test, expected in self.separate(dat, x, config).iteritems():
+                np.testing.assert_array_equal(flags.get(test), expected != 0)
+                if test != 'stuckvl' or num < n:
+                    self.assertTrue(0 < (expected == 0).sum() < n)
+
+    def test_suite_subset(self):
+        dat = np.array([1., 2, 3, 50, 4, 4, 4, 4, 5])
+        config = {'glblrng': {'datlim': [0, 10]}, 'stuckvl': {'reso': 0.1, 'num': 3}}
+        flags = QCFlags(dat.size)
+        flags.set('glblrng', np.zeros(dat.size))
+        flags.set('spketst', [1, 1, 1, 0, 1, 1, 1, 1, 1])
+        out = run_qc_suite(dat, None, config, flags=flags)
+        self.assertTrue(out is flags)
+        np.testing.assert_array_equal(flags.get('glblrng'), [1, 1, 1, 0, 1, 1, 1, 1, 1])
+        np.testing.assert_array_equal(flags.get('stuckvl'), [1, 1, 1, 1, 0, 0, 0, 0, 1])
+        # Tests that did not run keep their flags
+        np.testing.assert_array_equal(flags.get('spketst'), [1, 1, 1, 0, 1, 1, 1, 1, 1])
+
+        self.assertRaises(ValueError, run_qc_suite, dat, None, {'loclrng': {}})
+        self.assertRaises(ValueError, run_qc_suite, dat, None,
+                          {'gradtst': {'ddatdx': [-1, 1], 'mindx': 0, 'startdat': 0, 'toldat': 1}})
+        self.assertEqual(len(run_qc_suite([], None, config)), 0)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.qc.test.test_qc_trend
+@file ion_functions/qc/test/test_qc_trend.py
+@brief Unit tests for the windowed trend test
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions.qc import qc_functions as qcfunc
+from ion_functions.qc.qc_trend import window_trend, window_starts
+
+
+def trending_series(n, seed):
+    '''
+    Noise with linear and quadratic drifts of random strength in segments,
+    on NTP times with uneven spacing
+    '''
+    rs = np.random.RandomState(seed)
+    t = 3.6e9 + np.cumsum(rs.uniform(0.5, 1.5, n))
+    dat = rs.standard_normal(n)
+    for a in range(0, n, 97):
+        sl = slice(a, a + 97)
+        x = (t[sl] - t[a]) / 97.
+        dat[sl] += 12.5 + rs.choice([0, 0.5, 5, 50]) * x + rs.choice([0, 0, 20]) * x ** 2
+    return dat, t
+
+
+@attr('UNIT', group='func')
+class TestQCTrendUnit(BaseUnitTestCase):
+
+    def test_window_starts(self):
+        np.testing.assert_array_equal(window_starts(10, 4, 4), [0, 4, 6])
+        np.testing.assert_array_equal(window_starts(10, 4, 3), [0, 3, 6])
+        np.testing.assert_array_equal(window_starts(10, 5, 5), [0, 5])
+        np.testing.assert_array_equal(window_starts(10, 20, 3), [0])
+
+    def test_window_trend_matches_polyfit(self):
+        found = 0
+        for seed, (ord_n, window, step) in enumerate([(1, 50, 50), (1, 64, 7), (2, 120, 33),
+                                                       (3, 200, 101), (0, 30, 30), (1, 3000, 1)]):
+            dat, t = trending_series(2000, seed)
+            flags, starts = window_trend(dat, t, ord_n, 3, window, step)
+            window = min(window, dat.size)
+            # Times from the window start, as a fit of order 2 or more on
+            # NTP seconds is too poorly conditioned to compare with
+            expected = [qcfunc.dataqc_polytrendtest(dat[s:s + window], t[s:s + window] - t[s], ord_n, 3)[0]
+                        for s in starts]
+            np.testing.assert_array_equal(flags, expected)
+            found += (flags == 0).sum()
+        self.assertGreater(found, 40)
+
+    def test_dataqc_polytrendtest_window(self):
+        dat, t = trending_series(1000, 7)
+        flags, starts = window_trend(dat, t, 1, 3, 100, 40)
+        qcflag = qcfunc.dataqc_polytrendtest(dat, t, 1, 3, window=100, step=40)
+        self.assertEqual(qcflag.dtype, np.int8)
+        self.assertEqual(qcflag.shape, dat.shape)
+
+        # A sample is bad if any window over it has a trend
+        expected = np.ones(dat.size, dtype=np.int8)
+        for f, s in zip(flags, starts):
+            if f == 0:
+                expected[s:s + 100] = 0
+        np.testing.assert_array_equal(qcflag, expected)
+
+        # One window covering the record is the plain test
+        for ord_n in (1, 2):
+            np.testing.assert_array_equal(
+                qcfunc.dataqc_polytrendtest(dat, t, ord_n, 3, window=dat.size),
+                qcfunc.dataqc_polytrendtest(dat, t, ord_n, 3))
+
+    def test_polytrend_window_degenerate(self):
+        t = np.arange(60.)
+        # Constant windows have no spread and no trend
+        dat = np.ones(60) * 4.2
+        np.testing.assert_array_equal(qcfunc.dataqc_polytrendtest(dat, t, window=20), np.ones(60))
+        # Repeated times make the equations singular
+        dat = np.arange(60.)
+        t[20:40] = 20.
+        flags, starts = window_trend(dat, t, 1, 3, 20, 20)
+        np.testing.assert_array_equal(flags, [0, 1, 0])
+        self.assertRaises(ValueError, qcfunc.dataqc_polytrendtest, dat, t, window=0)
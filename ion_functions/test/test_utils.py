@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""
+@package ion_functions.test.test_utils
+@file ion_functions/test/test_utils.py
+@brief Unit tests for the validation helpers
+"""
+
+from nose.plugins.attrib import attr
+from ion_functions.test.base_test import BaseUnitTestCase
+
+import numpy as np
+from ion_functions import utils
+
+
+@attr('UNIT', group='func')
+class TestUtilsUnit(BaseUnitTestCase):
+
+    def test_allnumeric_allreal(self):
+        cases = [np.arange(10), np.arange(10, dtype=np.uint8), np.random.random_sample((3, 4)),
+                 np.array([1 + 2j, 3]), np.array(['a', 'b']), np.array([True, False]),
+                 3.5, [1, 2.5]]
+        for dat in cases:
+            self.assertEqual(utils.allnumeric(dat), bool(utils.isnumeric(dat).all()))
+            self.assertEqual(utils.allreal(dat), bool(utils.isreal(dat).all()))
+        self.assertTrue(utils.allnumeric(np.empty(0)))
+        self.assertTrue(utils.allnumeric(np.array([1, 2.5], dtype=object)))
+        self.assertFalse(utils.allnumeric(np.array([1, 'a'], dtype=object)))
+        self.assertFalse(utils.allreal(np.array([1, 1j], dtype=object)))
+
+    def test_islogical(self):
+        self.assertTrue(utils.islogical(np.array([0, 1, 1], dtype=np.int8)))
+        self.assertTrue(utils.islogical(np.array([[0, 1], [1, 1]], dtype=np.int8)))
+        self.assertFalse(utils.islogical(np.array([0, 2], dtype=np.int8)))
+        self.assertFalse(utils.islogical(np.array([0, -1], dtype=np.int8)))
+        self.assertFalse(utils.islogical(np.array([0, 1], dtype=np.int16)))
+        self.assertFalse(utils.islogical(np.array([0., 1.])))
+        self.assertTrue(utils.islogical(np.array([np.int8(0), np.int8(1)], dtype=object)))
@@ -118,6 +118,41 @@ def isreal(dat):
     return np.array([np.atleast_1d(d).dtype.kind in REAL_KINDS for d in np.nditer(np.atleast_1d(dat))]).astype('int8')
 
 
+def _kinds(dat):
+    """
+    The dtype kinds of the values of dat. An array holds values of its own
+    kind, only an object array needs its values looked at.
+    """
+    dat = np.asanyarray(dat)
+    if dat.dtype.kind != 'O':
+        return set(dat.dtype.kind)
+    return set(np.atleast_1d(d).dtype.kind for d in dat.flat)
+
+
+def allnumeric(dat):
+    """
+    allnumeric - Determine whether every value of the input is numeric
+    Syntax
+    tf = allnumeric(A)
+    Description
+    tf = allnumeric(A) is isnumeric(A).all(), decided from the dtype of A
+    instead of a check per value.
+    """
+    return _kinds(dat).issubset(NUMERIC_KINDS)
+
+
+def allreal(dat):
+    """
+    allreal - Determine whether every value of the input is real
+    Syntax
+    tf = allreal(A)
+    Description
+    tf = allreal(A) is isreal(A).all(), decided from the dtype of A instead
+    of a check per value.
+    """
+    return _kinds(dat).issubset(REAL_KINDS)
+
+
 def isscalar(dat):
     """
     isscalar - Determine whether input is scalar
@@ -240,9 +275,11 @@ def islogical(inflags):
         
     """
     inflags = np.atleast_1d(inflags)
-    flag = (all(np.in1d(inflags.flatten(), [0,1])) and
-            all(isinstance(n, np.int8) for n in inflags.flatten()))
-    return flag
+    if inflags.dtype == np.object_:
+        return (all(np.in1d(inflags.flatten(), [0,1])) and
+                all(isinstance(n, np.int8) for n in inflags.flatten()))
+    # 0 and 1 are the only int8 values that are at most 1 as uint8
+    return bool(inflags.dtype == np.int8 and (inflags.view(np.uint8) <= 1).all())
 
 
 def rolling_window(a, window):
@@ -25,6 +25,9 @@ qc_extension_sources = ["ion_functions/qc/qc_extensions.pyx",
                         "extensions/stuck.c",
                         "extensions/spike.c",
                         "extensions/gradient.c",
+                        "extensions/qc_suite.c",
+                        "extensions/runs.c",
+                        "extensions/range.c",
                         "extensions/utils.c",
                         "extensions/time_utils.c", ]
 
@@ -33,7 +36,8 @@ qc_extension = Extension("ion_functions.qc.qc_extensions", qc_extension_sources,
 
 wmm_extension_sources = ["ion_functions/data/wmm.pyx",
                          "extensions/GeomagnetismLibrary.c",
-                         "extensions/wmm.c", ]
+                         "extensions/wmm.c",
+                         "extensions/time_utils.c", ]
 
 wmm_extension = Extension("ion_functions.data.wmm", wmm_extension_sources,
                           include_dirs=[np.get_include(), "extensions/"], libraries=["m"])